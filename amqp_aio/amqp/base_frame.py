@@ -40,6 +40,58 @@ class FrameField:
         return inst
 
 
+class BitField(FrameField):
+    """
+    A single bit flag.
+
+    Consecutive BitFields of a frame are packed together into octets (least
+    significant bit first) as the protocol requires, so only the first field
+    of each octet reads or writes any bytes.
+    """
+
+    def __init__(self, default=False):
+        super(BitField, self).__init__(amqp_type=Octet, default=default)
+
+    def _bit_group(self):
+        return self.parent._meta.bit_groups[self.field_name]
+
+    def validate(self, value, previous: bytes) -> Any:
+        return bool(value)
+
+    def to_bytes(self, value, previous=b'') -> bytes:
+        group, position = self._bit_group()
+        if position:
+            return b''
+        octet = 0
+        for bit, name in enumerate(group):
+            if getattr(self.parent, name):
+                octet |= 1 << bit
+        return Octet(octet).to_bytes()
+
+    def parse_bytes(self, data: bytes) -> Tuple[Any, bytes]:
+        group, position = self._bit_group()
+        if position:
+            # Already set while parsing the first field of the octet
+            return getattr(self.parent, self.field_name), data
+        octet, remaining = Octet.from_bytes(data)
+        for bit, name in enumerate(group):
+            setattr(self.parent, name, bool(octet.value & (1 << bit)))
+        return getattr(self.parent, self.field_name), remaining
+
+
+class RawBytesField(FrameField):
+    """
+    Takes every remaining byte as it is, so it must be the last field of a
+    frame.
+    """
+
+    def to_bytes(self, value, previous=b'') -> bytes:
+        return bytes(value)
+
+    def parse_bytes(self, data: bytes) -> Tuple[Any, bytes]:
+        return data, b''
+
+
 class FrameSelectorField(FrameField):
     def __init__(
             self, selector: Callable[['BaseFrame'], 'BaseFrame'], **kwargs
@@ -65,8 +117,24 @@ class FrameMetadata:
     def __init__(self, meta, _class):
         self.parsing_order = getattr(meta, 'parsing_order', [])
         self.original_fields = {}
+        self.bit_groups = {}
         self.meta = meta
 
+    def group_bits(self, fields):
+        """
+        Maps each BitField name to the names packed in the same octet and its
+        position inside it.
+        :param fields: (name, field) pairs in parsing order
+        """
+        group = []
+        for name, field in fields + [(None, None)]:
+            if isinstance(field, BitField) and len(group) < 8:
+                group.append(name)
+                continue
+            for position, bit_name in enumerate(group):
+                self.bit_groups[bit_name] = (tuple(group), position)
+            group = [name] if isinstance(field, BitField) else []
+
 
 class FrameCreator(type):
     def __new__(cls, name, bases, attrs):
@@ -110,6 +178,7 @@ class FrameCreator(type):
 
             # Recreate the fields to have their python representation
             setattr(_class, field_name, None)
+        meta.group_bits(_fields)
         setattr(_class, "_fields", _fields)
         return _class
 
@@ -1,109 +1,298 @@
-from amqp_aio.amqp.amqp_types import ShortString, LongInt, ShortInt, Boolean, \
-    NoField, FieldTable, LongLongInt
-from amqp_aio.amqp.base import AMQPObject
-
+from typing import Tuple
+
+from amqp_aio.amqp.amqp_types import ShortString, LongInt, ShortInt, \
+    FieldTable, LongLongInt, Octet, ShortUint, Timestamp
+from amqp_aio.amqp.base_frame import FrameField, BitField
+from amqp_aio.amqp.consts import BASIC_CLASS_ID, BASIC_QOS_ID, \
+    BASIC_QOS_OK_ID, BASIC_CONSUME_ID, BASIC_CONSUME_OK_ID, BASIC_CANCEL_ID, \
+    BASIC_CANCEL_OK_ID, BASIC_PUBLISH_ID, BASIC_RETURN_ID, BASIC_DELIVER_ID, \
+    BASIC_GET_ID, BASIC_GET_OK_ID, BASIC_GET_EMPTY_ID, BASIC_ACK_ID, \
+    BASIC_REJECT_ID, BASIC_RECOVER_ASYNC_ID, BASIC_RECOVER_ID, \
+    BASIC_RECOVER_OK_ID, BASIC_NACK_ID
+from amqp_aio.amqp.frames import MethodArguments, MethodFrame, Frame, \
+    ContentHeaderFrame
+
+
+class BasicProperties:
+    """
+    Content Header properties of the Basic class.
 
-class ContentHeaderFrame:
+    Only the properties that are set (not None) are serialized, flagged in
+    the property flags, in the order defined by the spec.
+    """
+    property_types = (
+        ('content_type', ShortString),
+        ('content_encoding', ShortString),
+        ('headers', FieldTable),
+        ('delivery_mode', Octet),
+        ('priority', Octet),
+        ('correlation_id', ShortString),
+        ('reply_to', ShortString),
+        ('expiration', ShortString),
+        ('message_id', ShortString),
+        ('timestamp', Timestamp),
+        ('type', ShortString),
+        ('user_id', ShortString),
+        ('app_id', ShortString),
+        ('cluster_id', ShortString),
+    )
+    __slots__ = tuple(name for name, _ in property_types)
+
+    def __init__(self, **properties):
+        for name in self.__slots__:
+            setattr(self, name, properties.pop(name, None))
+        if properties:
+            raise TypeError(
+                "Unknown properties: {}".format(', '.join(properties))
+            )
+
+    def copy(self, **changes) -> 'BasicProperties':
+        """
+        Returns a new instance with the same properties, replacing the given
+        ones.
+        """
+        properties = {name: getattr(self, name) for name in self.__slots__}
+        properties.update(changes)
+        return type(self)(**properties)
+
+    def to_bytes(self) -> bytes:
+        flags = 0
+        data = b''
+        for position, (name, amqp_type) in enumerate(self.property_types):
+            value = getattr(self, name)
+            if value is None:
+                continue
+            flags |= 1 << (15 - position)
+            data += amqp_type(value).to_bytes()
+        return ShortUint(flags).to_bytes() + data
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple['BasicProperties', bytes]:
+        flags, data = ShortUint.from_bytes(data)
+        properties = cls()
+        for position, (name, amqp_type) in enumerate(cls.property_types):
+            if flags.value & (1 << (15 - position)):
+                value, data = amqp_type.from_bytes(data)
+                setattr(properties, name, value.to_python())
+        return properties, data
+
+    def to_dict(self):
+        return {
+            name: getattr(self, name) for name in self.__slots__
+            if getattr(self, name) is not None
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, BasicProperties):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return 'BasicProperties<{}>'.format(self.to_dict())
+
+
+def content_header(body_size, properties=None) -> ContentHeaderFrame:
     """
-    Frame Details:
-     - Inside payload frame:
+    Builds the Content Header of a Basic class message
+    :param int body_size: Total size of the message body
+    :param BasicProperties properties: Message properties
+    """
+    return ContentHeaderFrame(
+        class_id=BASIC_CLASS_ID, body_size=body_size,
+        properties=(properties or BasicProperties()).to_bytes()
+    )
 
-    +----------+---------+-------------+----------------+----------------------
-    | class-id | weight  |  body size  | property flags | property list...
-    +----------+---------+-------------+----------------+----------------------
-      2 Bytes  | 2 Bytes |   8 Bytes   |    2 Bytes     |    remainder...
 
-    """
-    class_id: ShortInt
+class BasicMethod(MethodArguments):
+    method_id = None
+    class_id = BASIC_CLASS_ID
+
+    @classmethod
+    def declare(cls, channel, **arguments):
+        return Frame.from_frame(MethodFrame(
+            class_id=cls.class_id,
+            method_id=cls.method_id,
+            arguments=cls(**arguments)
+        ), channel=channel)
+
+
+class Qos(BasicMethod):
+    method_id = BASIC_QOS_ID
+
+    prefetch_size = FrameField(LongInt, default=0)
+    prefetch_count = FrameField(ShortInt, default=0)
+    is_global = BitField()
+
+    class Meta:
+        parsing_order = ['prefetch_size', 'prefetch_count', 'is_global']
+
+
+class QosOK(BasicMethod):
+    method_id = BASIC_QOS_OK_ID
+
+
+class Consume(BasicMethod):
+    method_id = BASIC_CONSUME_ID
+
+    reserved_1 = FrameField(ShortInt, default=0)
+    queue = FrameField(ShortString, default='')
+    consumer_tag = FrameField(ShortString, default='')
+    no_local = BitField()
+    no_ack = BitField()
+    exclusive = BitField()
+    no_wait = BitField()
+    arguments = FrameField(FieldTable)
+
+    class Meta:
+        parsing_order = [
+            'reserved_1', 'queue', 'consumer_tag', 'no_local', 'no_ack',
+            'exclusive', 'no_wait', 'arguments'
+        ]
+
+
+class ConsumeOK(BasicMethod):
+    method_id = BASIC_CONSUME_OK_ID
+
+    consumer_tag = FrameField(ShortString)
+
+
+class Cancel(BasicMethod):
+    method_id = BASIC_CANCEL_ID
+
+    consumer_tag = FrameField(ShortString)
+    no_wait = BitField()
 
+    class Meta:
+        parsing_order = ['consumer_tag', 'no_wait']
 
-class Qos(AMQPObject):
-    prefetch_size: LongInt = 1
-    prefetch_count: ShortInt = 2
-    is_global: Boolean = 3
 
+class CancelOK(BasicMethod):
+    method_id = BASIC_CANCEL_OK_ID
 
-class QosOK(AMQPObject):
-    ...
+    consumer_tag = FrameField(ShortString)
 
-class Consume(AMQPObject):
-    reserved_1: NoField = 1
-    queue: ShortString = 2
-    consumer_tag: ShortString = 3
-    no_local: Boolean = 4
-    no_ack: Boolean = 5
-    exclusive: Boolean = 6
-    no_wait: Boolean = 7
-    arguments: FieldTable = 8
 
+class Publish(BasicMethod):
+    method_id = BASIC_PUBLISH_ID
 
-class ConsumeOK(AMQPObject):
-    consumer_tag: ShortString = 1
+    reserved_1 = FrameField(ShortInt, default=0)
+    exchange = FrameField(ShortString, default='')
+    routing_key = FrameField(ShortString, default='')
+    mandatory = BitField()
+    immediate = BitField()
 
+    class Meta:
+        parsing_order = [
+            'reserved_1', 'exchange', 'routing_key', 'mandatory', 'immediate'
+        ]
 
-class Cancel(AMQPObject):
-    consumer_tag: ShortString = 1
-    no_wait: Boolean = 2
 
+class Return(BasicMethod):
+    method_id = BASIC_RETURN_ID
 
-class CancelOK(AMQPObject):
-    consumer_tag: ShortString = 1
+    reply_code = FrameField(ShortInt)
+    reply_text = FrameField(ShortString, default='')
+    exchange = FrameField(ShortString)
+    routing_key = FrameField(ShortString)
 
+    class Meta:
+        parsing_order = ['reply_code', 'reply_text', 'exchange', 'routing_key']
 
-class Publish(AMQPObject):
-    reserved_1: NoField = 1
-    exchange: ShortString = 2
-    routing_key: ShortString = 3
-    mandatory: Boolean = 4
-    immediate: Boolean = 5
 
+class Deliver(BasicMethod):
+    method_id = BASIC_DELIVER_ID
 
-class Return(AMQPObject):
-    reply_code: ShortInt = 1
-    reply_text: ShortString = 2
-    redelivered: Boolean = 3
-    exchange: ShortString = 4
-    routing_key: ShortString = 5
+    consumer_tag = FrameField(ShortString)
+    delivery_tag = FrameField(LongLongInt)
+    redelivered = BitField()
+    exchange = FrameField(ShortString)
+    routing_key = FrameField(ShortString)
 
+    class Meta:
+        parsing_order = [
+            'consumer_tag', 'delivery_tag', 'redelivered', 'exchange',
+            'routing_key'
+        ]
 
-class Deliver(AMQPObject):
-    consumer_tag: ShortString = 1
-    delivery_tag: LongLongInt = 2
-    redelivered: Boolean = 3
-    exchange: ShortString = 4
-    routing_key: ShortString = 5
 
+class Get(BasicMethod):
+    method_id = BASIC_GET_ID
 
-class Get(AMQPObject):
-    reserved_1: NoField = 1
-    queue: ShortString = 2
-    no_ack: Boolean = 3
+    reserved_1 = FrameField(ShortInt, default=0)
+    queue = FrameField(ShortString, default='')
+    no_ack = BitField()
 
-class GetOK(AMQPObject):
-    delivery_tag: LongLongInt = 1
-    redelivered: Boolean = 2
-    exchange: ShortString = 3
-    routing_key: ShortString = 4
-    message_count: LongInt = 5
+    class Meta:
+        parsing_order = ['reserved_1', 'queue', 'no_ack']
 
-class GetEmpty(AMQPObject):
-    ...
 
-class Ack(AMQPObject):
-    delivery_tag: LongLongInt = 1
-    multiple: Boolean = 2
+class GetOK(BasicMethod):
+    method_id = BASIC_GET_OK_ID
 
-class Reject(AMQPObject):
-    delivery_tag: LongLongInt = 1
-    requeue: Boolean = 2
+    delivery_tag = FrameField(LongLongInt)
+    redelivered = BitField()
+    exchange = FrameField(ShortString)
+    routing_key = FrameField(ShortString)
+    message_count = FrameField(LongInt)
 
-class RecoverAsync(AMQPObject):
-    requeue: Boolean = 1
+    class Meta:
+        parsing_order = [
+            'delivery_tag', 'redelivered', 'exchange', 'routing_key',
+            'message_count'
+        ]
 
-class Recover(AMQPObject):
-    requeue: Boolean = 1
 
+class GetEmpty(BasicMethod):
+    method_id = BASIC_GET_EMPTY_ID
+
+    reserved_1 = FrameField(ShortString, default='')
+
+
+class Ack(BasicMethod):
+    method_id = BASIC_ACK_ID
+
+    delivery_tag = FrameField(LongLongInt, default=0)
+    multiple = BitField()
+
+    class Meta:
+        parsing_order = ['delivery_tag', 'multiple']
+
+
+class Reject(BasicMethod):
+    method_id = BASIC_REJECT_ID
+
+    delivery_tag = FrameField(LongLongInt)
+    requeue = BitField(default=True)
+
+    class Meta:
+        parsing_order = ['delivery_tag', 'requeue']
+
+
+class RecoverAsync(BasicMethod):
+    method_id = BASIC_RECOVER_ASYNC_ID
+
+    requeue = BitField()
+
+
+class Recover(BasicMethod):
+    method_id = BASIC_RECOVER_ID
+
+    requeue = BitField()
+
+
+class RecoverOK(BasicMethod):
+    method_id = BASIC_RECOVER_OK_ID
+
+
+class Nack(BasicMethod):
+    """
+    RabbitMQ extension, rejecting one or more messages
+    """
+    method_id = BASIC_NACK_ID
 
-class RecoverOK(AMQPObject):
-    ...
+    delivery_tag = FrameField(LongLongInt, default=0)
+    multiple = BitField()
+    requeue = BitField(default=True)
 
+    class Meta:
+        parsing_order = ['delivery_tag', 'multiple', 'requeue']
@@ -1,4 +1,5 @@
-from amqp_aio.amqp.amqp_types import Boolean, ShortInt, ShortString
+from amqp_aio.amqp.amqp_types import Boolean, ShortInt, ShortString, \
+    LongString
 
 from amqp_aio.amqp.base_frame import FrameField
 from amqp_aio.amqp.consts import CHANNEL_CLASS_ID, CHANNEL_OPEN_ID, \
@@ -12,21 +13,25 @@ class ChannelMethod(MethodArguments):
     class_id = CHANNEL_CLASS_ID
 
     @classmethod
-    def declare(cls, **arguments):
+    def declare(cls, channel, **arguments):
         return Frame.from_frame(MethodFrame(
             class_id=cls.class_id,
             method_id=cls.method_id,
             arguments=cls(**arguments)
-        ))
+        ), channel=channel)
 
 
 class Open(ChannelMethod):
     method_id = CHANNEL_OPEN_ID
 
+    reserved_1 = FrameField(ShortString, default='')
+
 
 class OpenOk(ChannelMethod):
     method_id = CHANNEL_OPEN_OK_ID
 
+    reserved_1 = FrameField(LongString, default='')
+
 
 class Flow(ChannelMethod):
     method_id = CHANNEL_FLOW_ID
@@ -45,12 +50,13 @@ class Close(ChannelMethod):
 
     reply_code = FrameField(ShortInt)
     reply_text = FrameField(ShortString)
-    class_id = FrameField(ShortInt)
-    method_id_ = FrameField(ShortInt)
+    # Suffixed so they don't shadow the ChannelMethod class/method ids
+    class_id_ = FrameField(ShortInt, default=0)
+    method_id_ = FrameField(ShortInt, default=0)
 
     class Meta:
         parsing_order = [
-            'reply_code', 'reply_text', 'class_id', 'method_id_'
+            'reply_code', 'reply_text', 'class_id_', 'method_id_'
         ]
 
 
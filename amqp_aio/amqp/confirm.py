@@ -0,0 +1,30 @@
+from amqp_aio.amqp.base_frame import BitField
+from amqp_aio.amqp.consts import CONFIRM_CLASS_ID, CONFIRM_SELECT_ID, \
+    CONFIRM_SELECT_OK_ID
+from amqp_aio.amqp.frames import MethodArguments, MethodFrame, Frame
+
+
+class ConfirmMethod(MethodArguments):
+    """
+    RabbitMQ extension class, putting a channel in publisher confirms mode
+    """
+    method_id = None
+    class_id = CONFIRM_CLASS_ID
+
+    @classmethod
+    def declare(cls, channel, **arguments):
+        return Frame.from_frame(MethodFrame(
+            class_id=cls.class_id,
+            method_id=cls.method_id,
+            arguments=cls(**arguments)
+        ), channel=channel)
+
+
+class Select(ConfirmMethod):
+    method_id = CONFIRM_SELECT_ID
+
+    no_wait = BitField()
+
+
+class SelectOK(ConfirmMethod):
+    method_id = CONFIRM_SELECT_OK_ID
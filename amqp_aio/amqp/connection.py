@@ -4,7 +4,8 @@ from amqp_aio.amqp.base_frame import FrameField
 from amqp_aio.amqp.consts import CONNECTION_CLASS_ID, CONNECTION_START_ID, \
     CONNECTION_START_OK_ID, CONNECTION_SECURE_ID, CONNECTION_SECURE_OK_ID, \
     CONNECTION_TUNE_ID, CONNECTION_TUNE_OK_ID, CONNECTION_OPEN_ID, \
-    CONNECTION_OPEN_OK_ID, CONNECTION_CLOSE_ID, CONNECTION_CLOSE_OK_ID
+    CONNECTION_OPEN_OK_ID, CONNECTION_CLOSE_ID, CONNECTION_CLOSE_OK_ID, \
+    CONNECTION_BLOCKED_ID, CONNECTION_UNBLOCKED_ID
 from amqp_aio.amqp.frames import MethodArguments, Frame, MethodFrame
 
 
@@ -123,3 +124,17 @@ class Close(ConnectionMethod):
 
 class CloseOK(ConnectionMethod):
     method_id = CONNECTION_CLOSE_OK_ID
+
+
+class Blocked(ConnectionMethod):
+    """
+    RabbitMQ extension, sent when the server stops reading from publishing
+    connections (e.g. memory or disk alarm)
+    """
+    method_id = CONNECTION_BLOCKED_ID
+
+    reason = FrameField(ShortString, default='')
+
+
+class Unblocked(ConnectionMethod):
+    method_id = CONNECTION_UNBLOCKED_ID
@@ -29,6 +29,9 @@ CONNECTION_OPEN_ID = 40
 CONNECTION_OPEN_OK_ID = 41
 CONNECTION_CLOSE_ID = 50
 CONNECTION_CLOSE_OK_ID = 51
+# RabbitMQ extension
+CONNECTION_BLOCKED_ID = 60
+CONNECTION_UNBLOCKED_ID = 61
 
 # Channel Class Consts
 
@@ -64,3 +67,31 @@ QUEUE_DELETE_ID = 40
 QUEUE_DELETE_OK_ID = 41
 
 
+# Basic Class Consts
+
+BASIC_CLASS_ID = 60
+BASIC_QOS_ID = 10
+BASIC_QOS_OK_ID = 11
+BASIC_CONSUME_ID = 20
+BASIC_CONSUME_OK_ID = 21
+BASIC_CANCEL_ID = 30
+BASIC_CANCEL_OK_ID = 31
+BASIC_PUBLISH_ID = 40
+BASIC_RETURN_ID = 50
+BASIC_DELIVER_ID = 60
+BASIC_GET_ID = 70
+BASIC_GET_OK_ID = 71
+BASIC_GET_EMPTY_ID = 72
+BASIC_ACK_ID = 80
+BASIC_REJECT_ID = 90
+BASIC_RECOVER_ASYNC_ID = 100
+BASIC_RECOVER_ID = 110
+BASIC_RECOVER_OK_ID = 111
+BASIC_NACK_ID = 120
+
+
+# Confirm Class Consts (RabbitMQ extension)
+
+CONFIRM_CLASS_ID = 85
+CONFIRM_SELECT_ID = 10
+CONFIRM_SELECT_OK_ID = 11
@@ -1,3 +1,6 @@
+import asyncio
+
+
 class AMQPException(Exception):
     ...
 
@@ -13,6 +16,33 @@ class FrameEndError(ProtocolError):
 class AMQPReplyError(ProtocolError):
     ...
 
+class ChannelClosed(AMQPException):
+    ...
+
+class Unroutable(AMQPException):
+    ...
+
+class RPCTimeout(AMQPException, asyncio.TimeoutError):
+    ...
+
+class MessageNacked(AMQPException):
+    ...
+
+class PublishBufferFull(AMQPException):
+    ...
+
+class ContentError(AMQPException):
+    ...
+
+class UnknownContentType(ContentError):
+    ...
+
+class UnknownContentEncoding(ContentError):
+    ...
+
+class DecodedBodyTooLarge(ContentError):
+    ...
+
 
 class ContentTooLarge(AMQPReplyError):
     value = 311
@@ -85,6 +115,9 @@ reply_exceptions = {
     541: InternalError
 }
 
+def error_from_server(reply_code, reply_text) -> AMQPException:
+    exc = reply_exceptions.get(reply_code, AMQPReplyError)
+    return exc(reply_text)
+
 def raise_error_from_server(reply_code, reply_text):
-    exc = reply_exceptions[reply_code]
-    raise exc(reply_text)
+    raise error_from_server(reply_code, reply_text)
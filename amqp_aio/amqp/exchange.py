@@ -1,5 +1,5 @@
-from amqp_aio.amqp.amqp_types import NoField, ShortString, Boolean, FieldTable
-from amqp_aio.amqp.base_frame import FrameField
+from amqp_aio.amqp.amqp_types import ShortString, FieldTable, ShortInt
+from amqp_aio.amqp.base_frame import FrameField, BitField
 from amqp_aio.amqp.consts import EXCHANGE_CLASS_ID, EXCHANGE_DECLARE_ID, \
     EXCHANGE_DECLARE_OK_ID, EXCHANGE_DELETE_ID, EXCHANGE_DELETE_OK_ID
 from amqp_aio.amqp.frames import MethodArguments, MethodFrame, Frame
@@ -10,31 +10,32 @@ class ExchangeMethod(MethodArguments):
     class_id = EXCHANGE_CLASS_ID
 
     @classmethod
-    def declare(cls, **arguments):
+    def declare(cls, channel, **arguments):
         return Frame.from_frame(MethodFrame(
             class_id=cls.class_id,
             method_id=cls.method_id,
             arguments=cls(**arguments)
-        ))
+        ), channel=channel)
 
 
 class Declare(ExchangeMethod):
     method_id = EXCHANGE_DECLARE_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     exchange = FrameField(ShortString)
-    type = FrameField(ShortString)
-    passive = FrameField(Boolean)
-    durable = FrameField(Boolean)
-    reserved_2 = FrameField(NoField)
-    reserved_3 = FrameField(NoField)
-    no_wait = FrameField(Boolean)
+    type = FrameField(ShortString, default='direct')
+    passive = BitField()
+    durable = BitField()
+    # Reserved by the spec, used by RabbitMQ as auto-delete and internal
+    auto_delete = BitField()
+    internal = BitField()
+    no_wait = BitField()
     arguments = FrameField(FieldTable)
 
     class Meta:
         parsing_order = [
             'reserved_1', 'exchange', 'type', 'passive', 'durable',
-            'reserved_2', 'reserved_3', 'no_wait', 'arguments'
+            'auto_delete', 'internal', 'no_wait', 'arguments'
         ]
 
 
@@ -45,10 +46,10 @@ class DeclareOK(ExchangeMethod):
 class Delete(ExchangeMethod):
     method_id = EXCHANGE_DELETE_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     exchange = FrameField(ShortString)
-    if_unused = FrameField(Boolean)
-    no_wait = FrameField(Boolean)
+    if_unused = BitField()
+    no_wait = BitField()
 
     class Meta:
         parsing_order = [
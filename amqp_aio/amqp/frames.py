@@ -1,12 +1,18 @@
-from amqp_aio.amqp.amqp_types import Octet, ShortInt, LongInt
-from amqp_aio.amqp.base_frame import BaseFrame, FrameField, FrameSelectorField
-from amqp_aio.amqp.consts import METHOD_TYPE, HEARTBEAT_TYPE
+from amqp_aio.amqp.amqp_types import Octet, ShortInt, LongInt, LongLongInt
+from amqp_aio.amqp.base_frame import BaseFrame, FrameField, \
+    FrameSelectorField, RawBytesField
+from amqp_aio.amqp.consts import METHOD_TYPE, HEARTBEAT_TYPE, HEADER_TYPE, \
+    BODY_TYPE
 from amqp_aio.amqp.selectors import select_method_frame
 
 
 def select_amqp_frame(frame):
     if frame.frame_type == METHOD_TYPE:
         return MethodFrame
+    if frame.frame_type == HEADER_TYPE:
+        return ContentHeaderFrame
+    if frame.frame_type == BODY_TYPE:
+        return ContentBodyFrame
     if frame.frame_type == HEARTBEAT_TYPE:
         return HeartbeatFrame
 
@@ -40,6 +46,10 @@ class Frame(FrameHeader):
         frame_type = None
         if isinstance(frame, MethodFrame):
             frame_type = METHOD_TYPE
+        elif isinstance(frame, ContentHeaderFrame):
+            frame_type = HEADER_TYPE
+        elif isinstance(frame, ContentBodyFrame):
+            frame_type = BODY_TYPE
         elif isinstance(frame, HeartbeatFrame):
             frame_type = HEARTBEAT_TYPE
         return Frame(frame_type=frame_type, payload=frame, channel=channel)
@@ -76,6 +86,60 @@ class MethodArguments(BaseFrame):
     class_id = None
     method_id = None
 
+    def to_frame(self, channel) -> Frame:
+        """
+        Wraps these arguments in a Method Frame for the given channel
+        """
+        return Frame.from_frame(MethodFrame(
+            class_id=self.class_id,
+            method_id=self.method_id,
+            arguments=self
+        ), channel=channel)
+
+    def copy(self, **changes) -> 'MethodArguments':
+        """
+        Returns a new instance with the same arguments, replacing the given
+        ones.
+        """
+        arguments = self.to_dict(recursive=False)
+        arguments.update(changes)
+        return type(self)(**arguments)
+
+
+class ContentHeaderFrame(BaseFrame):
+    """
+    Frame Details:
+     - Inside payload frame:
+
+    +----------+---------+-------------+----------------+----------------------
+    | class-id | weight  |  body size  | property flags | property list...
+    +----------+---------+-------------+----------------+----------------------
+      2 Bytes  | 2 Bytes |   8 Bytes   |    2 Bytes     |    remainder...
+
+    The property flags and list are kept as raw bytes, since their layout
+    depends on the content class (see basic.BasicProperties).
+    """
+    class_id = FrameField(ShortInt)
+    weight = FrameField(ShortInt, default=0)
+    body_size = FrameField(LongLongInt)
+    properties = RawBytesField(default=b'\x00\x00')
+
+    def __str__(self):
+        return 'ContentHeader<{} bytes>'.format(self.body_size)
+
+    class Meta:
+        parsing_order = ['class_id', 'weight', 'body_size', 'properties']
+
+
+class ContentBodyFrame(BaseFrame):
+    """
+    A slice of the message body. The whole payload is body data.
+    """
+    body = RawBytesField(default=b'')
+
+    def __str__(self):
+        return 'ContentBody<{} bytes>'.format(len(self.body))
+
 
 class HeartbeatFrame(BaseFrame):
     ...
\ No newline at end of file
@@ -1,7 +1,7 @@
-from amqp_aio.amqp.amqp_types import NoField, ShortString, Boolean, FieldTable, \
-    LongInt
+from amqp_aio.amqp.amqp_types import ShortString, FieldTable, LongInt, \
+    ShortInt
 
-from amqp_aio.amqp.base_frame import FrameField
+from amqp_aio.amqp.base_frame import FrameField, BitField
 from amqp_aio.amqp.consts import QUEUE_CLASS_ID, QUEUE_DECLARE_ID, \
     QUEUE_DECLARE_OK_ID, QUEUE_BIND_ID, QUEUE_BIND_OK_ID, QUEUE_UNBIND_ID, \
     QUEUE_UNBIND_OK_ID, QUEUE_PURGE_ID, QUEUE_PURGE_OK_ID, QUEUE_DELETE_ID, \
@@ -14,24 +14,24 @@ class QueueMethod(MethodArguments):
     method_id = None
 
     @classmethod
-    def declare(cls, **arguments):
+    def declare(cls, channel, **arguments):
         return Frame.from_frame(MethodFrame(
             class_id=cls.class_id,
             method_id=cls.method_id,
             arguments=cls(**arguments)
-        ))
+        ), channel=channel)
 
 
 class Declare(QueueMethod):
     method_id = QUEUE_DECLARE_ID
 
-    reserved_1 = FrameField(NoField)
-    queue = FrameField(ShortString)
-    passive = FrameField(Boolean)
-    durable = FrameField(Boolean)
-    exclusive = FrameField(Boolean)
-    auto_delete = FrameField(Boolean)
-    no_wait = FrameField(Boolean)
+    reserved_1 = FrameField(ShortInt, default=0)
+    queue = FrameField(ShortString, default='')
+    passive = BitField()
+    durable = BitField()
+    exclusive = BitField()
+    auto_delete = BitField()
+    no_wait = BitField()
     arguments = FrameField(FieldTable)
 
     class Meta:
@@ -57,11 +57,11 @@ class DeclareOK(QueueMethod):
 class Bind(QueueMethod):
     method_id = QUEUE_BIND_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     queue = FrameField(ShortString)
     exchange = FrameField(ShortString)
-    routing_key = FrameField(ShortString)
-    no_wait = FrameField(Boolean)
+    routing_key = FrameField(ShortString, default='')
+    no_wait = BitField()
     arguments = FrameField(FieldTable)
 
     class Meta:
@@ -78,10 +78,10 @@ class BindOK(QueueMethod):
 class Unbind(QueueMethod):
     method_id = QUEUE_UNBIND_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     queue = FrameField(ShortString)
     exchange = FrameField(ShortString)
-    routing_key = FrameField(ShortString)
+    routing_key = FrameField(ShortString, default='')
     arguments = FrameField(FieldTable)
 
     class Meta:
@@ -97,9 +97,9 @@ class UnbindOK(QueueMethod):
 class Purge(QueueMethod):
     method_id = QUEUE_PURGE_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     queue = FrameField(ShortString)
-    no_wait = FrameField(Boolean)
+    no_wait = BitField()
 
     class Meta:
         parsing_order = [
@@ -110,15 +110,17 @@ class Purge(QueueMethod):
 class PurgeOK(QueueMethod):
     method_id = QUEUE_PURGE_OK_ID
 
+    message_count = FrameField(LongInt)
+
 
 class Delete(QueueMethod):
     method_id = QUEUE_DELETE_ID
 
-    reserved_1 = FrameField(NoField)
+    reserved_1 = FrameField(ShortInt, default=0)
     queue = FrameField(ShortString)
-    if_unused = FrameField(Boolean)
-    if_empty = FrameField(Boolean)
-    no_wait = FrameField(Boolean)
+    if_unused = BitField()
+    if_empty = BitField()
+    no_wait = BitField()
 
     class Meta:
         parsing_order = [
@@ -8,7 +8,8 @@ def select_method_frame(frame):
     :param MethodFrame frame: MethodFrame instance
     :return: The method's corresponding frame class
     """
-    from amqp_aio.amqp import connection, channel, exchange, queue
+    from amqp_aio.amqp import connection, channel, exchange, queue, basic, \
+        confirm
     methods_map = {
         consts.CONNECTION_CLASS_ID: {
             consts.CONNECTION_START_ID: connection.Start,
@@ -21,6 +22,8 @@ def select_method_frame(frame):
             consts.CONNECTION_OPEN_OK_ID: connection.OpenOK,
             consts.CONNECTION_CLOSE_ID: connection.Close,
             consts.CONNECTION_CLOSE_OK_ID: connection.CloseOK,
+            consts.CONNECTION_BLOCKED_ID: connection.Blocked,
+            consts.CONNECTION_UNBLOCKED_ID: connection.Unblocked,
         },
         consts.CHANNEL_CLASS_ID: {
             consts.CHANNEL_OPEN_ID: channel.Open,
@@ -47,9 +50,66 @@ def select_method_frame(frame):
             consts.QUEUE_PURGE_OK_ID: queue.PurgeOK,
             consts.QUEUE_DELETE_ID: queue.Delete,
             consts.QUEUE_DELETE_OK_ID: queue.DeleteOK
+        },
+        consts.BASIC_CLASS_ID: {
+            consts.BASIC_QOS_ID: basic.Qos,
+            consts.BASIC_QOS_OK_ID: basic.QosOK,
+            consts.BASIC_CONSUME_ID: basic.Consume,
+            consts.BASIC_CONSUME_OK_ID: basic.ConsumeOK,
+            consts.BASIC_CANCEL_ID: basic.Cancel,
+            consts.BASIC_CANCEL_OK_ID: basic.CancelOK,
+            consts.BASIC_PUBLISH_ID: basic.Publish,
+            consts.BASIC_RETURN_ID: basic.Return,
+            consts.BASIC_DELIVER_ID: basic.Deliver,
+            consts.BASIC_GET_ID: basic.Get,
+            consts.BASIC_GET_OK_ID: basic.GetOK,
+            consts.BASIC_GET_EMPTY_ID: basic.GetEmpty,
+            consts.BASIC_ACK_ID: basic.Ack,
+            consts.BASIC_REJECT_ID: basic.Reject,
+            consts.BASIC_RECOVER_ASYNC_ID: basic.RecoverAsync,
+            consts.BASIC_RECOVER_ID: basic.Recover,
+            consts.BASIC_RECOVER_OK_ID: basic.RecoverOK,
+            consts.BASIC_NACK_ID: basic.Nack
+        },
+        consts.CONFIRM_CLASS_ID: {
+            consts.CONFIRM_SELECT_ID: confirm.Select,
+            consts.CONFIRM_SELECT_OK_ID: confirm.SelectOK
         }
     }
     cls_methods = methods_map[frame.class_id]
     return cls_methods[frame.method_id]
 
 
+
+
+_reply_methods = {}
+
+
+def select_reply_method(method):
+    """
+    Returns the method class the server answers a synchronous method with.
+    :param MethodArguments method: Method (or method class) sent by the client
+    :return: The reply method class, or None if the method is not answered
+    """
+    if not _reply_methods:
+        from amqp_aio.amqp import channel, exchange, queue, basic, confirm
+        _reply_methods.update({
+            channel.Open: channel.OpenOk,
+            channel.Flow: channel.FlowOK,
+            channel.Close: channel.CloseOK,
+            exchange.Declare: exchange.DeclareOK,
+            exchange.Delete: exchange.DeleteOK,
+            queue.Declare: queue.DeclareOK,
+            queue.Bind: queue.BindOK,
+            queue.Unbind: queue.UnbindOK,
+            queue.Purge: queue.PurgeOK,
+            queue.Delete: queue.DeleteOK,
+            basic.Qos: basic.QosOK,
+            basic.Consume: basic.ConsumeOK,
+            basic.Cancel: basic.CancelOK,
+            basic.Recover: basic.RecoverOK,
+            confirm.Select: confirm.SelectOK,
+        })
+    if not isinstance(method, type):
+        method = type(method)
+    return _reply_methods.get(method)
@@ -2,7 +2,8 @@ import pytest
 
 from amqp_aio.amqp.amqp_types import Octet, ShortInt, LongInt, ShortString, \
     FieldTable, LongString
-from amqp_aio.amqp.base_frame import BaseFrame, FrameField, FrameSelectorField
+from amqp_aio.amqp.base_frame import BaseFrame, FrameField, \
+    FrameSelectorField, BitField
 
 
 def frame_selector(frame):
@@ -115,3 +116,30 @@ def test_frame_from_bytes_selector():
     assert f.field_3 == 10
     assert isinstance(f.field_2, Frame2)
     assert f.field_2.field_1 == 'test'
+
+
+
+class BitsFrame(BaseFrame):
+    field_1 = FrameField(ShortString)
+    bit_1 = BitField()
+    bit_2 = BitField()
+    bit_3 = BitField()
+    field_2 = FrameField(Octet)
+    bit_4 = BitField()
+
+    class Meta:
+        parsing_order = [
+            'field_1', 'bit_1', 'bit_2', 'bit_3', 'field_2', 'bit_4'
+        ]
+
+
+def test_bit_fields_packed_to_bytes():
+    f = BitsFrame(field_1='a', bit_1=True, bit_3=True, field_2=7, bit_4=True)
+    assert f.to_bytes() == b'\x01a\x05\x07\x01'
+
+
+def test_bit_fields_from_bytes():
+    f, remaining = BitsFrame.from_bytes(b'\x01a\x06\x07\x00\xff')
+    assert remaining == b'\xff'
+    assert (f.bit_1, f.bit_2, f.bit_3, f.bit_4) == (False, True, True, False)
+    assert f.field_2 == 7
@@ -0,0 +1,1092 @@
+import asyncio
+import itertools
+import logging
+import struct
+from collections import deque, OrderedDict
+from time import perf_counter
+from typing import List, Optional
+
+from amqp_aio.amqp import channel, basic, confirm as amqp_confirm
+from amqp_aio.amqp import exchange as amqp_exchange
+from amqp_aio.amqp import queue as amqp_queue
+from amqp_aio.amqp.consts import FRAME_END, HEADER_TYPE, BODY_TYPE, \
+    BASIC_CLASS_ID
+from amqp_aio.amqp.exceptions import ChannelClosed, error_from_server, \
+    UnexpectedFrame, MessageNacked
+from amqp_aio.amqp.frames import ContentHeaderFrame, ContentBodyFrame
+from amqp_aio.amqp.selectors import select_reply_method
+from amqp_aio.message import Message, BodyStream
+from amqp_aio.profiling import ENCODE
+from amqp_aio.ratelimit import RateLimiter
+from amqp_aio.spool import FramedBody, map_body
+
+logger = logging.getLogger(__name__)
+
+# Frame header (type, channel, size) and the fixed part of a content header
+# payload (class id, weight, body size)
+_FRAME_HEADER = struct.Struct('>BHI')
+_CONTENT_HEADER = struct.Struct('>BHIHHQ')
+_CONTENT_HEADER_SIZE = 12
+
+
+class _ConfirmBatch:
+    """
+    Settles a single future once every message of a batch is confirmed
+    """
+    __slots__ = ('future', 'remaining', 'published_at')
+
+    def __init__(self, count, wait=True, published_at=None):
+        """
+        :param bool wait: Whether a future is needed, batches only kept for
+        the confirm latency metrics having none
+        :param float published_at: Loop time of the publish
+        """
+        self.future = None
+        if wait:
+            self.future = asyncio.get_event_loop().create_future()
+        self.remaining = count
+        self.published_at = published_at
+
+    def settle(self, exc=None):
+        if self.future is None or self.future.done():
+            return
+        if exc is not None:
+            self.future.set_exception(exc)
+            return
+        self.remaining -= 1
+        if not self.remaining:
+            self.future.set_result(None)
+
+
+class Channel:
+    """
+    AMQP Channel Class for Client Side
+
+    A virtual connection multiplexed over an AMQPConnection. Channels are
+    created through AMQPConnection.channel(), which takes care of allocating
+    the channel number and opening it.
+
+    Synchronous methods are pipelined: the server answers them in the order
+    they were sent on a channel, so each sent method gets a future queued in
+    a FIFO, and every reply resolves the oldest pending future. Many methods
+    can therefore be in flight at once, costing a single round trip.
+    """
+    class_id = 20
+
+    def __init__(self, connection, channel_id):
+        """
+        :param AMQPConnection connection: Connection this channel is bound to
+        :param int channel_id: Channel number allocated by the connection
+        """
+        self.connection = connection
+        self.channel_id = channel_id
+        self._opened = False
+        self._closed = False
+        self.close_exception = None
+        self._pending_replies = deque()
+        self._reply_routes = set()
+        self._consumers = {}
+        self._consumer_tags = itertools.count(1)
+        self._return_callbacks = []
+        self._content_method = None
+        self._content_header = None
+        self._content_body = []
+        self._content_received = 0
+        self._content_buffer = None
+        # Callable(method, body size) returning a writable buffer the body
+        # of a message is reassembled into, or None for bytes
+        self.body_allocator = None
+        self._confirming = False
+        self._next_delivery_tag = 1
+        # delivery tag -> _ConfirmBatch, or None when nobody waits for it
+        self._unconfirmed = OrderedDict()
+        # Cleared while the server paused the channel with Flow
+        self._flow = asyncio.Event()
+        self._flow.set()
+        self.publish_wait_time = 0.0
+        # delivery tag -> loop time of the delivery, only kept with metrics
+        self._delivered_at = OrderedDict()
+        self._no_ack_consumers = set()
+        self._streaming_consumers = set()
+        # (BodyStream, callback task) of the message being streamed in
+        self._content_stream = None
+        # Set once the message being streamed out is complete
+        self._streaming_out = None
+        self.rate_limiter = RateLimiter()
+        router = connection.router
+        router.register_route(
+            channel_id, channel.Close, self._on_close_requested
+        )
+        router.register_route(
+            channel_id, basic.Deliver, self._on_content_method
+        )
+        router.register_route(
+            channel_id, basic.Return, self._on_content_method
+        )
+        router.register_route(
+            channel_id, basic.Cancel, self._on_cancel_requested
+        )
+        router.register_route(channel_id, channel.Flow, self._on_flow)
+        router.register_route(channel_id, basic.Ack, self._on_confirm)
+        router.register_route(channel_id, basic.Nack, self._on_confirm)
+        router.register_route(
+            channel_id, ContentHeaderFrame, self._on_content_header
+        )
+        router.register_route(
+            channel_id, ContentBodyFrame, self._on_content_body
+        )
+
+    @property
+    def is_open(self):
+        return self._opened and not self._closed
+
+    @property
+    def is_closed(self):
+        return self._closed
+
+    @property
+    def is_flowing(self):
+        """
+        Whether the server accepts content on this channel, neither the
+        channel being paused with Flow nor the connection blocked
+        """
+        return self._flow.is_set() and not self.connection.is_blocked
+
+    async def _wait_flowing(self):
+        """
+        Parks the caller while the channel is paused or the connection is
+        blocked. The time spent waiting is added to publish_wait_time.
+        """
+        if self.is_flowing or self._closed:
+            return
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        try:
+            while not (self.is_flowing or self._closed):
+                await self._flow.wait()
+                await self.connection.wait_unblocked()
+        finally:
+            self.publish_wait_time += loop.time() - started
+
+    async def _on_flow(self, frame: channel.Flow):
+        if frame.active:
+            self._flow.set()
+        else:
+            self._flow.clear()
+        await self._send_to_server(
+            channel.FlowOK(active=frame.active).to_frame(self.channel_id),
+            urgent=True
+        )
+
+    async def _send_to_server(self, data, urgent=False):
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        await self.connection._send_to_server(data, urgent=urgent)
+
+    async def _send_frames(self, frames):
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        await self.connection._send_frames(frames)
+
+    async def _send_content(self, buffer, message_cuts, frame_cuts,
+                            stats=None):
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        await self.connection._send_content(
+            buffer, self.channel_id, message_cuts=message_cuts,
+            frame_cuts=frame_cuts, stats=stats
+        )
+
+    def _expect_reply(self, method) -> asyncio.Future:
+        reply_class = select_reply_method(method)
+        if reply_class is None:
+            raise TypeError(
+                "{} is not a synchronous method".format(type(method))
+            )
+        if reply_class not in self._reply_routes:
+            self.connection.router.register_route(
+                self.channel_id, reply_class, self._handle_reply
+            )
+            self._reply_routes.add(reply_class)
+        future = asyncio.get_event_loop().create_future()
+        self._pending_replies.append((reply_class, future))
+        return future
+
+    async def rpc_many(self, methods) -> List[asyncio.Future]:
+        """
+        Sends synchronous methods in a single write, without waiting for
+        their replies.
+
+        Methods sent with no_wait are not answered by the server, so no
+        future is returned for them.
+        :param methods: MethodArguments instances
+        :return: One future per answered method, in the order given,
+        resolved with the reply method arguments
+        """
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        futures = [
+            self._expect_reply(method) for method in methods
+            if not getattr(method, 'no_wait', False)
+        ]
+        try:
+            await self._send_frames([
+                method.to_frame(self.channel_id) for method in methods
+            ])
+        except BaseException as exc:
+            self._fail_replies(futures, exc)
+            raise
+        return futures
+
+    async def rpc(self, method) -> asyncio.Future:
+        """
+        Sends a synchronous method without waiting for its reply.
+
+        Usage:
+            futures = [await channel.rpc(m) for m in methods]
+            replies = await asyncio.gather(*futures)
+
+        :param method: MethodArguments instance
+        :return: Future resolved with the reply method arguments
+        """
+        futures = await self.rpc_many([method])
+        return futures[0]
+
+    async def _call(self, method):
+        """
+        Sends a synchronous method and waits for the server reply
+        """
+        return await (await self.rpc(method))
+
+    def _fail_replies(self, futures, exc):
+        failed = set(futures)
+        self._pending_replies = deque(
+            pending for pending in self._pending_replies
+            if pending[1] not in failed
+        )
+        for future in futures:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def _handle_reply(self, frame):
+        if not self._pending_replies:
+            return
+        reply_class, future = self._pending_replies.popleft()
+        if future.done():
+            return
+        if isinstance(frame, reply_class):
+            future.set_result(frame)
+        else:
+            future.set_exception(UnexpectedFrame(
+                "Expected {} reply, received {}".format(
+                    reply_class.__name__, type(frame).__name__
+                )
+            ))
+
+    async def _declare(self, method):
+        topology = self.connection.topology
+        reply = topology.lookup(method)
+        if reply is not None:
+            return reply
+        reply = await self._call(method)
+        topology.record(method, reply)
+        return reply
+
+    async def exchange_declare(self, exchange, type='direct', passive=False,
+                               durable=False, auto_delete=False,
+                               internal=False, arguments=None):
+        """
+        Declares an exchange. Declarations identical to one already
+        acknowledged are answered without contacting the server.
+        :return: exchange.DeclareOK
+        """
+        method = amqp_exchange.Declare(
+            exchange=exchange, type=type, passive=passive, durable=durable,
+            auto_delete=auto_delete, internal=internal,
+            arguments=arguments or {}
+        )
+        return await self._declare(method)
+
+    async def exchange_delete(self, exchange, if_unused=False):
+        method = amqp_exchange.Delete(exchange=exchange, if_unused=if_unused)
+        reply = await self._call(method)
+        self.connection.topology.forget(method)
+        return reply
+
+    async def queue_declare(self, queue='', passive=False, durable=False,
+                            exclusive=False, auto_delete=False,
+                            arguments=None):
+        """
+        Declares a queue. Declarations identical to one already acknowledged
+        are answered without contacting the server, in which case the
+        message and consumer counts are the ones of the first reply.
+        :return: queue.DeclareOK
+        """
+        method = amqp_queue.Declare(
+            queue=queue, passive=passive, durable=durable,
+            exclusive=exclusive, auto_delete=auto_delete,
+            arguments=arguments or {}
+        )
+        return await self._declare(method)
+
+    async def queue_bind(self, queue, exchange, routing_key='',
+                         arguments=None):
+        method = amqp_queue.Bind(
+            queue=queue, exchange=exchange, routing_key=routing_key,
+            arguments=arguments or {}
+        )
+        return await self._declare(method)
+
+    async def queue_unbind(self, queue, exchange, routing_key='',
+                           arguments=None):
+        method = amqp_queue.Unbind(
+            queue=queue, exchange=exchange, routing_key=routing_key,
+            arguments=arguments or {}
+        )
+        reply = await self._call(method)
+        self.connection.topology.forget(method)
+        return reply
+
+    async def queue_delete(self, queue, if_unused=False, if_empty=False):
+        method = amqp_queue.Delete(
+            queue=queue, if_unused=if_unused, if_empty=if_empty
+        )
+        reply = await self._call(method)
+        self.connection.topology.forget(method)
+        return reply
+
+    def _encode_messages(self, buffer, messages, exchange='',
+                         routing_key='', properties=None, mandatory=False,
+                         immediate=False, message_cuts=None,
+                         frame_cuts=None, usage=None, stats=None) -> int:
+        """
+        Appends the method, header and body frames of each message to
+        buffer. Method frames and properties shared by several messages are
+        encoded only once.
+        :param list message_cuts: Collects the offset where each message
+        ends
+        :param list frame_cuts: Collects the offsets of frame ends inside
+        messages spanning several body frames, where the scheduler may
+        interleave other channels
+        :param dict usage: Collects the messages and body bytes published to
+        each exchange, as exchange -> [messages, bytes]
+        :param list stats: Accumulates the messages, method bytes, header
+        bytes, body frames and body bytes encoded
+        :return: The number of messages encoded
+        """
+        channel_id = self.channel_id
+        frame_size = self.connection.body_frame_size
+        method_frames = {}
+        encoded_properties = {}
+        count = 0
+        for message in messages:
+            options = message if isinstance(message, dict) else {}
+            body = options['body'] if options else message
+            if isinstance(body, str):
+                body = body.encode()
+            key = (
+                options.get('exchange', exchange),
+                options.get('routing_key', routing_key),
+                options.get('mandatory', mandatory),
+                options.get('immediate', immediate),
+            )
+            method_frame = method_frames.get(key)
+            if method_frame is None:
+                method = basic.Publish(
+                    exchange=key[0], routing_key=key[1], mandatory=key[2],
+                    immediate=key[3]
+                )
+                method_frame = method.to_frame(channel_id).to_bytes()
+                method_frame = method_frames[key] = method_frame + FRAME_END
+            buffer += method_frame
+
+            message_properties = options.get('properties', properties)
+            # Keyed by id, the cached instance keeping the id from reuse
+            cached = encoded_properties.get(id(message_properties))
+            if cached is None:
+                cached = encoded_properties[id(message_properties)] = (
+                    message_properties, (
+                        message_properties or basic.BasicProperties()
+                    ).to_bytes()
+                )
+            property_bytes = cached[1]
+            buffer += _CONTENT_HEADER.pack(
+                HEADER_TYPE, channel_id,
+                _CONTENT_HEADER_SIZE + len(property_bytes),
+                BASIC_CLASS_ID, 0, len(body)
+            )
+            buffer += property_bytes
+            buffer += FRAME_END
+
+            view = memoryview(body)
+            split = frame_cuts is not None and len(body) > frame_size
+            for offset in range(0, len(body), frame_size):
+                if split:
+                    frame_cuts.append(len(buffer))
+                chunk = view[offset:offset + frame_size]
+                buffer += _FRAME_HEADER.pack(BODY_TYPE, channel_id, len(chunk))
+                buffer += chunk
+                buffer += FRAME_END
+            if message_cuts is not None:
+                message_cuts.append(len(buffer))
+            if stats is not None:
+                body_frames = -(-len(body) // frame_size)
+                stats[0] += 1
+                stats[1] += len(method_frame)
+                stats[2] += _CONTENT_HEADER.size + len(property_bytes) + 1
+                stats[3] += body_frames
+                stats[4] += len(body) + body_frames * 8
+            if usage is not None:
+                published = usage.get(key[0])
+                if published is None:
+                    published = usage[key[0]] = [0, 0]
+                published[0] += 1
+                published[1] += len(body)
+            count += 1
+        return count
+
+    async def publish_many(self, messages, exchange='', routing_key='',
+                           properties=None, mandatory=False, immediate=False,
+                           confirm=False) -> Optional[asyncio.Future]:
+        """
+        Publishes a batch of messages, encoded into a single buffer and
+        handed to the transport in one write.
+
+        Each message is either a body, published with the keyword arguments
+        given here, or a dict with a 'body' key and any of the 'exchange',
+        'routing_key', 'properties', 'mandatory' and 'immediate' keys
+        overriding them.
+
+        While the server paused the channel (channel.Flow) or blocked the
+        connection (connection.Blocked), the call waits until it resumes,
+        instead of writing into a socket the server stopped reading. It also
+        waits for the channel and connection rate_limiter budgets.
+
+        Usage:
+            confirmed = await channel.publish_many(
+                rows, routing_key='etl', confirm=True
+            )
+            await confirmed
+
+        :param messages: Iterable of bodies or dicts
+        :param bool confirm: Return a future resolved once the server
+        confirmed every message of the batch, or failed with MessageNacked
+        if any was rejected. Puts the channel in confirm mode if needed
+        :return: The confirms future when confirm is set, otherwise None
+        """
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        if confirm and not self._confirming:
+            await self.confirm_select()
+        limiters = self._limiters()
+        usage = {} if limiters else None
+        metrics = self.connection.metrics
+        stats = [0, 0, 0, 0, 0] if metrics is not None else None
+        profiler = self.connection.profiler
+        started = perf_counter() if profiler is not None else 0
+        buffer = bytearray()
+        message_cuts = []
+        frame_cuts = []
+        count = self._encode_messages(
+            buffer, messages, exchange=exchange, routing_key=routing_key,
+            properties=properties, mandatory=mandatory, immediate=immediate,
+            message_cuts=message_cuts, frame_cuts=frame_cuts, usage=usage,
+            stats=stats
+        )
+        if profiler is not None:
+            profiler.record(ENCODE, perf_counter() - started)
+        return await self._publish_encoded(
+            buffer, count, message_cuts, frame_cuts, limiters, usage, stats,
+            confirm
+        )
+
+    def _limiters(self):
+        return [
+            limiter for limiter in (
+                self.rate_limiter, self.connection.rate_limiter
+            ) if limiter
+        ]
+
+    async def _publish_encoded(self, buffer, count, message_cuts, frame_cuts,
+                               limiters, usage, stats, confirm,
+                               stream=False):
+        """
+        Sends encoded messages once the rate limits and flow control allow,
+        tracking their confirms
+        :param bool stream: Whether the buffer only holds the beginning of a
+        message, whose other frames are sent by publish_stream
+        """
+        metrics = self.connection.metrics
+        if usage:
+            await self._throttle(limiters, usage)
+        await self._wait_flowing()
+        while self._streaming_out is not None:
+            # The frames of a streamed message must stay contiguous
+            await self._streaming_out.wait()
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        # No await from here on until the frames are queued, keeping the
+        # delivery tags in publish order
+        batch = None
+        if confirm or (metrics is not None and self._confirming):
+            batch = _ConfirmBatch(count, wait=confirm, published_at=(
+                asyncio.get_event_loop().time() if metrics is not None
+                else None
+            ))
+        if self._confirming:
+            first = self._next_delivery_tag
+            self._next_delivery_tag += count
+            for delivery_tag in range(first, first + count):
+                self._unconfirmed[delivery_tag] = batch
+        if confirm and not count:
+            batch.future.set_result(None)
+        if stream:
+            self._streaming_out = asyncio.Event()
+        if count:
+            try:
+                await self._send_content(
+                    buffer, message_cuts, frame_cuts, stats
+                )
+            except BaseException:
+                if stream:
+                    # Part of the message may be queued already, and the
+                    # server can't be told to drop it
+                    self._end_streaming_out()
+                    asyncio.ensure_future(self.connection.close())
+                raise
+        return batch.future if confirm else None
+
+    def _end_streaming_out(self):
+        """
+        Lets the publishers waiting for a streamed message go on
+        """
+        if self._streaming_out is not None:
+            self._streaming_out.set()
+            self._streaming_out = None
+
+    async def _throttle(self, limiters, usage):
+        """
+        Charges the published messages to the channel and connection rate
+        limits, sleeping only when a budget is exhausted
+        """
+        clock = asyncio.get_event_loop().time
+        delay = max(limiter.charge(usage, clock) for limiter in limiters)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def publish(self, body, exchange='', routing_key='',
+                      properties=None, mandatory=False, immediate=False,
+                      confirm=False) -> Optional[asyncio.Future]:
+        """
+        Publishes a message. Its frames are written at once, so they are
+        never interleaved with other frames of this channel.
+        :param bytes body: Message body
+        :param str exchange: Exchange name. Defaults to the default exchange
+        :param str routing_key: Message routing key
+        :param BasicProperties properties: Message properties
+        :param bool mandatory: Ask the server to return the message if it
+        can't be routed to any queue (see add_return_callback)
+        :param bool immediate: Not supported by RabbitMQ
+        :param bool confirm: Return a future resolved once the server
+        confirmed the message (see publish_many)
+        """
+        return await self.publish_many(
+            [body], exchange=exchange, routing_key=routing_key,
+            properties=properties, mandatory=mandatory, immediate=immediate,
+            confirm=confirm
+        )
+
+    async def publish_file(self, body, exchange='', routing_key='',
+                           properties=None, mandatory=False,
+                           confirm=False) -> Optional[asyncio.Future]:
+        """
+        Publishes a file or mmap as a message body without loading it.
+
+        The body frames are sliced from the mapping as the scheduler writes
+        them, so memory use stays flat whatever the body size.
+        :param body: File object opened in binary mode (mapped read-only),
+        mmap or any other buffer
+        :param bool confirm: Return a future resolved once the server
+        confirmed the message (see publish_many)
+        """
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        if confirm and not self._confirming:
+            await self.confirm_select()
+        body = memoryview(map_body(body))
+        prefix, method_size = self._encode_content_prefix(
+            exchange, routing_key, properties, mandatory, len(body)
+        )
+        framed = FramedBody(
+            prefix, body, self.channel_id, self.connection.body_frame_size
+        )
+        limiters = self._limiters()
+        usage = {exchange: [1, len(body)]} if limiters else None
+        stats = None
+        if self.connection.metrics is not None:
+            stats = [
+                1, method_size, len(prefix) - method_size, framed.frames,
+                len(body) + framed.frames * 8
+            ]
+        return await self._publish_encoded(
+            framed, 1, [len(framed)], framed.frame_cuts, limiters, usage,
+            stats, confirm
+        )
+
+    def _encode_content_prefix(self, exchange, routing_key, properties,
+                               mandatory, size):
+        """
+        Encodes the method and content header frames of a single message
+        :return: The frames and the size of the method frame
+        """
+        prefix = bytearray(basic.Publish(
+            exchange=exchange, routing_key=routing_key, mandatory=mandatory
+        ).to_frame(self.channel_id).to_bytes())
+        prefix += FRAME_END
+        method_size = len(prefix)
+        property_bytes = (properties or basic.BasicProperties()).to_bytes()
+        prefix += _CONTENT_HEADER.pack(
+            HEADER_TYPE, self.channel_id,
+            _CONTENT_HEADER_SIZE + len(property_bytes), BASIC_CLASS_ID, 0,
+            size
+        )
+        prefix += property_bytes
+        prefix += FRAME_END
+        return prefix, method_size
+
+    async def publish_stream(self, chunks, size, exchange='', routing_key='',
+                             properties=None, mandatory=False,
+                             confirm=False) -> Optional[asyncio.Future]:
+        """
+        Publishes a message whose body is produced while it is sent.
+
+        Body frames, of up to the frame size negotiated with the server, are
+        written as the chunks are produced. Other publishes on this channel
+        wait for the message to complete, its frames having to stay
+        contiguous, while the other channels keep sending.
+
+        The body size is part of the content header, so it must be known
+        beforehand. A message can't be aborted once started: if chunks
+        raises, or doesn't produce exactly size bytes, the connection is
+        closed, as the server would do anyway.
+
+        Usage:
+            await channel.publish_stream(
+                read_log_bundle(path), size=os.path.getsize(path),
+                routing_key='logs'
+            )
+
+        :param chunks: Async iterable of bytes
+        :param int size: Total body size, in bytes
+        :param bool confirm: Return a future resolved once the server
+        confirmed the message (see publish_many)
+        """
+        if self._closed:
+            raise ChannelClosed(
+                "Channel {} is closed".format(self.channel_id)
+            ) from self.close_exception
+        if confirm and not self._confirming:
+            await self.confirm_select()
+        frame_size = self.connection.body_frame_size
+        prefix, method_size = self._encode_content_prefix(
+            exchange, routing_key, properties, mandatory, size
+        )
+        limiters = self._limiters()
+        usage = {exchange: [1, size]} if limiters else None
+        frames = -(-size // frame_size)
+        stats = None
+        if self.connection.metrics is not None:
+            stats = [
+                1, method_size, len(prefix) - method_size, frames,
+                size + frames * 8
+            ]
+        if not size:
+            return await self._publish_encoded(
+                prefix, 1, [len(prefix)], [], limiters, usage, stats, confirm
+            )
+        confirmed = await self._publish_encoded(
+            prefix, 1, [], [len(prefix)], limiters, usage, stats, confirm,
+            stream=True
+        )
+        try:
+            received = 0
+            pending = bytearray()
+            async for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                received += len(chunk)
+                if received > size:
+                    raise ValueError(
+                        "Stream produced more than {} bytes".format(size)
+                    )
+                pending += chunk
+                if received == size:
+                    ready = len(pending)
+                else:
+                    ready = len(pending) // frame_size * frame_size
+                if ready:
+                    with memoryview(pending) as view:
+                        await self._send_body_frames(
+                            view[:ready], received == size
+                        )
+                    del pending[:ready]
+            if received != size:
+                raise ValueError("Stream produced {} of {} bytes".format(
+                    received, size
+                ))
+        except BaseException:
+            # The server can't be told to drop a partial message
+            asyncio.ensure_future(self.connection.close())
+            raise
+        finally:
+            self._end_streaming_out()
+        return confirmed
+
+    async def _send_body_frames(self, body, last):
+        """
+        Sends the body frames of a streamed message
+        :param bool last: Whether body completes the message
+        """
+        frame_size = self.connection.body_frame_size
+        buffer = bytearray()
+        frame_cuts = []
+        for offset in range(0, len(body), frame_size):
+            if offset:
+                frame_cuts.append(len(buffer))
+            buffer += _FRAME_HEADER.pack(
+                BODY_TYPE, self.channel_id,
+                min(frame_size, len(body) - offset)
+            )
+            buffer += body[offset:offset + frame_size]
+            buffer += FRAME_END
+        if last:
+            message_cuts = [len(buffer)]
+        else:
+            message_cuts = []
+            frame_cuts.append(len(buffer))
+        await self._send_content(buffer, message_cuts, frame_cuts)
+
+    async def confirm_select(self):
+        """
+        Puts the channel in publisher confirms mode, from which on the
+        server acknowledges every published message.
+        """
+        if self._confirming:
+            return
+        # The server numbers the messages published after the Select frame,
+        # which the publishes queued from now on follow, so delivery tags
+        # are counted from here rather than once SelectOK arrives
+        self._confirming = True
+        await self._call(amqp_confirm.Select())
+
+    async def _on_confirm(self, frame):
+        # basic.Ack or basic.Nack sent by the server in confirm mode
+        exc = None
+        if isinstance(frame, basic.Nack):
+            exc = MessageNacked(
+                "Message {} was rejected by the server".format(
+                    frame.delivery_tag
+                )
+            )
+        if not frame.multiple:
+            batches = [self._unconfirmed.pop(frame.delivery_tag, None)]
+        else:
+            batches = []
+            last = frame.delivery_tag or self._next_delivery_tag
+            while self._unconfirmed:
+                delivery_tag = next(iter(self._unconfirmed))
+                if delivery_tag > last:
+                    break
+                batches.append(self._unconfirmed.pop(delivery_tag))
+        metrics = self.connection.metrics
+        now = asyncio.get_event_loop().time() if metrics is not None else 0
+        for batch in batches:
+            if batch is None:
+                continue
+            batch.settle(exc)
+            if metrics is not None and batch.published_at is not None:
+                metrics.confirm_latency.observe(now - batch.published_at)
+
+    async def qos(self, prefetch_count=0, prefetch_size=0, is_global=False):
+        """
+        Limits the unacknowledged messages the server delivers
+        """
+        return await self._call(basic.Qos(
+            prefetch_count=prefetch_count, prefetch_size=prefetch_size,
+            is_global=is_global
+        ))
+
+    async def consume(self, queue, callback, no_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None,
+                      stream=False) -> str:
+        """
+        Starts a consumer.
+
+        The callback is awaited with each delivered Message from the read
+        loop, so no other frame is read until it returns. Long running work
+        should be handed off to a task.
+
+        Streaming consumers get each Message as soon as its content header
+        is received, without its body: the frames are read from
+        Message.iter_body() as they arrive, while the callback runs.
+        :param str queue: Queue to consume from
+        :param callback: Coroutine function receiving the Message
+        :param bool no_ack: Whether the server should consider messages
+        acknowledged as soon as they are delivered
+        :param bool exclusive: Request exclusive consumer access
+        :param str consumer_tag: Consumer identifier. Generated if not given
+        :param dict arguments: Consume arguments
+        :param bool stream: Stream the message bodies
+        :return: The consumer tag
+        """
+        consumer_tag = consumer_tag or 'ctag{}.{}'.format(
+            self.channel_id, next(self._consumer_tags)
+        )
+        # Registered before sending, since deliveries may be routed before
+        # the ConsumeOK future callbacks get to run
+        self._consumers[consumer_tag] = callback
+        if no_ack:
+            self._no_ack_consumers.add(consumer_tag)
+        if stream:
+            self._streaming_consumers.add(consumer_tag)
+        try:
+            await self._call(basic.Consume(
+                queue=queue, consumer_tag=consumer_tag, no_ack=no_ack,
+                exclusive=exclusive, arguments=arguments or {}
+            ))
+        except BaseException:
+            self._forget_consumer(consumer_tag)
+            raise
+        return consumer_tag
+
+    async def cancel(self, consumer_tag):
+        """
+        Stops a consumer
+        """
+        await self._call(basic.Cancel(consumer_tag=consumer_tag))
+        self._forget_consumer(consumer_tag)
+
+    def _forget_consumer(self, consumer_tag):
+        self._consumers.pop(consumer_tag, None)
+        self._no_ack_consumers.discard(consumer_tag)
+        self._streaming_consumers.discard(consumer_tag)
+
+    def _settle_deliveries(self, delivery_tag, multiple):
+        """
+        Reports the deliver to ack latency of acknowledged deliveries
+        """
+        if not self._delivered_at:
+            return
+        now = asyncio.get_event_loop().time()
+        if not multiple:
+            delivered = [self._delivered_at.pop(delivery_tag, None)]
+        else:
+            delivered = []
+            while self._delivered_at:
+                tag = next(iter(self._delivered_at))
+                if delivery_tag and tag > delivery_tag:
+                    break
+                delivered.append(self._delivered_at.pop(tag))
+        latency = self.connection.metrics.ack_latency
+        for delivered_at in delivered:
+            if delivered_at is not None:
+                latency.observe(now - delivered_at)
+
+    async def ack(self, delivery_tag, multiple=False):
+        self._settle_deliveries(delivery_tag, multiple)
+        await self._send_to_server(basic.Ack(
+            delivery_tag=delivery_tag, multiple=multiple
+        ).to_frame(self.channel_id), urgent=True)
+
+    async def nack(self, delivery_tag, multiple=False, requeue=True):
+        self._settle_deliveries(delivery_tag, multiple)
+        await self._send_to_server(basic.Nack(
+            delivery_tag=delivery_tag, multiple=multiple, requeue=requeue
+        ).to_frame(self.channel_id), urgent=True)
+
+    async def reject(self, delivery_tag, requeue=True):
+        self._settle_deliveries(delivery_tag, False)
+        await self._send_to_server(basic.Reject(
+            delivery_tag=delivery_tag, requeue=requeue
+        ).to_frame(self.channel_id), urgent=True)
+
+    def add_return_callback(self, callback):
+        """
+        Registers a coroutine function awaited with each Message returned by
+        the server as unroutable
+        """
+        self._return_callbacks.append(callback)
+        return callback
+
+    async def _on_cancel_requested(self, frame: basic.Cancel):
+        # Sent by the server when the consumed queue is deleted
+        self._forget_consumer(frame.consumer_tag)
+        if not frame.no_wait:
+            await self._send_to_server(basic.CancelOK(
+                consumer_tag=frame.consumer_tag
+            ).to_frame(self.channel_id))
+
+    async def _on_content_method(self, frame):
+        self._content_method = frame
+        self._content_header = None
+        self._content_body = []
+        self._content_received = 0
+        self._content_buffer = None
+        self._content_stream = None
+
+    async def _on_content_header(self, frame: ContentHeaderFrame):
+        self._content_header = frame
+        method = self._content_method
+        if isinstance(method, basic.Deliver) and \
+                method.consumer_tag in self._streaming_consumers:
+            await self._start_stream(method, frame)
+        elif frame.body_size == 0:
+            await self._on_content_complete()
+        elif self.body_allocator is not None:
+            self._content_buffer = self.body_allocator(
+                self._content_method, frame.body_size
+            )
+
+    async def _on_content_body(self, frame: ContentBodyFrame):
+        received = self._content_received
+        self._content_received += len(frame.body)
+        if self._content_stream is not None:
+            await self._content_stream[0].feed(frame.body)
+            if self._content_received >= self._content_header.body_size:
+                await self._end_stream()
+            return
+        if self._content_buffer is not None:
+            self._content_buffer[received:self._content_received] = \
+                frame.body
+        else:
+            self._content_body.append(frame.body)
+        if self._content_received >= self._content_header.body_size:
+            await self._on_content_complete()
+
+    async def _on_content_complete(self):
+        method, header = self._content_method, self._content_header
+        chunks = self._content_body
+        if self._content_buffer is not None:
+            body = self._content_buffer
+            self._content_buffer = None
+        else:
+            body = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        self._content_method = self._content_header = None
+        self._content_body = []
+        message = Message(self, method, header.properties, body)
+        if isinstance(method, basic.Deliver):
+            self._record_delivery(method)
+            callback = self._consumers.get(method.consumer_tag)
+            if callback is not None:
+                await self._run_callback(callback(message))
+        else:
+            for callback in self._return_callbacks:
+                await self._run_callback(callback(message))
+
+    async def _run_callback(self, awaitable):
+        """
+        Awaits a consumer or return callback. Its errors are logged, the
+        read loop going on and the delivery staying unsettled
+        """
+        try:
+            await awaitable
+        except Exception:
+            logger.exception(
+                "Callback of channel %s failed", self.channel_id
+            )
+
+    def _record_delivery(self, method):
+        if (self.connection.metrics is not None and
+                method.consumer_tag not in self._no_ack_consumers):
+            self._delivered_at[method.delivery_tag] = (
+                asyncio.get_event_loop().time()
+            )
+
+    async def _start_stream(self, method, header):
+        """
+        Runs the consumer callback with a message whose body frames are
+        streamed to it as they are received
+        """
+        stream = BodyStream(header.body_size)
+        message = Message(
+            self, method, header.properties, None, stream=stream
+        )
+        self._record_delivery(method)
+        callback = self._consumers[method.consumer_tag]
+        task = asyncio.ensure_future(callback(message))
+        # Frames the callback didn't read must not hold the read loop
+        task.add_done_callback(lambda _: stream.abandon())
+        self._content_stream = (stream, task)
+        if header.body_size == 0:
+            await self._end_stream()
+
+    async def _end_stream(self):
+        stream, task = self._content_stream
+        self._content_method = self._content_header = None
+        self._content_stream = None
+        await stream.feed(None)
+        # No other frame is read until the callback returns, as for the
+        # messages delivered whole
+        await self._run_callback(task)
+
+    async def open(self):
+        """
+        Sends Channel.Open and waits for the server OpenOk response
+        """
+        await self._call(channel.Open())
+        self._opened = True
+
+    async def close(self, reply_code=200, reply_text='Normal Shutdown'):
+        """
+        Requests the server to close this channel and waits for CloseOK
+        """
+        if self._closed:
+            return
+        await self._call(channel.Close(
+            reply_code=reply_code, reply_text=reply_text
+        ))
+        self._set_closed()
+
+    async def _on_close_requested(self, frame: channel.Close):
+        ok = channel.CloseOK.declare(channel=self.channel_id)
+        await self.connection._send_to_server(ok)
+        self._set_closed(error_from_server(frame.reply_code, frame.reply_text))
+
+    def _set_closed(self, exc=None):
+        """
+        Marks the channel as closed, failing any pending waiter and
+        releasing the channel number back to the connection.
+        :param Exception exc: Reason for the channel being closed
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.close_exception = exc
+        self._flow.set()
+        self._end_streaming_out()
+        pending = [future for _, future in self._pending_replies]
+        exc = exc or ChannelClosed(
+            "Channel {} is closed".format(self.channel_id)
+        )
+        self._fail_replies(pending, exc)
+        for batch in set(self._unconfirmed.values()) - {None}:
+            batch.settle(exc)
+        self._unconfirmed.clear()
+        self.connection._unbind_channel(self.channel_id)
+
+    def __repr__(self):
+        return 'Channel<{}>'.format(self.channel_id)
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+from typing import List, Callable, Awaitable
+
+from amqp_aio.connection import AMQPConnection, TCPConnection
+from amqp_aio.topology import Topology
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """
+    A broker node of the cluster and its connection statistics
+    """
+
+    def __init__(self, host, port=None):
+        self.host = host
+        self.port = port or 5672
+        self.latency = None
+        self.connect_latency = None
+        self.handshake_latency = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+    @classmethod
+    def parse(cls, endpoint) -> 'Endpoint':
+        """
+        Builds an Endpoint from an Endpoint, a (host, port) tuple or a
+        'host:port' string
+        """
+        if isinstance(endpoint, Endpoint):
+            return endpoint
+        if isinstance(endpoint, str):
+            host, _, port = endpoint.rpartition(':')
+            if not host or not port.isdigit():
+                return cls(endpoint)
+            return cls(host, int(port))
+        return cls(*endpoint)
+
+    def is_healthy(self, now) -> bool:
+        return self.retry_at <= now
+
+    def record_success(self, connect_latency, handshake_latency,
+                       smoothing):
+        self.failures = 0
+        self.retry_at = 0.0
+        self.connect_latency = connect_latency
+        self.handshake_latency = handshake_latency
+        latency = connect_latency + handshake_latency
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += smoothing * (latency - self.latency)
+
+    def record_failure(self, now, backoff, max_backoff):
+        self.failures += 1
+        self.retry_at = now + min(
+            backoff * 2 ** (self.failures - 1), max_backoff
+        )
+
+    def __repr__(self):
+        return 'Endpoint<{}:{}>'.format(self.host, self.port)
+
+
+class ClusterConnector:
+    """
+    Connects to the fastest healthy node of a broker cluster.
+
+    Each connection attempt measures the TCP connect and the
+    Start/Tune/OpenOK handshake latencies, which are kept per node as a
+    moving average. Nodes are tried fastest first, and failing nodes are put
+    aside with an exponential backoff.
+
+    Attempts are raced happy-eyeballs style: the next candidate is started
+    as soon as the previous one fails or after stagger_delay seconds,
+    whichever comes first, and the first node to complete the handshake
+    wins. A dead node therefore costs at most stagger_delay instead of a
+    whole connect timeout.
+
+    Once connected, the connection is watched and a new node is picked when
+    it drops. The exchanges, queues and bindings declared so far are then
+    replayed on the new connection, after which callbacks registered with
+    on_reconnect are awaited with it.
+    """
+    transport_class = TCPConnection
+    connection_class = AMQPConnection
+
+    def __init__(self, endpoints, vhost="/", heartbeat=None, ssl=None,
+                 connect_timeout=10, stagger_delay=0.25, latency_smoothing=0.3,
+                 failure_backoff=1, max_failure_backoff=30,
+                 reconnect=True):
+        """
+        :param list endpoints: Broker nodes, as (host, port) tuples or
+        'host:port' strings
+        :param str vhost: Virtual Host to open
+        :param int heartbeat: Desired delay between Heartbeats
+        :param ssl: SSL Context passed to each TCPConnection
+        :param float connect_timeout: Timeout of a single attempt, covering
+        both the TCP connection and the AMQP handshake
+        :param float stagger_delay: Delay before racing the next candidate
+        while an attempt is still in progress
+        :param float latency_smoothing: Weight of the newest sample in the
+        nodes latency moving average
+        :param float failure_backoff: Seconds a failed node is put aside.
+        Doubles on each consecutive failure
+        :param float max_failure_backoff: Upper bound of the backoff
+        :param bool reconnect: Whether to reconnect when the connection drops
+        """
+        self.endpoints: List[Endpoint] = [
+            Endpoint.parse(endpoint) for endpoint in endpoints
+        ]
+        if not self.endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.vhost = vhost
+        self.heartbeat = heartbeat
+        self.ssl = ssl
+        self.connect_timeout = connect_timeout
+        self.stagger_delay = stagger_delay
+        self.latency_smoothing = latency_smoothing
+        self.failure_backoff = failure_backoff
+        self.max_failure_backoff = max_failure_backoff
+        self.reconnect = reconnect
+        self.topology = Topology()
+        self.connection: AMQPConnection = None
+        self.endpoint: Endpoint = None
+        self._reconnect_callbacks = []
+        self._watch_task = None
+        self._closing = False
+
+    def on_reconnect(
+            self, callback: Callable[[AMQPConnection], Awaitable[None]]
+    ):
+        """
+        Registers a coroutine function awaited with the new connection after
+        every reconnection
+        """
+        self._reconnect_callbacks.append(callback)
+        return callback
+
+    def candidates(self) -> List[Endpoint]:
+        """
+        Endpoints in the order they should be tried: healthy nodes first,
+        fastest first, then the nodes still backing off.
+        """
+        now = asyncio.get_event_loop().time()
+        order = {endpoint: i for i, endpoint in enumerate(self.endpoints)}
+
+        def sort_key(endpoint):
+            latency = endpoint.latency
+            return (
+                not endpoint.is_healthy(now),
+                latency is None,
+                latency or 0,
+                order[endpoint]
+            )
+        return sorted(self.endpoints, key=sort_key)
+
+    def _create_connection(self, endpoint):
+        transport = self.transport_class(
+            endpoint.host, endpoint.port, ssl=self.ssl
+        )
+        return self.connection_class(
+            transport, heartbeat=self.heartbeat, vhost=self.vhost,
+            topology=self.topology
+        )
+
+    async def _attempt(self, endpoint: Endpoint):
+        connection = self._create_connection(endpoint)
+        loop = asyncio.get_event_loop()
+        try:
+            await asyncio.wait_for(
+                self._open(connection), self.connect_timeout
+            )
+        except asyncio.CancelledError:
+            # Lost the race against a faster node, which is not a failure
+            await connection.close()
+            raise
+        except Exception:
+            endpoint.record_failure(
+                loop.time(), self.failure_backoff, self.max_failure_backoff
+            )
+            await connection.close()
+            raise
+        endpoint.record_success(
+            connection.connect_latency, connection.handshake_latency,
+            self.latency_smoothing
+        )
+        return endpoint, connection
+
+    async def _open(self, connection):
+        await connection.connect()
+        await connection.wait_opened()
+
+    async def _race(self, candidates):
+        candidates = list(candidates)
+        pending = set()
+        errors = []
+        winner = None
+        try:
+            while (candidates or pending) and winner is None:
+                timeout = None
+                if candidates:
+                    pending.add(asyncio.ensure_future(
+                        self._attempt(candidates.pop(0))
+                    ))
+                    if candidates:
+                        timeout = self.stagger_delay
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        await task.result()[1].close()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        if winner is None:
+            raise ConnectionError(
+                "Unable to connect to any cluster node: {}".format(errors)
+            )
+        return winner
+
+    async def connect(self) -> AMQPConnection:
+        """
+        Connects to the best available node.
+        :return: The opened AMQPConnection
+        """
+        self._closing = False
+        self.endpoint, self.connection = await self._race(self.candidates())
+        if self.reconnect:
+            self._watch_task = asyncio.ensure_future(
+                self._watch(self.connection)
+            )
+        return self.connection
+
+    async def _watch(self, connection):
+        try:
+            await connection._run_task
+        except Exception:
+            pass
+        if self._closing or connection is not self.connection:
+            return
+        loop = asyncio.get_event_loop()
+        self.endpoint.record_failure(
+            loop.time(), self.failure_backoff, self.max_failure_backoff
+        )
+        await connection.close()
+        while not self._closing:
+            try:
+                await self.connect()
+            except ConnectionError:
+                await asyncio.sleep(self._retry_delay())
+                continue
+            break
+        else:
+            return
+        try:
+            await self.topology.replay(self.connection)
+        except Exception:
+            # The callbacks still get to restore what they manage
+            logger.exception("Failed to replay the topology on %s",
+                             self.endpoint)
+        for callback in self._reconnect_callbacks:
+            try:
+                await callback(self.connection)
+            except Exception:
+                logger.exception("Reconnect callback %r failed", callback)
+
+    def _retry_delay(self) -> float:
+        """
+        Seconds until the first node is done backing off, so rounds of
+        attempts on a cluster that is down back off as well
+        """
+        retry_at = min(endpoint.retry_at for endpoint in self.endpoints)
+        return max(
+            retry_at - asyncio.get_event_loop().time(), self.stagger_delay
+        )
+
+    async def close(self):
+        self._closing = True
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+        if self.connection is not None:
+            await self.connection.close()
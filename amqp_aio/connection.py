@@ -1,22 +1,39 @@
 import asyncio
+import logging
 import platform
+import select
+import socket
 import struct
+import threading
 from datetime import datetime
+from time import perf_counter, monotonic
 from typing import Tuple
 
-from pika import spec
-
 from amqp_aio.amqp import connection
 from amqp_aio.amqp.amqp_types import FieldTable, ShortString, LongString, \
     ShortInt, Boolean
 from amqp_aio.amqp.consts import PROTOCOL_HEADER, VERSION, FRAME_END, \
     LIB_VERSION, PRODUCT
 from amqp_aio.amqp.exceptions import ProtocolError, FrameEndError, \
-    AMQPException, raise_error_from_server
+    AMQPException, raise_error_from_server, error_from_server
 from amqp_aio.amqp.frames import Frame, FrameHeader, MethodFrame, \
     HeartbeatFrame
 from amqp_aio.amqp.negotiator import ProtocolNegotiator
+from amqp_aio.channel import Channel
 from amqp_aio.frame_router import FrameRouter
+from amqp_aio.heartbeat import HeartbeatKeeper
+from amqp_aio.profiling import PARSE, ROUTE, HANDLER
+from amqp_aio.ratelimit import RateLimiter
+from amqp_aio.scheduler import OutboundScheduler
+from amqp_aio.topology import Topology
+
+logger = logging.getLogger(__name__)
+
+MAX_CHANNELS = 65535
+# Frame size used when the server doesn't limit it (RabbitMQ default)
+DEFAULT_FRAME_MAX = 131072
+# Frame header (7 bytes) plus the frame-end octet
+FRAME_OVERHEAD = 8
 
 
 class AMQPConnection():
@@ -29,9 +46,12 @@ class AMQPConnection():
     class_id = 10
     default_negotiator = ProtocolNegotiator
     default_frame_router = FrameRouter
+    channel_class = Channel
+    scheduler_class = OutboundScheduler
 
     def __init__(self, conn, negotiator=None, heartbeat=None,
-                 frame_router=None):
+                 frame_router=None, vhost="/", topology=None, metrics=None,
+                 profiler=None, heartbeat_thread=False):
         """
         Receives an instance responsible for the transfer of data between
         peers.
@@ -39,18 +59,52 @@ class AMQPConnection():
         :param negotiator: Negotiator class object (ProtocolNegotiator as
         default)
         :param int heartbeat: Desired delay between Heartbeats
+        :param str vhost: Virtual Host to open
+        :param Topology topology: Declarations cache, shared between
+        connections that should recover the same exchanges and queues
+        :param Metrics metrics: Records the connection frames, bytes and
+        latencies. Nothing is recorded when not given
+        :param Profiler profiler: Times the frames parsing, routing and
+        handling, the publishes encoding and the writes, and samples the
+        loop lag while the connection runs
+        :param bool heartbeat_thread: Send heartbeats and track the server
+        liveness from a background thread (see HeartbeatKeeper), so CPU
+        bound handlers starving the loop don't get the connection closed.
+        Requires a transport supporting thread-safe writes
         """
         self.conn = conn
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.track(self)
+        self.profiler = profiler
+        self.scheduler = self.scheduler_class(conn)
+        self.scheduler.profiler = profiler
         self.last_send_dt = datetime.utcnow()
         self.missed_heartbeats = 0
         self.heartbeat_task = None
+        self.heartbeat_thread = heartbeat_thread
+        self.heartbeat_keeper = None
+        self._run_task = None
+        self.handshake_timings = {}
         self._running = False
         self._binds = {}
         self.mechanism = None
         self.locale = None
         self._connection_opened = False
+        self._opened_event = asyncio.Event()
+        # Cleared while the server blocks publishing connections
+        self._unblocked = asyncio.Event()
+        self._unblocked.set()
+        self.blocked_reason = None
+        self._blocked_since = None
+        self._blocked_time = 0.0
+        # Publish rate limits shared by every channel
+        self.rate_limiter = RateLimiter()
+        self.max_channels = None
+        self.max_frame_length = None
         self.server_properties = {}
-        self.vhost = "/"
+        self.vhost = vhost
+        self.topology = topology if topology is not None else Topology()
         self.negotiator = negotiator or self.default_negotiator()
         self.router = frame_router or self.default_frame_router()
         self.heartbeat = heartbeat
@@ -59,13 +113,58 @@ class AMQPConnection():
         self.router.register_route(0, connection.OpenOK, self._handle_open_ok)
         self.router.register_route(0, connection.Close, self._on_close_requested)
         self.router.register_route(0, HeartbeatFrame, self._handle_server_heartbeat)
+        self.router.register_route(0, connection.Blocked, self._on_blocked)
+        self.router.register_route(0, connection.Unblocked, self._on_unblocked)
 
-    async def _send_to_server(self, data):
+    async def _send_to_server(self, data, urgent=False):
+        """
+        Sends a single frame through the outbound scheduler
+        :param bool urgent: Whether the frame may overtake content queued on
+        its channel (heartbeats, acks, flow control)
+        """
+        channel_id = getattr(data, 'channel', 0)
+        frame = data
         if hasattr(data, 'to_bytes'):
             # is an object
             data = data.to_bytes()
         msg = data + FRAME_END
-        await self.conn.send(msg)
+        if self.metrics is not None and frame is not data:
+            self.metrics.frame_sent(frame, len(msg))
+        await self.scheduler.send(msg, channel_id, urgent=urgent)
+        self.last_send_dt = datetime.utcnow()
+
+    async def _send_frames(self, frames, urgent=False):
+        """
+        Encodes all frames of a channel into a single buffer, handing them
+        to the transport in one write.
+        """
+        buffer = bytearray()
+        metrics = self.metrics
+        for frame in frames:
+            data = frame.to_bytes() if hasattr(frame, 'to_bytes') else frame
+            buffer += data
+            buffer += FRAME_END
+            if metrics is not None and data is not frame:
+                metrics.frame_sent(frame, len(data) + 1)
+        channel_id = getattr(frames[0], 'channel', 0) if frames else 0
+        await self.scheduler.send(buffer, channel_id, urgent=urgent)
+        self.last_send_dt = datetime.utcnow()
+
+    async def _send_content(self, buffer, channel_id, message_cuts=None,
+                            frame_cuts=None, stats=None):
+        """
+        Sends encoded messages (FRAME_END included), interleaved with the
+        content of other channels by the outbound scheduler.
+        :param list message_cuts: Offsets where each message ends
+        :param list frame_cuts: Offsets of frame ends inside a message
+        :param list stats: Frame counts and sizes reported to the metrics
+        """
+        if self.metrics is not None and stats is not None:
+            self.metrics.content_sent(stats)
+        await self.scheduler.send_content(
+            buffer, channel_id, message_cuts=message_cuts,
+            frame_cuts=frame_cuts
+        )
         self.last_send_dt = datetime.utcnow()
 
     async def _send_start_ok(self):
@@ -116,18 +215,26 @@ class AMQPConnection():
         )
         return start
 
+    def _mark_handshake(self, step):
+        self.handshake_timings[step] = asyncio.get_event_loop().time()
+
     async def connect(self, blocking=False):
+        self._mark_handshake('connect')
+        if self.profiler is not None:
+            self.profiler.start()
         if not self.conn.is_connected:
             await self.conn.connect()
 
+        self._mark_handshake('connected')
         _version = struct.pack(">BBB", *VERSION)
         await self.conn.send(PROTOCOL_HEADER + _version)
         if blocking:
             await self._run()
         else:
-            asyncio.ensure_future(self._run())
+            self._run_task = asyncio.ensure_future(self._run())
 
     async def _handle_start_frame(self, frame: connection.Start):
+        self._mark_handshake('start')
         self.mechanism = self.negotiator.negotiate_auth_mechanism(
             "PLAIN", frame.mechanisms.split(" ")
         )
@@ -142,6 +249,7 @@ class AMQPConnection():
         :param int channel: Channel (expected to be zero)
         :param connection.Tune frame: Tune Frame arguments
         """
+        self._mark_handshake('tune')
         self.max_frame_length = self.negotiator.negotiate_numeric(
             0, frame.frame_max # use the server proposed value
         )
@@ -163,27 +271,199 @@ class AMQPConnection():
         await self._send_to_server(open)
 
     async def _handle_open_ok(self, frame: connection.OpenOK):
+        self._mark_handshake('open_ok')
         self._connection_opened = True
-        print("Successfully connected to VHost: {}".format(self.vhost))
-        self.heartbeat_task = asyncio.ensure_future(self._heartbeat_loop())
+        self._opened_event.set()
+        logger.info("Connected to virtual host %s", self.vhost)
+        threaded = self.heartbeat_thread and self.heartbeat and \
+            hasattr(self.conn, 'write_threadsafe')
+        if threaded and getattr(self.conn, 'ssl', None):
+            # Thread writes would bypass the encryption
+            logger.warning(
+                "Heartbeat thread not supported over TLS, heartbeats are "
+                "sent from the event loop"
+            )
+            threaded = False
+        if threaded:
+            self.heartbeat_keeper = HeartbeatKeeper(self.conn, self.heartbeat)
+            self.heartbeat_keeper.start()
+        else:
+            self.heartbeat_task = asyncio.ensure_future(
+                self._heartbeat_loop()
+            )
 
     async def _on_close_requested(self, frame: connection.Close):
         ok = connection.CloseOK.declare(channel=0)
         await self._send_to_server(ok)
+        self._running = False
+        self._close_channels(
+            error_from_server(frame.reply_code, frame.reply_text)
+        )
         raise_error_from_server(frame.reply_code, frame.reply_text)
 
+    async def _on_blocked(self, frame: connection.Blocked):
+        if self._unblocked.is_set():
+            self._blocked_since = asyncio.get_event_loop().time()
+            self._unblocked.clear()
+        self.blocked_reason = frame.reason
+
+    async def _on_unblocked(self, frame: connection.Unblocked):
+        self._set_unblocked()
+
+    def _set_unblocked(self):
+        if self._unblocked.is_set():
+            return
+        self._blocked_time += (
+            asyncio.get_event_loop().time() - self._blocked_since
+        )
+        self._blocked_since = None
+        self.blocked_reason = None
+        self._unblocked.set()
+
+    @property
+    def is_blocked(self):
+        """
+        Whether the server stopped accepting publishes from this connection
+        """
+        return not self._unblocked.is_set()
+
+    @property
+    def blocked_time(self):
+        """
+        Total seconds this connection has been blocked by the server,
+        including the ongoing block
+        """
+        if self._blocked_since is None:
+            return self._blocked_time
+        return self._blocked_time + (
+            asyncio.get_event_loop().time() - self._blocked_since
+        )
+
+    async def wait_unblocked(self):
+        """
+        Waits until the server accepts publishes again
+        """
+        await self._unblocked.wait()
+
+    @property
+    def is_open(self):
+        return self._connection_opened and self._running
+
+    @property
+    def body_frame_size(self):
+        """
+        Maximum size of the body slice carried by a single content frame
+        """
+        return (self.max_frame_length or DEFAULT_FRAME_MAX) - FRAME_OVERHEAD
+
+    async def wait_opened(self):
+        """
+        Waits until the server confirms the connection with OpenOK.
+
+        Raises the read loop error if it stops before the connection is
+        opened (e.g. the server refused the credentials or the vhost).
+        """
+        if self._opened_event.is_set() or self._run_task is None:
+            await self._opened_event.wait()
+            return
+        opened = asyncio.ensure_future(self._opened_event.wait())
+        await asyncio.wait(
+            [opened, self._run_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if not opened.done():
+            opened.cancel()
+            self._run_task.result()
+            raise ConnectionAbortedError(
+                "Connection closed before it was opened"
+            )
+
+    @property
+    def handshake_latency(self):
+        """
+        Seconds taken from the TCP connection being established until the
+        server OpenOK. None while the handshake is incomplete.
+        """
+        timings = self.handshake_timings
+        if 'open_ok' not in timings or 'connected' not in timings:
+            return None
+        return timings['open_ok'] - timings['connected']
+
+    @property
+    def connect_latency(self):
+        """
+        Seconds taken to establish the TCP connection
+        """
+        timings = self.handshake_timings
+        if 'connected' not in timings or 'connect' not in timings:
+            return None
+        return timings['connected'] - timings['connect']
+
+    def _next_channel_id(self) -> int:
+        max_channels = self.max_channels or MAX_CHANNELS
+        for channel_id in range(1, max_channels + 1):
+            if channel_id not in self._binds:
+                return channel_id
+        raise AMQPException(
+            "No free channel available. The negotiated limit is {}".format(
+                max_channels
+            )
+        )
+
+    async def channel(self) -> Channel:
+        """
+        Allocates a free channel number and opens a new channel on it.
+        :return: Opened Channel instance
+        """
+        await self.wait_opened()
+        channel_id = self._next_channel_id()
+        channel = self.channel_class(self, channel_id)
+        self._binds[channel_id] = channel
+        try:
+            await channel.open()
+        except BaseException:
+            self._unbind_channel(channel_id)
+            raise
+        return channel
+
+    def _unbind_channel(self, channel_id):
+        self._binds.pop(channel_id, None)
+        self.scheduler.forget(channel_id)
+        self.router.unregister_channel(channel_id)
+
+    def _close_channels(self, exc):
+        for channel in list(self._binds.values()):
+            channel._set_closed(exc)
+        # Wakes the parked publishers, which then fail on the closed channel
+        self._set_unblocked()
+
     async def _handle_server_heartbeat(self, frame: HeartbeatFrame):
-        print("Server Heartbeat Received")
+        logger.debug("Server heartbeat received")
         self.missed_heartbeats = 0
 
     async def _on_frame_received(self, frame: Frame):
+        if self.metrics is not None:
+            self.metrics.frame_received(frame)
+        profiler = self.profiler
+        if profiler is not None:
+            started = perf_counter()
         try:
-            await self.router.route_frame(frame)
+            route, argument = self.router.resolve(frame)
         except KeyError:
-            print("Frame {} has no router. Skipping it.".format(frame))
+            logger.warning("Frame %s has no route, skipping it", frame)
+            return
+        if profiler is not None:
+            routed = perf_counter()
+            profiler.record(ROUTE, routed - started)
+        try:
+            await route(argument)
+        except Exception:
+            # As when a frame has no route, the read loop goes on
+            logger.exception("Failed to handle frame %s, skipping it", frame)
+        finally:
+            if profiler is not None:
+                profiler.record(HANDLER, perf_counter() - routed)
 
     async def _heartbeat_loop(self):
-        print("Initiating Heartbeat Loop")
         while self._running:
             await asyncio.sleep(self.heartbeat // 2)
             seconds_without_send = (
@@ -191,7 +471,7 @@ class AMQPConnection():
             ).total_seconds()
             if seconds_without_send > self.heartbeat:
                 heartbeat = Frame.from_frame(HeartbeatFrame(), channel=0)
-                await self._send_to_server(heartbeat)
+                await self._send_to_server(heartbeat, urgent=True)
 
     async def _run(self):
         """
@@ -205,8 +485,21 @@ class AMQPConnection():
                     self.conn.recv(7), timeout=self.heartbeat
                 )
             except asyncio.TimeoutError:
-                print("Read Timed-out increasing missed heartbeats count")
+                keeper = self.heartbeat_keeper
+                if keeper is not None and keeper.peer_alive():
+                    # The server did send data, the loop was too busy
+                    continue
                 self.missed_heartbeats += 1
+                logger.warning(
+                    "No frame received for %s seconds (%s missed heartbeats)",
+                    self.heartbeat, self.missed_heartbeats
+                )
+                if self.profiler is not None and self.profiler.lag is not None:
+                    # A large lag points at the loop rather than the broker
+                    logger.warning(
+                        "Event loop lag: last %.3fs, max %.3fs",
+                        self.profiler.lag.last, self.profiler.lag.timing.max
+                    )
                 if self.missed_heartbeats > 4:
                     await self.close()
                     raise ConnectionAbortedError(
@@ -237,11 +530,26 @@ class AMQPConnection():
                 "Expected Frame-End not found after reading the whole "
                 "frame data."
             )
-        payload = payload.rstrip(FRAME_END)
-        return Frame.from_bytes(header + payload)
+        # Only the frame-end octet, the payload itself may end with 0xCE
+        payload = payload[:-1]
+        if self.profiler is None:
+            return Frame.from_bytes(header + payload)
+        started = perf_counter()
+        parsed = Frame.from_bytes(header + payload)
+        self.profiler.record(PARSE, perf_counter() - started)
+        return parsed
 
     async def close(self):
         self._running = False
+        exc = ConnectionAbortedError("Connection closed")
+        self._close_channels(exc)
+        self.scheduler.close(exc)
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.heartbeat_keeper is not None:
+            self.heartbeat_keeper.stop()
+        if self.conn.is_connected:
+            await self.conn.close()
 
 
 async def _get_connection(
@@ -268,12 +576,98 @@ class TCPConnection:
         self._reader: asyncio.StreamReader = None
         self._writer: asyncio.StreamWriter = None
         self.is_connected = False
+        # Serializes the loop writes with the heartbeat thread ones, and
+        # guards the state the thread reads, which only the loop updates
+        self._write_lock = threading.Lock()
+        self._thread_socket = None
+        # Whether the heartbeat thread may write: the transport is open and
+        # has nothing buffered. The buffer is only flushed by the loop, so
+        # this can't go stale while the loop is starved
+        self._thread_writable = False
+        # Bytes of a heartbeat the socket didn't take, which the loop writes
+        # before anything else
+        self._thread_tail = b''
+        self.last_write = monotonic()
+        # Buffered bytes above which drain() waits, None for the default
+        self.write_limit = None
 
     async def send(self, data):
         if isinstance(data, str):
             data = data.encode()
 
-        self._writer.write(data)
+        with self._write_lock:
+            self._write_thread_tail()
+            self._writer.write(data)
+            self.last_write = monotonic()
+            self._update_thread_state()
+
+    def _write_thread_tail(self):
+        if self._thread_tail:
+            self._writer.write(self._thread_tail)
+            self._thread_tail = b''
+
+    def _update_thread_state(self):
+        transport = self._writer.transport
+        closing = transport.is_closing()
+        self._thread_writable = not closing and \
+            not transport.get_write_buffer_size()
+        if self._thread_socket is None and not closing and not self.ssl:
+            sock = transport.get_extra_info('socket')
+            # A duplicate of the descriptor, usable outside of the loop
+            self._thread_socket = socket.fromfd(
+                sock.fileno(), sock.family, sock.type
+            )
+            self._thread_socket.setblocking(False)
+
+    def refresh_thread_state(self):
+        """
+        Updates what the heartbeat thread may do from the transport state,
+        writing what is left of a partially written heartbeat. Must be
+        called from the event loop
+        """
+        if self._writer is None:
+            return
+        with self._write_lock:
+            self._write_thread_tail()
+            self._update_thread_state()
+
+    def write_threadsafe(self, data) -> bool:
+        """
+        Writes data straight to the socket, from any thread.
+
+        Only done while the transport had nothing buffered when the loop
+        last looked at it, so the data can't end up in the middle of a frame
+        written by the loop. Never blocks: what the socket doesn't take is
+        left for the loop to write before anything else. TLS connections
+        are not supported, the data would bypass the encryption.
+        :return: Whether the data was written
+        """
+        if self.ssl:
+            return False
+        with self._write_lock:
+            sock = self._thread_socket
+            if sock is None or not self._thread_writable:
+                return False
+            try:
+                sent = sock.send(data)
+            except BlockingIOError:
+                return False
+            if sent < len(data):
+                self._thread_tail = bytes(data[sent:])
+                self._thread_writable = False
+            self.last_write = monotonic()
+            return True
+
+    def has_pending_input(self) -> bool:
+        """
+        Whether the server sent data not read yet, from any thread
+        """
+        with self._write_lock:
+            sock = self._thread_socket
+            if sock is None:
+                return False
+            readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable)
 
     async def recv(self, size, timeout=None):
         return await asyncio.wait_for(
@@ -289,6 +683,51 @@ class TCPConnection:
             ), timeout
         )
         self.is_connected = True
+        self._apply_write_limit()
+
+    def set_write_limit(self, limit):
+        """
+        Makes drain() wait while limit bytes or more are buffered, instead
+        of the transport high-water mark
+        """
+        self.write_limit = limit
+        self._apply_write_limit()
+
+    def _apply_write_limit(self):
+        if self._writer is None or self.write_limit is None:
+            return
+        # Writing is paused above high, so from limit bytes on
+        self._writer.transport.set_write_buffer_limits(
+            high=max(self.write_limit - 1, 0)
+        )
+
+    async def drain(self):
+        """
+        Waits until the transport buffer is flushed below its high-water
+        mark
+        """
+        if self._writer is not None:
+            await self._writer.drain()
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        with self._write_lock:
+            self._thread_writable = False
+            if self._thread_socket is not None:
+                self._thread_socket.close()
+                self._thread_socket = None
+        self.is_connected = False
+
+    @property
+    def outstanding_bytes(self):
+        """
+        Bytes written but still buffered by the transport, waiting for the
+        socket to accept them.
+        """
+        if self._writer is None:
+            return 0
+        return self._writer.transport.get_write_buffer_size()
 
     @property
     def host(self):
@@ -0,0 +1,212 @@
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def message_id(message):
+    """
+    Default deduplication key: the message_id property
+    """
+    return message.properties.message_id
+
+
+class MemoryIndex:
+    """
+    Keys of the messages already handled, in memory.
+
+    Bounded both in size, the least recently seen keys being evicted beyond
+    maxsize, and optionally in time, keys expiring ttl seconds after they
+    were last seen. Lookups and insertions are O(1).
+    """
+
+    def __init__(self, maxsize=100000, ttl=None, clock=time.monotonic):
+        """
+        :param int maxsize: Keys kept
+        :param float ttl: Seconds a key is kept. None to keep keys until
+        evicted
+        :param clock: Function returning the current time in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # key -> expiry time, least recently seen first
+        self._keys = OrderedDict()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        expiry = self._keys.get(key)
+        if expiry is None:
+            return False
+        if self.ttl is not None:
+            now = self.clock()
+            if expiry <= now:
+                del self._keys[key]
+                return False
+            self._keys[key] = now + self.ttl
+        self._keys.move_to_end(key)
+        return True
+
+    def add(self, key):
+        now = self.clock()
+        self._keys[key] = now + self.ttl if self.ttl is not None else 0
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        if self.ttl is not None:
+            # Expired keys are the least recently seen ones
+            while self._keys and next(iter(self._keys.values())) <= now:
+                self._keys.popitem(last=False)
+
+    def discard(self, key):
+        self._keys.pop(key, None)
+
+    def close(self):
+        pass
+
+
+class SQLiteIndex:
+    """
+    Keys of the messages already handled, persisted in an SQLite database
+    so they survive consumer restarts.
+
+    Keys are looked up by primary key and bounded like MemoryIndex: once
+    there are more than maxsize of them, the least recently seen are deleted
+    in a single statement, every maxsize // 10 insertions so the cost is
+    amortized. Queries run in the event loop thread: the database should be
+    on a local disk, and is opened in WAL mode so commits don't wait for the
+    disk.
+    """
+
+    def __init__(self, path, maxsize=1000000, ttl=None, clock=time.time):
+        """
+        :param str path: Database file, created if missing
+        :param int maxsize: Keys kept
+        :param float ttl: Seconds a key is kept. None to keep keys until
+        evicted
+        :param clock: Function returning the current time in seconds. Must
+        be consistent across restarts
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS handled ('
+            'key TEXT PRIMARY KEY, seen REAL NOT NULL) WITHOUT ROWID'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS handled_seen ON handled (seen)'
+        )
+        self._trim_every = max(1, maxsize // 10)
+        self._added = 0
+        self._trim()
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM handled'
+        ).fetchone()[0]
+
+    def __contains__(self, key):
+        row = self._connection.execute(
+            'SELECT seen FROM handled WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return False
+        now = self.clock()
+        if self.ttl is not None and row[0] + self.ttl <= now:
+            self.discard(key)
+            return False
+        self._connection.execute(
+            'UPDATE handled SET seen = ? WHERE key = ?', (now, key)
+        )
+        return True
+
+    def add(self, key):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO handled (key, seen) VALUES (?, ?)',
+            (key, self.clock())
+        )
+        self._added += 1
+        if self._added >= self._trim_every:
+            self._trim()
+
+    def _trim(self):
+        self._added = 0
+        if self.ttl is not None:
+            self._connection.execute(
+                'DELETE FROM handled WHERE seen <= ?',
+                (self.clock() - self.ttl,)
+            )
+        self._connection.execute(
+            'DELETE FROM handled WHERE key IN (SELECT key FROM handled '
+            'ORDER BY seen DESC LIMIT -1 OFFSET ?)', (self.maxsize,)
+        )
+
+    def discard(self, key):
+        self._connection.execute('DELETE FROM handled WHERE key = ?', (key,))
+
+    def close(self):
+        self._connection.close()
+
+
+class Deduplicator:
+    """
+    Consumer callback skipping the messages already handled.
+
+    Each message key (its message_id by default) is looked up in an index
+    of the keys of the messages handled so far. Known messages are
+    acknowledged right away, without calling handler, which typically
+    spares reprocessing the redelivered messages after a consumer restart.
+    Other messages are passed on to handler, their key being recorded once
+    it returned: a message whose handler raised is handled again when
+    redelivered. Messages without a key are always passed on.
+
+    With redelivered_only, only the messages flagged redelivered by the
+    server are looked up, duplicates published twice going through.
+
+    Usage:
+        deduplicator = Deduplicator(handle, SQLiteIndex('handled.db'))
+        await channel.consume('tasks', deduplicator)
+    """
+
+    def __init__(self, handler, index=None, key=message_id,
+                 redelivered_only=False, ack=True):
+        """
+        :param handler: Coroutine function awaited with the new messages
+        :param index: MemoryIndex, SQLiteIndex or any object supporting
+        `in` and add(key). A MemoryIndex by default
+        :param key: Function returning the key of a Message, None for
+        messages never deduplicated
+        :param bool redelivered_only: Whether only redelivered messages are
+        looked up
+        :param bool ack: Whether duplicates are acknowledged. Disable for
+        no_ack consumers
+        """
+        self.handler = handler
+        self.index = MemoryIndex() if index is None else index
+        self.key = key
+        self.redelivered_only = redelivered_only
+        self.ack = ack
+        self.duplicates = 0
+
+    async def __call__(self, message):
+        key = self.key(message)
+        if key is None:
+            await self.handler(message)
+            return
+        if (not self.redelivered_only or message.redelivered) and \
+                key in self.index:
+            self.duplicates += 1
+            logger.debug("Skipping duplicate message %r", key)
+            if self.ack and not message.settled:
+                await message.ack()
+            return
+        await self.handler(message)
+        self.index.add(key)
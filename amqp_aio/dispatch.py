@@ -0,0 +1,208 @@
+import itertools
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Node:
+    __slots__ = ('children', 'star', 'hash', 'handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.star = None
+        self.hash = None
+        # (registration order, handler) of the patterns ending here
+        self.handlers = []
+
+    def child(self, word, create=False):
+        if word == '*':
+            node = self.star
+        elif word == '#':
+            node = self.hash
+        else:
+            node = self.children.get(word)
+        if node is None and create:
+            node = _Node()
+            if word == '*':
+                self.star = node
+            elif word == '#':
+                self.hash = node
+            else:
+                self.children[word] = node
+        return node
+
+    def remove_child(self, word):
+        if word == '*':
+            self.star = None
+        elif word == '#':
+            self.hash = None
+        else:
+            del self.children[word]
+
+    def __bool__(self):
+        return bool(
+            self.handlers or self.children or self.star is not None or
+            self.hash is not None
+        )
+
+
+def _words(key):
+    # As the topic exchange does, '' is no word at all
+    return key.split('.') if key else []
+
+
+class TopicDispatcher:
+    """
+    Consumer callback routing each delivery to the handlers registered with
+    a topic pattern matching its routing key.
+
+    Patterns follow the topic exchange rules: words are separated by dots,
+    '*' matches exactly one word and '#' zero or more. They are compiled
+    into a trie of words, so matching a routing key walks its words once
+    (plus the '#' branches) whatever the number of patterns, instead of
+    testing each pattern in turn. The handlers resolved for the last
+    cache_size routing keys are cached, registering or unregistering a
+    handler clearing the cache.
+
+    Handlers matching a delivery are awaited one after the other, in the
+    order they were registered, a handler registered under several matching
+    patterns being called once. Deliveries no handler matches go to default,
+    or are only logged when there is none.
+
+    Usage:
+        dispatcher = TopicDispatcher()
+
+        @dispatcher.route('orders.*.created')
+        async def on_order(message):
+            ...
+            await message.ack()
+
+        await channel.consume('events', dispatcher)
+    """
+
+    def __init__(self, default=None, cache_size=4096):
+        """
+        :param default: Coroutine function awaited with the messages no
+        handler matches
+        :param int cache_size: Routing keys whose handlers are cached
+        """
+        self.default = default
+        self.cache_size = cache_size
+        self._root = _Node()
+        self._order = itertools.count()
+        self._patterns = OrderedDict()
+        self._cache = OrderedDict()
+
+    @property
+    def patterns(self) -> list:
+        """
+        The patterns handlers are registered with, e.g. to bind the queue
+        """
+        return list(self._patterns)
+
+    def register(self, pattern, handler):
+        """
+        Registers a coroutine function awaited with the messages whose
+        routing key matches pattern
+        :return: handler
+        """
+        node = self._root
+        for word in _words(pattern):
+            node = node.child(word, create=True)
+        if any(registered is handler for _, registered in node.handlers):
+            return handler
+        node.handlers.append((next(self._order), handler))
+        self._patterns[pattern] = self._patterns.get(pattern, 0) + 1
+        self._cache.clear()
+        return handler
+
+    def route(self, pattern):
+        """
+        Decorator registering the decorated coroutine function
+        """
+        def decorator(handler):
+            return self.register(pattern, handler)
+        return decorator
+
+    def unregister(self, pattern, handler):
+        """
+        :raise KeyError: If handler isn't registered with pattern
+        """
+        path = [(None, self._root)]
+        for word in _words(pattern):
+            node = path[-1][1].child(word)
+            if node is None:
+                raise KeyError(pattern)
+            path.append((word, node))
+        node = path[-1][1]
+        for index, (_, registered) in enumerate(node.handlers):
+            if registered is handler:
+                del node.handlers[index]
+                break
+        else:
+            raise KeyError(pattern)
+        # Prune the branches left without any pattern
+        for (_, parent), (word, node) in zip(path[-2::-1], path[:0:-1]):
+            if node:
+                break
+            parent.remove_child(word)
+        self._patterns[pattern] -= 1
+        if not self._patterns[pattern]:
+            del self._patterns[pattern]
+        self._cache.clear()
+
+    def _resolve(self, words):
+        found = []
+        visited = set()
+        pending = [(self._root, 0)]
+        while pending:
+            node, index = pending.pop()
+            # Several '#' may lead to the same state
+            if (id(node), index) in visited:
+                continue
+            visited.add((id(node), index))
+            if node.hash is not None:
+                for skip in range(index, len(words) + 1):
+                    pending.append((node.hash, skip))
+            if index == len(words):
+                found.extend(node.handlers)
+                continue
+            child = node.children.get(words[index])
+            if child is not None:
+                pending.append((child, index + 1))
+            if node.star is not None:
+                pending.append((node.star, index + 1))
+        handlers = []
+        for _, handler in sorted(found, key=lambda entry: entry[0]):
+            if not any(known is handler for known in handlers):
+                handlers.append(handler)
+        return tuple(handlers)
+
+    def match(self, routing_key) -> tuple:
+        """
+        :return: The handlers matching routing_key, in registration order
+        """
+        try:
+            handlers = self._cache[routing_key]
+        except KeyError:
+            handlers = self._resolve(_words(routing_key))
+            self._cache[routing_key] = handlers
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(routing_key)
+        return handlers
+
+    async def __call__(self, message):
+        handlers = self.match(message.routing_key)
+        if not handlers:
+            if self.default is not None:
+                await self.default(message)
+            else:
+                logger.warning(
+                    "No handler for routing key %r", message.routing_key
+                )
+            return
+        for handler in handlers:
+            await handler(message)
@@ -0,0 +1,288 @@
+import asyncio
+import base64
+import bz2
+import lzma
+import zlib
+
+from amqp_aio.amqp.exceptions import DecodedBodyTooLarge, \
+    UnknownContentEncoding
+
+
+def _check_size(size, max_size):
+    if max_size is not None and size > max_size:
+        raise DecodedBodyTooLarge(
+            "Decoded body larger than {} bytes".format(max_size)
+        )
+
+
+def _inflate(decompressor, data, max_size):
+    """
+    Decompresses a whole zlib stream, stopping past max_size bytes of
+    output so a small body can't expand into gigabytes
+    """
+    decoded = decompressor.decompress(
+        data, 0 if max_size is None else max_size + 1
+    )
+    _check_size(len(decoded), max_size)
+    decoded += decompressor.flush()
+    _check_size(len(decoded), max_size)
+    if not decompressor.eof:
+        raise zlib.error("Incomplete or truncated stream")
+    return decoded
+
+
+def _decompress(decompressor, data, max_size, error):
+    """
+    _inflate for the lzma and bz2 decompressors
+    """
+    decoded = decompressor.decompress(
+        data, -1 if max_size is None else max_size + 1
+    )
+    _check_size(len(decoded), max_size)
+    if not decompressor.eof:
+        raise error(
+            "Compressed data ended before the end-of-stream marker was "
+            "reached"
+        )
+    return decoded
+
+
+class Encoder:
+    """
+    Content encoding of message bodies, applied on top of their
+    serialization and named by the content_encoding property.
+
+    Subclasses implement encode, appending the encoded data to a caller
+    provided buffer so several steps can share it, and decode, which
+    receives a memoryview of the body and returns any bytes-like object,
+    raising DecodedBodyTooLarge rather than return more than max_size
+    bytes (None for no limit).
+    """
+    content_encoding = None
+
+    def encode(self, data, buffer: bytearray):
+        raise NotImplementedError
+
+    def decode(self, data: memoryview, max_size=None):
+        raise NotImplementedError
+
+
+class IdentityEncoder(Encoder):
+    """
+    No encoding, the body being passed through without a copy on decode
+    """
+    content_encoding = 'identity'
+
+    def encode(self, data, buffer):
+        buffer += data
+
+    def decode(self, data, max_size=None):
+        return data
+
+
+class Base64Encoder(Encoder):
+    content_encoding = 'base64'
+
+    def encode(self, data, buffer):
+        buffer += base64.b64encode(data)
+
+    def decode(self, data, max_size=None):
+        # Never larger than the body
+        return base64.b64decode(data)
+
+
+class ZlibEncoder(Encoder):
+    """
+    zlib compression, optionally primed with a preset dictionary.
+
+    A dictionary holding the strings that keep coming back in the bodies
+    (JSON keys, enum values...) lets even small bodies compress well. Both
+    sides need the same dictionary, so by default the content encoding of
+    a dictionary encoder is derived from its checksum: a consumer lacking
+    it fails with UnknownContentEncoding instead of garbage.
+    """
+
+    def __init__(self, level=6, zdict=None, content_encoding=None):
+        """
+        :param int level: Compression level, 0 to 9
+        :param bytes zdict: Preset dictionary
+        :param str content_encoding: Name of the encoding
+        """
+        self.level = level
+        self.zdict = zdict
+        if content_encoding is None:
+            content_encoding = 'deflate' if zdict is None else \
+                'x-deflate-{:08x}'.format(zlib.crc32(zdict))
+        self.content_encoding = content_encoding
+
+    def encode(self, data, buffer):
+        if self.zdict is None:
+            compressor = zlib.compressobj(self.level)
+        else:
+            compressor = zlib.compressobj(self.level, zdict=self.zdict)
+        buffer += compressor.compress(data)
+        buffer += compressor.flush()
+
+    def decode(self, data, max_size=None):
+        if self.zdict is None:
+            decompressor = zlib.decompressobj()
+        else:
+            decompressor = zlib.decompressobj(zdict=self.zdict)
+        return _inflate(decompressor, data, max_size)
+
+
+class GzipEncoder(Encoder):
+    content_encoding = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def encode(self, data, buffer):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        buffer += compressor.compress(data)
+        buffer += compressor.flush()
+
+    def decode(self, data, max_size=None):
+        return _inflate(zlib.decompressobj(47), data, max_size)
+
+
+class LZMAEncoder(Encoder):
+    """
+    xz compression: slower, but the best ratio
+    """
+    content_encoding = 'xz'
+
+    def __init__(self, preset=6):
+        self.preset = preset
+
+    def encode(self, data, buffer):
+        buffer += lzma.compress(data, preset=self.preset)
+
+    def decode(self, data, max_size=None):
+        return _decompress(
+            lzma.LZMADecompressor(), data, max_size, lzma.LZMAError
+        )
+
+
+class BZ2Encoder(Encoder):
+    content_encoding = 'bzip2'
+
+    def __init__(self, level=9):
+        self.level = level
+
+    def encode(self, data, buffer):
+        buffer += bz2.compress(data, self.level)
+
+    def decode(self, data, max_size=None):
+        return _decompress(bz2.BZ2Decompressor(), data, max_size, ValueError)
+
+
+class Compression:
+    """
+    When and how message bodies get compressed.
+
+    Bodies of at least threshold bytes are compressed with encoder, unless
+    compression doesn't make them smaller. Bodies of at least
+    offload_threshold bytes are compressed and decompressed in executor,
+    so the event loop keeps running meanwhile: zlib, lzma and bz2 release
+    the GIL, so this also uses other cores.
+
+    Usage:
+        codec = ContentCodec(compression=Compression(
+            ZlibEncoder(zdict=ORDERS_DICTIONARY), threshold=256
+        ))
+    """
+
+    def __init__(self, encoder: Encoder, threshold=1024,
+                 offload_threshold=1048576, executor=None):
+        """
+        :param Encoder encoder: Encoder compressing the bodies
+        :param int threshold: Smallest body compressed, in bytes
+        :param int offload_threshold: Smallest body (de)compressed out of
+        the event loop, in bytes. None to never offload
+        :param executor: concurrent.futures executor used to offload.
+        Defaults to the loop default executor
+        """
+        self.encoder = encoder
+        self.threshold = threshold
+        self.offload_threshold = offload_threshold
+        self.executor = executor
+
+    def offloaded(self, size) -> bool:
+        return self.offload_threshold is not None and \
+            size >= self.offload_threshold
+
+    async def run(self, function, *args):
+        """
+        Runs function in the executor
+        """
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, function, *args
+        )
+
+
+class EncoderRegistry:
+    """
+    Content encodings by name.
+
+    Lookups tolerate case and surrounding spaces, None and '' meaning no
+    encoding (identity, always registered). Normalized names are cached,
+    so each distinct property value is only parsed once.
+    """
+
+    def __init__(self):
+        self._encoders = {}
+        self._lookups = {}
+        self.register(IdentityEncoder())
+
+    def copy(self) -> 'EncoderRegistry':
+        """
+        Returns a new registry with the same encoders
+        """
+        registry = type(self)()
+        registry._encoders.update(self._encoders)
+        return registry
+
+    def register(self, encoder: Encoder, *aliases):
+        """
+        Registers an encoder under its content_encoding and any alias,
+        replacing the encoders previously registered with those names
+        """
+        for name in (encoder.content_encoding,) + aliases:
+            self._encoders[name.strip().lower()] = encoder
+        self._lookups = {}
+
+    def unregister(self, content_encoding):
+        self._encoders.pop(content_encoding.strip().lower(), None)
+        self._lookups = {}
+
+    def get(self, content_encoding) -> Encoder:
+        """
+        :raise UnknownContentEncoding: If nothing is registered under the
+        name
+        """
+        encoder = self._lookups.get(content_encoding)
+        if encoder is None:
+            name = (content_encoding or 'identity').strip().lower()
+            encoder = self._encoders.get(name)
+            if encoder is None:
+                raise UnknownContentEncoding(
+                    "No encoder registered for {!r}".format(content_encoding)
+                )
+            self._lookups[content_encoding] = encoder
+        return encoder
+
+    def __contains__(self, content_encoding):
+        try:
+            self.get(content_encoding)
+        except UnknownContentEncoding:
+            return False
+        return True
+
+
+encoders = EncoderRegistry()
+encoders.register(Base64Encoder())
+encoders.register(ZlibEncoder(), 'zlib')
+encoders.register(GzipEncoder(), 'x-gzip')
+encoders.register(LZMAEncoder(), 'lzma')
+encoders.register(BZ2Encoder(), 'bz2')
@@ -1,7 +1,9 @@
 import inspect
 
-from amqp_aio.amqp.consts import METHOD_TYPE, HEARTBEAT_TYPE
-from amqp_aio.amqp.frames import Frame, MethodArguments, HeartbeatFrame
+from amqp_aio.amqp.consts import METHOD_TYPE, HEARTBEAT_TYPE, HEADER_TYPE, \
+    BODY_TYPE
+from amqp_aio.amqp.frames import Frame, MethodArguments, HeartbeatFrame, \
+    ContentHeaderFrame, ContentBodyFrame
 
 
 class FrameRouter:
@@ -11,6 +13,7 @@ class FrameRouter:
 
     def __init__(self):
         self._method_routes = {}
+        self._content_routes = {}
         self._heartbeat_route = None
 
     def _validate_route(self, route):
@@ -24,6 +27,8 @@ class FrameRouter:
         self._validate_route(route)
         if issubclass(frame, MethodArguments):
             self._method_routes.setdefault(channel, {})[frame] = route
+        elif issubclass(frame, (ContentHeaderFrame, ContentBodyFrame)):
+            self._content_routes.setdefault(channel, {})[frame] = route
         elif issubclass(frame, HeartbeatFrame):
             self._heartbeat_route = route
         else:
@@ -31,11 +36,31 @@ class FrameRouter:
                 "This router is unable to route {} frame".format(frame)
             )
 
-    async def route_frame(self, frame: Frame):
+    def unregister_channel(self, channel):
+        """
+        Removes every route registered for the given channel.
+        :param int channel: Channel number
+        """
+        self._method_routes.pop(channel, None)
+        self._content_routes.pop(channel, None)
+
+    def resolve(self, frame: Frame):
+        """
+        Finds the route of a frame
+        :return: The route and the argument it must be awaited with
+        :raise KeyError: If no route is registered for the frame
+        """
         if frame.frame_type == METHOD_TYPE: # Method Frame
             route = self._method_routes[frame.channel][type(
                 frame.payload.arguments)]
-            await route(frame.payload.arguments)
-        if frame.frame_type == HEARTBEAT_TYPE:
-            route = self._heartbeat_route
-            await route(frame)
+            return route, frame.payload.arguments
+        if frame.frame_type in (HEADER_TYPE, BODY_TYPE):
+            route = self._content_routes[frame.channel][type(frame.payload)]
+            return route, frame.payload
+        if frame.frame_type == HEARTBEAT_TYPE and self._heartbeat_route:
+            return self._heartbeat_route, frame
+        raise KeyError(frame.frame_type)
+
+    async def route_frame(self, frame: Frame):
+        route, argument = self.resolve(frame)
+        await route(argument)
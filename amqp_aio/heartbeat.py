@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from time import monotonic
+
+from amqp_aio.amqp.consts import FRAME_END
+from amqp_aio.amqp.frames import Frame, HeartbeatFrame
+
+# Heartbeats carry no payload, so the frame is encoded once
+HEARTBEAT = Frame.from_frame(HeartbeatFrame(), channel=0).to_bytes() + \
+    FRAME_END
+
+
+class HeartbeatKeeper(threading.Thread):
+    """
+    Keeps a connection alive from a background thread, while the event loop
+    may be starved by CPU bound handlers.
+
+    Every quarter of the heartbeat, the thread writes a heartbeat straight
+    to the socket if nothing was written for half of it, and records whether
+    the server sent anything, even if the loop didn't read it yet. The read
+    loop then doesn't count a heartbeat as missed while the server is known
+    to be alive.
+
+    Writes go through TCPConnection.write_threadsafe, which shares a lock
+    with the loop writes and only writes while the transport has nothing
+    buffered, so a heartbeat is never interleaved with another frame. The
+    thread never touches the asyncio transport itself: each tick asks the
+    loop to refresh the state write_threadsafe relies on.
+    """
+
+    def __init__(self, transport, heartbeat, loop=None):
+        """
+        :param TCPConnection transport: Transport of the connection
+        :param int heartbeat: Negotiated heartbeat, in seconds
+        :param loop: Event loop of the connection. Defaults to the current
+        one
+        """
+        super().__init__(name='amqp-heartbeat', daemon=True)
+        self.transport = transport
+        self.loop = loop or asyncio.get_event_loop()
+        self.heartbeat = heartbeat
+        self.interval = heartbeat / 4
+        self.last_inbound = monotonic()
+        self.sent = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self._beat()
+            except (OSError, ValueError, RuntimeError):
+                # The connection or the loop is gone, which the read loop
+                # reports
+                return
+
+    def _beat(self):
+        self.loop.call_soon_threadsafe(self.transport.refresh_thread_state)
+        now = monotonic()
+        if self.transport.has_pending_input():
+            self.last_inbound = now
+        idle = now - self.transport.last_write
+        if idle >= self.heartbeat / 2 and \
+                self.transport.write_threadsafe(HEARTBEAT):
+            self.sent += 1
+
+    def peer_alive(self) -> bool:
+        """
+        Whether the server sent data within the last two heartbeats
+        """
+        return monotonic() - self.last_inbound < self.heartbeat * 2
+
+    def stop(self):
+        self._stopped.set()
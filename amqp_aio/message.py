@@ -0,0 +1,199 @@
+import asyncio
+
+from amqp_aio.amqp.basic import BasicProperties
+from amqp_aio.serializers import default_codec
+
+
+class BodyStream:
+    """
+    Body frames of a message being received, handed from the read loop to
+    the consumer.
+
+    At most maxsize frames are buffered: beyond that, the read loop waits
+    for the consumer to catch up, so a slow consumer slows the delivery of
+    the body instead of having it accumulate in memory.
+    """
+
+    def __init__(self, size, maxsize=8):
+        """
+        :param int size: Body size announced by the content header
+        :param int maxsize: Body frames buffered
+        """
+        self.size = size
+        self.received = 0
+        self._queue = asyncio.Queue(maxsize)
+        self.abandoned = False
+
+    async def feed(self, chunk):
+        """
+        Called by the read loop with each body frame, None ending the body
+        """
+        if not self.abandoned:
+            await self._queue.put(chunk)
+
+    def abandon(self):
+        """
+        Discards the frames not read yet, and the ones still to come
+        """
+        self.abandoned = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def __aiter__(self):
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            self.received += len(chunk)
+            yield chunk
+
+
+_NOT_DECODED = object()
+
+
+class Message:
+    """
+    A message received from the server.
+
+    Wraps the method that carried it (basic.Deliver or basic.Return), its
+    properties and its body. Slotted and lazy, as one is created per
+    delivery: the content header properties are only decoded from their
+    raw bytes when first accessed, and the body only deserialized by
+    decode().
+    """
+    __slots__ = (
+        'channel', 'method', 'body', 'stream', '_raw_properties',
+        '_properties', '_decoded', 'settled'
+    )
+
+    def __init__(self, channel, method, properties, body, stream=None):
+        """
+        :param Channel channel: Channel the message was received on
+        :param method: basic.Deliver or basic.Return method arguments
+        :param properties: Message BasicProperties, or their encoded bytes
+        as received in the content header
+        :param bytes body: Message body, None when streamed
+        :param BodyStream stream: Body frames still being received
+        """
+        self.channel = channel
+        self.method = method
+        self.body = body
+        self.stream = stream
+        if isinstance(properties, (bytes, bytearray, memoryview)):
+            self._raw_properties = properties
+            self._properties = None
+        else:
+            self._raw_properties = None
+            self._properties = properties
+        self._decoded = _NOT_DECODED
+        self.settled = False
+
+    @property
+    def properties(self) -> BasicProperties:
+        if self._properties is None:
+            if self._raw_properties is None:
+                self._properties = BasicProperties()
+            else:
+                self._properties, _ = BasicProperties.from_bytes(
+                    self._raw_properties
+                )
+                self._raw_properties = None
+        return self._properties
+
+    @properties.setter
+    def properties(self, properties):
+        self._properties = properties
+        self._raw_properties = None
+
+    @property
+    def headers(self) -> dict:
+        return self.properties.headers or {}
+
+    def decode(self, codec=None):
+        """
+        Decodes the body according to its content_type and
+        content_encoding properties. The result of the default codec is
+        kept, so later calls return the same object
+        :param ContentCodec codec: Codec to use instead of the default one
+        """
+        if codec is not None:
+            return codec.decode(self.body, self.properties)
+        if self._decoded is _NOT_DECODED:
+            self._decoded = default_codec.decode(self.body, self.properties)
+        return self._decoded
+
+    async def decode_async(self, codec=None):
+        """
+        decode, large compressed bodies being decompressed out of the loop
+        """
+        if codec is not None:
+            return await codec.decode_async(self.body, self.properties)
+        if self._decoded is _NOT_DECODED:
+            self._decoded = await default_codec.decode_async(
+                self.body, self.properties
+            )
+        return self._decoded
+
+    async def iter_body(self):
+        """
+        Yields the body, frame by frame as they are received for messages
+        of streaming consumers (see Channel.consume), or at once otherwise.
+        A streamed body can only be iterated once.
+        """
+        if self.stream is None:
+            if self.body:
+                yield self.body
+            return
+        async for chunk in self.stream:
+            yield chunk
+
+    def _settle(self):
+        if self.delivery_tag is None:
+            raise RuntimeError("Only delivered messages can be settled")
+        if self.settled:
+            raise RuntimeError(
+                "Delivery {} was already settled".format(self.delivery_tag)
+            )
+        self.settled = True
+
+    async def ack(self, multiple=False):
+        """
+        Acknowledges the message (and with multiple, every unsettled message
+        delivered before it on its channel)
+        """
+        self._settle()
+        await self.channel.ack(self.delivery_tag, multiple=multiple)
+
+    async def nack(self, multiple=False, requeue=True):
+        self._settle()
+        await self.channel.nack(
+            self.delivery_tag, multiple=multiple, requeue=requeue
+        )
+
+    async def reject(self, requeue=True):
+        self._settle()
+        await self.channel.reject(self.delivery_tag, requeue=requeue)
+
+    @property
+    def delivery_tag(self):
+        return getattr(self.method, 'delivery_tag', None)
+
+    @property
+    def consumer_tag(self):
+        return getattr(self.method, 'consumer_tag', None)
+
+    @property
+    def redelivered(self):
+        return getattr(self.method, 'redelivered', False)
+
+    @property
+    def exchange(self):
+        return self.method.exchange
+
+    @property
+    def routing_key(self):
+        return self.method.routing_key
+
+    def __repr__(self):
+        size = self.stream.size if self.stream is not None else len(self.body)
+        return 'Message<{} {} bytes>'.format(type(self.method).__name__, size)
@@ -0,0 +1,272 @@
+import asyncio
+import weakref
+from bisect import bisect_left
+
+FRAME_TYPES = {1: 'method', 2: 'header', 3: 'body', 8: 'heartbeat'}
+
+# Seconds, as used by the latency histograms
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0
+)
+
+_method_names = {}
+
+
+def method_name(arguments) -> str:
+    """
+    Returns the 'class.Method' name of method arguments, e.g. basic.Deliver
+    """
+    cls = type(arguments)
+    name = _method_names.get(cls)
+    if name is None:
+        name = _method_names[cls] = '{}.{}'.format(
+            cls.__module__.rsplit('.', 1)[-1], cls.__name__
+        )
+    return name
+
+
+class Counter:
+    """
+    Monotonic value per label set
+    """
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets
+    """
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # One more slot for the values above the last bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield self.name + '_bucket', {'le': repr(bound)}, cumulative
+        yield self.name + '_bucket', {'le': '+Inf'}, self.count
+        yield self.name + '_sum', {}, self.sum
+        yield self.name + '_count', {}, self.count
+
+
+class Gauge:
+    """
+    Current value, computed when collected
+    """
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def samples(self):
+        yield self.name, {}, self.function()
+
+
+class Metrics:
+    """
+    Client side metrics of the connections it is given to.
+
+    Connections and channels only record anything when created with a
+    Metrics instance, the disabled path costing a single None check.
+    Counters and histograms are updated as frames go through, while the
+    gauges are computed from the tracked connections when collected.
+
+    Usage:
+        metrics = Metrics()
+        connection = AMQPConnection(transport, metrics=metrics)
+        ...
+        metrics.collect()  # or PrometheusExporter(metrics).start()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param tuple buckets: Bounds, in seconds, of the latency histograms
+        """
+        self._connections = weakref.WeakSet()
+        self.frames_received = Counter(
+            'amqp_frames_received_total', 'Frames received',
+            ('frame_type', 'method')
+        )
+        self.frames_sent = Counter(
+            'amqp_frames_sent_total', 'Frames sent', ('frame_type', 'method')
+        )
+        self.bytes_received = Counter(
+            'amqp_bytes_received_total', 'Bytes received, framing included',
+            ('frame_type',)
+        )
+        self.bytes_sent = Counter(
+            'amqp_bytes_sent_total', 'Bytes sent, framing included',
+            ('frame_type',)
+        )
+        self.confirm_latency = Histogram(
+            'amqp_publish_confirm_seconds',
+            'Delay between a publish and its confirm', buckets
+        )
+        self.ack_latency = Histogram(
+            'amqp_deliver_ack_seconds',
+            'Delay between a delivery and its acknowledgement', buckets
+        )
+        self.outstanding_confirms = Gauge(
+            'amqp_outstanding_confirms', 'Publishes waiting for a confirm',
+            lambda: self._sum_channels(lambda ch: len(ch._unconfirmed))
+        )
+        self.unacked_deliveries = Gauge(
+            'amqp_unacked_deliveries', 'Deliveries not acknowledged yet',
+            lambda: self._sum_channels(lambda ch: len(ch._delivered_at))
+        )
+        self.buffered_bytes = Gauge(
+            'amqp_buffered_bytes',
+            'Bytes queued by the client or the transport, not sent yet',
+            self._buffered_bytes
+        )
+        self.metrics = [
+            self.frames_received, self.frames_sent, self.bytes_received,
+            self.bytes_sent, self.confirm_latency, self.ack_latency,
+            self.outstanding_confirms, self.unacked_deliveries,
+            self.buffered_bytes,
+        ]
+
+    def track(self, connection):
+        self._connections.add(connection)
+
+    def _sum_channels(self, function):
+        return sum(
+            function(channel) for connection in list(self._connections)
+            for channel in list(connection._binds.values())
+        )
+
+    def _buffered_bytes(self):
+        return sum(
+            connection.scheduler.queued_bytes
+            + getattr(connection.conn, 'outstanding_bytes', 0)
+            for connection in list(self._connections)
+        )
+
+    def frame_received(self, frame):
+        frame_type = FRAME_TYPES.get(frame.frame_type, 'unknown')
+        method = ''
+        if frame.frame_type == 1:
+            method = method_name(frame.payload.arguments)
+        self.frames_received.inc((frame_type, method))
+        self.bytes_received.inc((frame_type,), frame.size + 8)
+
+    def frame_sent(self, frame, size):
+        frame_type = FRAME_TYPES.get(frame.frame_type, 'unknown')
+        method = ''
+        if frame.frame_type == 1:
+            method = method_name(frame.payload.arguments)
+        self.frames_sent.inc((frame_type, method))
+        self.bytes_sent.inc((frame_type,), size)
+
+    def content_sent(self, stats):
+        """
+        :param list stats: Messages, method bytes, header bytes, body frames
+        and body bytes of published content
+        """
+        messages, method_bytes, header_bytes, body_frames, body_bytes = stats
+        self.frames_sent.inc(('method', 'basic.Publish'), messages)
+        self.frames_sent.inc(('header', ''), messages)
+        self.frames_sent.inc(('body', ''), body_frames)
+        self.bytes_sent.inc(('method',), method_bytes)
+        self.bytes_sent.inc(('header',), header_bytes)
+        self.bytes_sent.inc(('body',), body_bytes)
+
+    def collect(self):
+        """
+        Pull API: returns the current value of every metric
+        :return: A list of (name, labels dict, value) samples
+        """
+        return [
+            sample for metric in self.metrics for sample in metric.samples()
+        ]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n'
+    )
+
+
+def prometheus_text(metrics: Metrics) -> str:
+    """
+    Renders the metrics in the Prometheus text exposition format
+    """
+    types = {Counter: 'counter', Histogram: 'histogram', Gauge: 'gauge'}
+    lines = []
+    for metric in metrics.metrics:
+        lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+        lines.append('# TYPE {} {}'.format(metric.name, types[type(metric)]))
+        for name, labels, value in metric.samples():
+            if labels:
+                name += '{' + ','.join(
+                    '{}="{}"'.format(key, _escape(label))
+                    for key, label in labels.items()
+                ) + '}'
+            lines.append('{} {}'.format(name, value))
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusExporter:
+    """
+    Minimal HTTP server answering every request with the metrics in the
+    Prometheus text format. Listens on the loopback interface by default:
+    pass host='0.0.0.0' to expose the metrics to other machines
+    """
+
+    def __init__(self, metrics: Metrics, host='127.0.0.1', port=9419):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+
+    async def _handle(self, reader, writer):
+        try:
+            # Request line and headers, ignored
+            while (await reader.readline()).strip():
+                pass
+            body = prometheus_text(self.metrics).encode()
+            writer.write(
+                b'HTTP/1.0 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4\r\n'
+                b'Content-Length: ' + str(len(body)).encode() +
+                b'\r\n\r\n' + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
@@ -0,0 +1,271 @@
+import asyncio
+import zlib
+from collections import deque
+
+from amqp_aio.connection import MAX_CHANNELS, AMQPConnection, TCPConnection
+from amqp_aio.topology import Topology
+
+
+def shard_for_key(key, shards) -> int:
+    """
+    Maps a sharding key to one of shards indexes
+    """
+    if isinstance(key, str):
+        key = key.encode()
+    elif not isinstance(key, (bytes, bytearray, memoryview)):
+        key = str(key).encode()
+    # crc32 instead of hash() so the mapping is stable across processes
+    return zlib.crc32(key) % shards
+
+
+class _PooledChannel:
+    """
+    Async context manager returned by ChannelPool.acquire
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.channel = None
+
+    async def __aenter__(self):
+        self.channel = await self.pool._checkout()
+        return self.channel
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        channel, self.channel = self.channel, None
+        await self.pool._checkin(channel)
+
+
+class ChannelPool:
+    """
+    Keeps a set of open channels over a single AMQPConnection.
+
+    Channels are opened lazily, up to max_size, and are handed out through
+    acquire(). Returned channels are reused as they are, so only the first
+    checkout of each channel pays for the Channel.Open round trip. Channels
+    closed by the server are dropped and replaced on the next checkout.
+
+    Usage:
+        pool = ChannelPool(connection, max_size=10)
+        async with pool.acquire() as channel:
+            ...
+    """
+
+    def __init__(self, connection, max_size=None):
+        """
+        :param AMQPConnection connection: Connection to open channels on
+        :param int max_size: Maximum number of channels kept by the pool.
+        Defaults to the channel limit negotiated with the server
+        """
+        self.connection = connection
+        self.max_size = max_size
+        self._idle = deque()
+        self._in_use = set()
+        self._semaphore = None
+        self._closed = False
+
+    @property
+    def size(self):
+        """
+        Number of channels currently owned by the pool
+        """
+        return len(self._idle) + len(self._in_use)
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            max_size = (
+                self.max_size or self.connection.max_channels or MAX_CHANNELS
+            )
+            self._semaphore = asyncio.Semaphore(max_size)
+        return self._semaphore
+
+    def acquire(self) -> _PooledChannel:
+        """
+        Checks out a channel, waiting for one to be returned if the pool is
+        at its limit.
+        :return: Async context manager yielding an open Channel
+        """
+        return _PooledChannel(self)
+
+    async def _checkout(self):
+        if self._closed:
+            raise RuntimeError("ChannelPool is closed")
+        await self.connection.wait_opened()
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        try:
+            channel = None
+            while self._idle:
+                # LIFO, so the most recently used channels are kept warm
+                candidate = self._idle.pop()
+                if candidate.is_open:
+                    channel = candidate
+                    break
+            if channel is None:
+                channel = await self.connection.channel()
+        except BaseException:
+            semaphore.release()
+            raise
+        self._in_use.add(channel)
+        return channel
+
+    async def _checkin(self, channel):
+        self._in_use.discard(channel)
+        try:
+            if channel.is_open and not self._closed:
+                self._idle.append(channel)
+            elif channel.is_open:
+                await channel.close()
+        finally:
+            self._get_semaphore().release()
+
+    async def close(self):
+        """
+        Closes every idle channel. Channels still checked out are closed
+        when they are returned.
+        """
+        self._closed = True
+        while self._idle:
+            channel = self._idle.pop()
+            if channel.is_open:
+                await channel.close()
+
+
+class ConnectionPool:
+    """
+    Keeps N AMQPConnection/TCPConnection pairs to the same virtual host and
+    spreads channels across them.
+
+    Every connection has its own socket and broker side connection process,
+    so per-connection flow control no longer caps the pool throughput.
+    Channels are checked out from the connection with the least bytes still
+    waiting in its transport buffer or, when a key is given, from the
+    connection the key hashes to, which keeps the ordering of everything
+    sent with the same key.
+
+    Usage:
+        pool = ConnectionPool('localhost', size=4)
+        await pool.connect()
+        async with pool.acquire(key='order-1234') as channel:
+            ...
+    """
+    transport_class = TCPConnection
+    connection_class = AMQPConnection
+    channel_pool_class = ChannelPool
+
+    def __init__(self, host, port=None, size=2, vhost="/", heartbeat=None,
+                 ssl=None, max_channels=None, connect_timeout=10):
+        """
+        :param str host: Server host
+        :param int port: Server port
+        :param int size: Number of connections kept open
+        :param str vhost: Virtual Host all connections are opened on
+        :param int heartbeat: Desired delay between Heartbeats
+        :param ssl: SSL Context passed to each TCPConnection
+        :param int max_channels: Channels kept per connection. Defaults to
+        the negotiated channel limit
+        :param float connect_timeout: Timeout of opening a connection,
+        covering both the TCP connection and the AMQP handshake
+        """
+        if size < 1:
+            raise ValueError("ConnectionPool size must be at least 1")
+        self.host = host
+        self.port = port
+        self.size = size
+        self.vhost = vhost
+        self.heartbeat = heartbeat
+        self.ssl = ssl
+        self.max_channels = max_channels
+        self.connect_timeout = connect_timeout
+        self.connections = []
+        self.channel_pools = []
+        # Declarations are broker wide, so they are shared by all connections
+        self.topology = Topology()
+
+    def _create_connection(self):
+        transport = self.transport_class(self.host, self.port, ssl=self.ssl)
+        return self.connection_class(
+            transport, heartbeat=self.heartbeat, vhost=self.vhost,
+            topology=self.topology
+        )
+
+    async def _open_connection(self, connection):
+        await connection.connect()
+        await connection.wait_opened()
+
+    async def connect(self):
+        """
+        Opens every connection of the pool concurrently
+        :raise asyncio.TimeoutError: If a connection isn't opened within
+        connect_timeout, every connection being closed
+        """
+        connections = [self._create_connection() for _ in range(self.size)]
+        try:
+            await asyncio.gather(*[
+                asyncio.wait_for(
+                    self._open_connection(connection), self.connect_timeout
+                ) for connection in connections
+            ])
+        except BaseException:
+            for connection in connections:
+                await connection.close()
+            raise
+        self.connections = connections
+        self.channel_pools = [
+            self.channel_pool_class(connection, max_size=self.max_channels)
+            for connection in connections
+        ]
+
+    def _select_by_key(self, key) -> int:
+        return shard_for_key(key, len(self.channel_pools))
+
+    def _select_least_loaded(self) -> int:
+        best, best_load = None, None
+        for index, connection in enumerate(self.connections):
+            if not connection.is_open:
+                continue
+            load = (
+                connection.conn.outstanding_bytes,
+                self.channel_pools[index].in_use
+            )
+            if best_load is None or load < best_load:
+                best, best_load = index, load
+        if best is None:
+            raise ConnectionError("No connection of the pool is open")
+        return best
+
+    def select(self, key=None) -> ChannelPool:
+        """
+        Returns the ChannelPool of the connection that should carry the
+        next operation.
+        :param key: Optional sharding key. Operations sharing a key always
+        go through the same connection
+        :raise ConnectionError: If no connection is open, without a key
+        """
+        if not self.channel_pools:
+            raise RuntimeError("ConnectionPool is not connected")
+        if key is None:
+            index = self._select_least_loaded()
+        else:
+            index = self._select_by_key(key)
+        return self.channel_pools[index]
+
+    def acquire(self, key=None) -> _PooledChannel:
+        """
+        Checks out a channel from the selected connection.
+        :param key: Optional sharding key (see select)
+        :return: Async context manager yielding an open Channel
+        """
+        return self.select(key).acquire()
+
+    async def close(self):
+        for channel_pool in self.channel_pools:
+            await channel_pool.close()
+        for connection in self.connections:
+            await connection.close()
+        self.channel_pools = []
+        self.connections = []
@@ -0,0 +1,136 @@
+import asyncio
+
+# Sections timed by the connection hooks
+PARSE = 'parse'
+ROUTE = 'route'
+HANDLER = 'handler'
+ENCODE = 'encode'
+WRITE = 'write'
+
+
+class Timing:
+    """
+    Count, total and maximum of the durations recorded for a section
+    """
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+        }
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task sleeping for interval
+    seconds. A lag close to zero means the loop is free, while a large lag
+    means callbacks (e.g. CPU bound message handlers) are starving it, which
+    also delays reading heartbeats.
+    """
+
+    def __init__(self, interval=0.25):
+        """
+        :param float interval: Seconds between samples
+        """
+        self.interval = interval
+        self.timing = Timing()
+        self.last = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._sample())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _sample(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - expected)
+            self.timing.add(self.last)
+
+
+class Profiler:
+    """
+    Breakdown of where a connection spends its time.
+
+    Given to an AMQPConnection, it times the decoding of received frames
+    (parse), finding their route (route), running the route (handler,
+    consumer callbacks included, awaits too), encoding published messages
+    (encode) and handing bytes to the transport (write). Each hook costs two
+    perf_counter() calls, and nothing at all without a profiler.
+
+    The loop lag is sampled alongside, telling apart a slow broker or
+    network from a starved event loop when heartbeats are missed.
+
+    Usage:
+        profiler = Profiler()
+        connection = AMQPConnection(transport, profiler=profiler)
+        ...
+        profiler.breakdown()
+    """
+
+    def __init__(self, lag_interval=0.25):
+        """
+        :param float lag_interval: Seconds between loop lag samples, or None
+        to disable the sampling
+        """
+        self.lag = LoopLagMonitor(lag_interval) if lag_interval else None
+        self.timings = {}
+
+    def start(self):
+        if self.lag is not None:
+            self.lag.start()
+
+    def stop(self):
+        if self.lag is not None:
+            self.lag.stop()
+
+    def record(self, section, elapsed):
+        timing = self.timings.get(section)
+        if timing is None:
+            timing = self.timings[section] = Timing()
+        timing.add(elapsed)
+
+    def reset(self):
+        self.timings = {}
+        if self.lag is not None:
+            self.lag.timing = Timing()
+
+    def breakdown(self) -> dict:
+        """
+        :return: section -> count, total, mean and max seconds, plus the
+        share of the profiled time spent there. The loop_lag entry holds
+        the lag samples and the last one.
+        """
+        profiled = sum(timing.total for timing in self.timings.values())
+        breakdown = {}
+        for section, timing in self.timings.items():
+            breakdown[section] = timing.to_dict()
+            breakdown[section]['share'] = (
+                timing.total / profiled if profiled else 0.0
+            )
+        if self.lag is not None:
+            breakdown['loop_lag'] = self.lag.timing.to_dict()
+            breakdown['loop_lag']['last'] = self.lag.last
+        return breakdown
+
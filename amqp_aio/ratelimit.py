@@ -0,0 +1,131 @@
+class TokenBucket:
+    """
+    Token bucket allowing rate tokens per second, with bursts of up to
+    capacity tokens.
+
+    The bucket starts full at its first charge, and is refilled at every
+    charge for the time elapsed since the previous one, never beyond
+    capacity. A charge larger than the tokens left is still accepted,
+    putting the bucket in debt: the caller is told how long to wait for it
+    to be repaid.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param float rate: Tokens added per second
+        :param float capacity: Maximum tokens kept. Defaults to rate
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = None
+
+    def _refill(self, now):
+        if self.updated is not None and now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def charge(self, amount, clock) -> float:
+        """
+        Takes amount tokens from the bucket
+        :param float amount: Tokens to take
+        :param clock: Callable returning the current time, in seconds
+        :return: Seconds to wait before the tokens are actually available
+        """
+        self._refill(clock())
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class RateLimit:
+    """
+    Messages and bytes per second allowed, each one optional
+    """
+    __slots__ = ('messages', 'bytes')
+
+    def __init__(self, messages_per_second=None, bytes_per_second=None,
+                 burst=1.0):
+        """
+        :param float messages_per_second: Messages published per second
+        :param float bytes_per_second: Body bytes published per second
+        :param float burst: Seconds worth of tokens that may be spent at once
+        """
+        self.messages = self.bytes = None
+        if messages_per_second:
+            self.messages = TokenBucket(
+                messages_per_second, messages_per_second * burst
+            )
+        if bytes_per_second:
+            self.bytes = TokenBucket(
+                bytes_per_second, bytes_per_second * burst
+            )
+
+    def charge(self, messages, size, clock) -> float:
+        delay = 0.0
+        if self.messages is not None:
+            delay = self.messages.charge(messages, clock)
+        if self.bytes is not None:
+            delay = max(delay, self.bytes.charge(size, clock))
+        return delay
+
+
+class RateLimiter:
+    """
+    Publish rate limits of a channel or a connection: one for everything
+    published, and optionally one per exchange.
+
+    Usage:
+        channel.rate_limiter.set(messages_per_second=500)
+        connection.rate_limiter.set(
+            bytes_per_second=10 * 2 ** 20, exchange='bulk'
+        )
+    """
+
+    def __init__(self):
+        # exchange (None for every exchange) -> RateLimit
+        self._limits = {}
+
+    def set(self, messages_per_second=None, bytes_per_second=None,
+            exchange=None, burst=1.0):
+        """
+        Sets a limit, or removes it when neither rate is given
+        :param str exchange: Only limit publishes to this exchange
+        """
+        if not messages_per_second and not bytes_per_second:
+            self._limits.pop(exchange, None)
+            return
+        self._limits[exchange] = RateLimit(
+            messages_per_second, bytes_per_second, burst=burst
+        )
+
+    def __bool__(self):
+        return bool(self._limits)
+
+    def charge(self, usage, clock) -> float:
+        """
+        Charges published messages to the matching limits
+        :param dict usage: exchange -> [messages, body bytes] published
+        :param clock: Callable returning the current time, in seconds
+        :return: Seconds to wait for every limit to be honoured
+        """
+        delay = 0.0
+        limit = self._limits.get(None)
+        if limit is not None:
+            delay = limit.charge(
+                sum(count for count, _ in usage.values()),
+                sum(size for _, size in usage.values()),
+                clock
+            )
+        if len(self._limits) > (limit is not None):
+            for exchange, (count, size) in usage.items():
+                limit = self._limits.get(exchange)
+                if limit is not None:
+                    delay = max(delay, limit.charge(count, size, clock))
+        return delay
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import uuid
+
+from amqp_aio.amqp.basic import BasicProperties
+from amqp_aio.amqp.exceptions import AMQPException, RPCTimeout, Unroutable
+
+DIRECT_REPLY_TO = 'amq.rabbitmq.reply-to'
+
+
+class RPCClient:
+    """
+    Request/Reply client over RabbitMQ Direct Reply-to.
+
+    Replies are consumed from the amq.rabbitmq.reply-to pseudo-queue, so no
+    reply queue is ever declared: a call costs one publish plus one
+    delivery. Any number of concurrent calls are multiplexed over a single
+    channel, each matched to its reply by correlation id.
+
+    Usage:
+        client = RPCClient(channel)
+        await client.start()
+        reply = await client.call(b'payload', routing_key='rpc_queue')
+    """
+
+    def __init__(self, channel, timeout=30):
+        """
+        :param Channel channel: Channel dedicated to this client
+        :param float timeout: Default seconds to wait for a reply
+        """
+        self.channel = channel
+        self.timeout = timeout
+        self.consumer_tag = None
+        self._prefix = uuid.uuid4().hex
+        self._ids = itertools.count(1)
+        # correlation id -> (reply future, eviction timer)
+        self._calls = {}
+
+    async def start(self):
+        """
+        Starts consuming replies. Direct Reply-to requires this to happen
+        before the first request is published.
+        """
+        self.channel.add_return_callback(self._on_return)
+        self.consumer_tag = await self.channel.consume(
+            DIRECT_REPLY_TO, self._on_reply, no_ack=True
+        )
+
+    @property
+    def pending(self):
+        return len(self._calls)
+
+    async def call(self, body, routing_key, exchange='', properties=None,
+                   timeout=None):
+        """
+        Publishes a request and waits for its reply.
+        :param bytes body: Request body
+        :param str routing_key: Routing key of the request
+        :param str exchange: Exchange the request is published to
+        :param BasicProperties properties: Request properties. reply_to and
+        correlation_id are set by the client on a copy
+        :param float timeout: Seconds to wait for the reply
+        :return: The reply Message
+        :raise RPCTimeout: If the reply doesn't arrive in time
+        :raise Unroutable: If the request couldn't be routed to any queue
+        """
+        if self.consumer_tag is None:
+            raise RuntimeError("RPCClient.start() must be called first")
+        correlation_id = '{}.{}'.format(self._prefix, next(self._ids))
+        # Copied, as the caller may reuse its properties for other calls
+        properties = (properties or BasicProperties()).copy(
+            reply_to=DIRECT_REPLY_TO, correlation_id=correlation_id
+        )
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        timer = loop.call_later(
+            self.timeout if timeout is None else timeout,
+            self._evict, correlation_id
+        )
+        self._calls[correlation_id] = (future, timer)
+        try:
+            await self.channel.publish(
+                body, exchange=exchange, routing_key=routing_key,
+                properties=properties, mandatory=True
+            )
+            return await future
+        finally:
+            self._forget(correlation_id)
+
+    def _forget(self, correlation_id):
+        call = self._calls.pop(correlation_id, None)
+        if call is not None:
+            call[1].cancel()
+        return call
+
+    def _evict(self, correlation_id):
+        call = self._calls.pop(correlation_id, None)
+        if call is not None and not call[0].done():
+            call[0].set_exception(RPCTimeout(
+                "No reply received for {}".format(correlation_id)
+            ))
+
+    def _resolve(self, message, exc=None):
+        call = self._forget(message.properties.correlation_id)
+        if call is None or call[0].done():
+            # Late reply of an evicted call
+            return
+        if exc is not None:
+            call[0].set_exception(exc)
+        else:
+            call[0].set_result(message)
+
+    async def _on_reply(self, message):
+        self._resolve(message)
+
+    async def _on_return(self, message):
+        if message.properties.reply_to != DIRECT_REPLY_TO:
+            return
+        self._resolve(message, Unroutable(
+            "Request {} returned: {}".format(
+                message.properties.correlation_id, message.method.reply_text
+            )
+        ))
+
+    async def close(self):
+        """
+        Stops consuming replies, failing the calls still waiting
+        """
+        if self.consumer_tag is not None and self.channel.is_open:
+            await self.channel.cancel(self.consumer_tag)
+        self.consumer_tag = None
+        for correlation_id in list(self._calls):
+            future, timer = self._calls.pop(correlation_id)
+            timer.cancel()
+            if not future.done():
+                future.set_exception(AMQPException("RPCClient closed"))
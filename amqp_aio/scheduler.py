@@ -0,0 +1,347 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+from collections import deque
+from time import perf_counter
+
+from amqp_aio.profiling import WRITE
+
+# Bytes a channel may send per round robin turn, times its weight
+DEFAULT_QUANTUM = 131072
+# Bytes allowed in the transport buffer before frames are held back
+DEFAULT_WRITE_LIMIT = 262144
+
+
+class _Unit:
+    """
+    Encoded frames handed over by a single send call.
+
+    The data is only cut at the given offsets: message_cuts are the ends of
+    whole messages, frame_cuts the ends of frames inside a message still in
+    progress. Without message_cuts, the data ends inside a message whose
+    remaining frames come with the next units of the channel.
+    """
+    __slots__ = ('data', 'offset', 'message_cuts', 'frame_cuts', 'future')
+
+    def __init__(self, data, future, message_cuts=None, frame_cuts=None):
+        try:
+            self.data = memoryview(data)
+        except TypeError:
+            # Frames encoded as they are sliced, e.g. a FramedBody
+            self.data = data
+        self.offset = 0
+        self.message_cuts = (
+            message_cuts if message_cuts is not None else [len(data)]
+        )
+        self.frame_cuts = frame_cuts or []
+        self.future = future
+
+    @property
+    def remaining(self):
+        return len(self.data) - self.offset
+
+    def take(self, budget):
+        """
+        Returns the next slice, as long as possible within budget bytes
+        (but at least up to the next cut), and whether it stops in the
+        middle of a message.
+        """
+        limit = self.offset + budget
+        end = first = None
+        for cuts in (self.message_cuts, self.frame_cuts):
+            i = bisect_right(cuts, self.offset)
+            if i == len(cuts):
+                continue
+            if first is None or cuts[i] < first:
+                first = cuts[i]
+            j = bisect_right(cuts, limit) - 1
+            if j >= i and (end is None or cuts[j] > end):
+                end = cuts[j]
+        if end is None:
+            end = first
+        data = self.data[self.offset:end]
+        self.offset = end
+        i = bisect_left(self.message_cuts, end)
+        in_message = (
+            i == len(self.message_cuts) or self.message_cuts[i] != end
+        )
+        return data, in_message
+
+
+class _ChannelQueue:
+    __slots__ = ('units', 'in_message', 'deferred')
+
+    def __init__(self):
+        self.units = deque()
+        self.in_message = False
+        # Urgent units waiting for the message in progress to complete
+        self.deferred = []
+
+
+class OutboundScheduler:
+    """
+    Orders the frames written to the transport.
+
+    While the transport keeps up, frames are written as soon as they are
+    sent. Once write_limit bytes are waiting in the transport buffer, frames
+    are held back and released as it drains:
+
+     - Urgent frames (heartbeats, acks, flow control) go first, ahead of
+       any content still queued.
+     - Content is interleaved across channels round robin, each channel
+       sending up to quantum times its weight bytes per turn, so a large
+       message on one channel doesn't hold back the others.
+
+    Frames of a single channel always keep their order, except urgent ones.
+    Those still never cut into a message in progress on their channel,
+    whose frames must stay contiguous.
+
+    Usage:
+        connection.scheduler.set_weight(channel.channel_id, 4)
+    """
+
+    def __init__(self, transport, quantum=DEFAULT_QUANTUM,
+                 write_limit=DEFAULT_WRITE_LIMIT):
+        """
+        :param transport: Transport the frames are written to
+        :param int quantum: Bytes a channel sends per turn
+        :param int write_limit: Bytes buffered by the transport above which
+        frames are held back
+        """
+        self.transport = transport
+        self.quantum = quantum
+        self.write_limit = write_limit
+        self._control = deque()
+        self._channels = {}
+        self._active = deque()
+        self._weights = {}
+        self._busy = False
+        self._task = None
+        # Profiler timing the writes, if any
+        self.profiler = None
+
+    def set_weight(self, channel_id, weight):
+        """
+        Sets how many quanta a channel sends per round robin turn
+        """
+        self._weights[channel_id] = weight
+
+    def forget(self, channel_id):
+        self._weights.pop(channel_id, None)
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of sends whose frames are not fully written yet
+        """
+        return len(self._control) + sum(
+            len(queue.units) + len(queue.deferred)
+            for queue in self._channels.values()
+        )
+
+    @property
+    def queued_bytes(self) -> int:
+        """
+        Bytes waiting to be handed to the transport
+        """
+        units = [unit for _, unit in self._control]
+        for queue in self._channels.values():
+            units.extend(queue.units)
+            units.extend(queue.deferred)
+        return sum(unit.remaining for unit in units)
+
+    @property
+    def write_limit(self) -> int:
+        return self._write_limit
+
+    @write_limit.setter
+    def write_limit(self, limit):
+        self._write_limit = limit
+        # The transport drain() must not return while the limit is reached,
+        # or waiting for it would spin
+        set_write_limit = getattr(self.transport, 'set_write_limit', None)
+        if set_write_limit is not None:
+            set_write_limit(limit)
+
+    def _queue(self, channel_id) -> _ChannelQueue:
+        queue = self._channels.get(channel_id)
+        if queue is None:
+            queue = self._channels[channel_id] = _ChannelQueue()
+        return queue
+
+    async def send(self, data, channel_id=0, urgent=False):
+        """
+        Writes method or heartbeat frames.
+        :param data: Encoded frames, FRAME_END included
+        :param int channel_id: Channel the frames belong to
+        :param bool urgent: Whether the frames may overtake the content
+        queued on their channel
+        """
+        future = asyncio.get_event_loop().create_future()
+        unit = _Unit(data, future)
+        queue = self._channels.get(channel_id)
+        if urgent or queue is None or not queue.units:
+            self._control.append((channel_id, unit))
+        else:
+            self._queue(channel_id).units.append(unit)
+            self._activate(channel_id)
+        await self._submit(future)
+
+    async def send_content(self, data, channel_id, message_cuts=None,
+                           frame_cuts=None):
+        """
+        Writes content frames, interleaved with other channels.
+        :param data: Encoded frames, FRAME_END included
+        :param int channel_id: Channel the frames belong to
+        :param list message_cuts: Sorted offsets where messages end. An
+        empty list when the data ends inside a message, streamed over
+        several calls
+        :param list frame_cuts: Sorted offsets of frame ends inside messages
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._queue(channel_id).units.append(
+            _Unit(data, future, message_cuts, frame_cuts)
+        )
+        self._activate(channel_id)
+        await self._submit(future)
+
+    def _activate(self, channel_id):
+        if channel_id not in self._active:
+            self._active.append(channel_id)
+
+    async def _submit(self, future):
+        if not self._busy:
+            await self._pump()
+        await future
+
+    def _writable(self) -> bool:
+        outstanding = getattr(self.transport, 'outstanding_bytes', 0)
+        return outstanding < self.write_limit
+
+    async def _pump(self):
+        """
+        Writes from the caller's task while the transport accepts more,
+        leaving the rest to a task waiting for it to drain.
+        """
+        self._busy = True
+        try:
+            while self._has_pending() and self._writable():
+                await self._write_next()
+        except asyncio.CancelledError:
+            # The remaining frames are still written by the drain task
+            self._task = asyncio.ensure_future(self._drain_loop())
+            raise
+        except Exception as exc:
+            # Raised to the senders through their futures
+            self._fail_pending(exc)
+        if self._has_pending():
+            self._task = asyncio.ensure_future(self._drain_loop())
+        else:
+            self._busy = False
+
+    async def _drain_loop(self):
+        try:
+            while self._has_pending():
+                await self._wait_writable()
+                await self._write_next()
+        except Exception as exc:
+            self._fail_pending(exc)
+        finally:
+            self._busy = False
+            self._task = None
+
+    async def _wait_writable(self):
+        drain = getattr(self.transport, 'drain', None)
+        while not self._writable():
+            if drain is not None:
+                await drain()
+            else:
+                await asyncio.sleep(0)
+
+    def _has_pending(self) -> bool:
+        return bool(self._control or self._active)
+
+    def _collect(self):
+        """
+        Picks the next frames to write: urgent and method frames first, then
+        content from each channel in turn.
+        :return: The slices to write and the futures they complete
+        """
+        outstanding = getattr(self.transport, 'outstanding_bytes', 0)
+        budget = max(self.write_limit - outstanding, self.quantum)
+        parts = []
+        completed = []
+        size = 0
+        while self._control:
+            channel_id, unit = self._control.popleft()
+            queue = self._channels.get(channel_id)
+            if queue is not None and queue.in_message:
+                queue.deferred.append(unit)
+                continue
+            parts.append(unit.data)
+            completed.append(unit.future)
+            size += len(unit.data)
+
+        while self._active and size < budget:
+            channel_id = self._active.popleft()
+            queue = self._channels[channel_id]
+            allowance = self.quantum * self._weights.get(channel_id, 1)
+            while queue.units and allowance > 0 and size < budget:
+                unit = queue.units[0]
+                data, queue.in_message = unit.take(
+                    min(allowance, budget - size)
+                )
+                parts.append(data)
+                size += len(data)
+                allowance -= len(data)
+                if not unit.remaining:
+                    queue.units.popleft()
+                    completed.append(unit.future)
+                if not queue.in_message and queue.deferred:
+                    for deferred in queue.deferred:
+                        parts.append(deferred.data)
+                        completed.append(deferred.future)
+                    queue.deferred = []
+            if queue.units:
+                self._active.append(channel_id)
+            elif not queue.in_message:
+                del self._channels[channel_id]
+        return parts, completed
+
+    async def _write_next(self):
+        parts, completed = self._collect()
+        if not parts:
+            return
+        started = perf_counter() if self.profiler is not None else 0
+        data = parts[0] if len(parts) == 1 else b''.join(parts)
+        try:
+            await self.transport.send(data)
+            if self.profiler is not None:
+                self.profiler.record(WRITE, perf_counter() - started)
+        except Exception as exc:
+            for future in completed:
+                if not future.done():
+                    future.set_exception(exc)
+            raise
+        for future in completed:
+            if not future.done():
+                future.set_result(None)
+
+    def _fail_pending(self, exc):
+        units = [unit for _, unit in self._control]
+        for queue in self._channels.values():
+            units.extend(queue.units)
+            units.extend(queue.deferred)
+        self._control.clear()
+        self._channels.clear()
+        self._active.clear()
+        for unit in units:
+            if not unit.future.done():
+                unit.future.set_exception(exc)
+
+    def close(self, exc):
+        """
+        Fails every send still waiting to be written
+        """
+        if self._task is not None:
+            self._task.cancel()
+        self._fail_pending(exc)
@@ -0,0 +1,380 @@
+import json
+import marshal
+import pickle
+
+from amqp_aio.amqp.exceptions import UnknownContentType
+from amqp_aio.encoders import encoders as default_encoders, IdentityEncoder
+
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+
+class Serializer:
+    """
+    Turns objects into message bodies and back, for a content_type.
+
+    Subclasses implement encode, appending the serialized object to a
+    caller provided buffer, and decode, which receives a memoryview of the
+    body so slices of it can be decoded without copies.
+    """
+    content_type = None
+
+    def encode(self, obj, buffer: bytearray):
+        raise NotImplementedError
+
+    def decode(self, data: memoryview):
+        raise NotImplementedError
+
+
+class RawSerializer(Serializer):
+    """
+    Bytes-like bodies, as they are. Decoding returns the memoryview itself,
+    without a copy
+    """
+    content_type = DEFAULT_CONTENT_TYPE
+
+    def encode(self, obj, buffer):
+        buffer += obj
+
+    def decode(self, data):
+        return data
+
+
+class TextSerializer(Serializer):
+    content_type = 'text/plain'
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+
+    def encode(self, obj, buffer):
+        buffer += obj.encode(self.encoding)
+
+    def decode(self, data):
+        return str(data, self.encoding)
+
+
+class JSONSerializer(Serializer):
+    """
+    JSON bodies. dumps and loads may be replaced by a faster implementation
+    with the same signatures
+    """
+    content_type = 'application/json'
+
+    def __init__(self, dumps=json.dumps, loads=json.loads, **dumps_options):
+        self.dumps = dumps
+        self.loads = loads
+        self.dumps_options = dumps_options or {
+            'separators': (',', ':'), 'ensure_ascii': False
+        }
+
+    def encode(self, obj, buffer):
+        data = self.dumps(obj, **self.dumps_options)
+        buffer += data.encode() if isinstance(data, str) else data
+
+    def decode(self, data):
+        return self.loads(str(data, 'utf-8'))
+
+
+class _BufferWriter:
+    __slots__ = ('buffer',)
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+
+class PickleSerializer(Serializer):
+    """
+    Pickled bodies. Unpickling can run arbitrary code, so this serializer
+    is not registered by default: register it in the SerializerRegistry of
+    a codec only decoding messages from trusted publishers
+    """
+    content_type = 'application/x-python-pickle'
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def encode(self, obj, buffer):
+        pickle.dump(obj, _BufferWriter(buffer), self.protocol)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class MarshalSerializer(Serializer):
+    """
+    marshal bodies, fast for builtin types but tied to the Python version.
+    marshal is not meant for untrusted data either, so like
+    PickleSerializer it is not registered by default
+    """
+    content_type = 'application/x-python-marshal'
+
+    def encode(self, obj, buffer):
+        buffer += marshal.dumps(obj)
+
+    def decode(self, data):
+        return marshal.loads(data)
+
+
+class FunctionSerializer(Serializer):
+    """
+    Adapts a third party codec exposing dumps/loads style functions
+    """
+
+    def __init__(self, content_type, dumps, loads):
+        """
+        :param str content_type: Content type of the bodies
+        :param dumps: Callable returning the bytes of an object
+        :param loads: Callable returning the object of a bytes-like body
+        """
+        self.content_type = content_type
+        self.dumps = dumps
+        self.loads = loads
+
+    def encode(self, obj, buffer):
+        buffer += self.dumps(obj)
+
+    def decode(self, data):
+        return self.loads(data)
+
+
+class SerializerRegistry:
+    """
+    Serializers by content type.
+
+    Parameters of the content type (e.g. '; charset=utf-8') and case are
+    ignored, and None or '' means DEFAULT_CONTENT_TYPE. Normalized names
+    are cached, so each distinct property value is only parsed once.
+    """
+
+    def __init__(self):
+        self._serializers = {}
+        self._lookups = {}
+
+    @staticmethod
+    def _normalize(content_type):
+        return (content_type or DEFAULT_CONTENT_TYPE).split(';', 1)[0] \
+            .strip().lower()
+
+    def register(self, serializer: Serializer, *aliases):
+        """
+        Registers a serializer under its content_type and any alias,
+        replacing the serializers previously registered with those names
+        """
+        for name in (serializer.content_type,) + aliases:
+            self._serializers[self._normalize(name)] = serializer
+        self._lookups = {}
+
+    def unregister(self, content_type):
+        self._serializers.pop(self._normalize(content_type), None)
+        self._lookups = {}
+
+    def get(self, content_type) -> Serializer:
+        """
+        :raise UnknownContentType: If nothing is registered for the type
+        """
+        serializer = self._lookups.get(content_type)
+        if serializer is None:
+            serializer = self._serializers.get(self._normalize(content_type))
+            if serializer is None:
+                raise UnknownContentType(
+                    "No serializer registered for {!r}".format(content_type)
+                )
+            self._lookups[content_type] = serializer
+        return serializer
+
+    def __contains__(self, content_type):
+        try:
+            self.get(content_type)
+        except UnknownContentType:
+            return False
+        return True
+
+
+serializers = SerializerRegistry()
+serializers.register(RawSerializer(), 'binary')
+serializers.register(TextSerializer())
+serializers.register(JSONSerializer(), 'json')
+
+
+class ContentCodec:
+    """
+    Serializes and encodes message bodies according to their content_type
+    and content_encoding properties, and decodes them back.
+
+    Consumers usually receive messages of a single kind, so the last
+    resolved (content_type, content_encoding) pair is kept and compared
+    with the next message properties before the registries are looked up.
+
+    With a Compression, bodies published without a content_encoding are
+    compressed above its threshold, encode returning a copy of their
+    properties with content_encoding set. encode_async and decode_async run
+    the (de)compression of bodies above its offload_threshold in its
+    executor. Decoding fails with DecodedBodyTooLarge rather than
+    decompress a body beyond max_size bytes.
+
+    Usage:
+        properties = BasicProperties(content_type='application/json')
+        body, properties = codec.encode({'id': 1}, properties)
+        await channel.publish(body, properties=properties)
+        ...
+        codec.decode(message.body, message.properties)
+    """
+
+    def __init__(self, serializers=serializers, encoders=default_encoders,
+                 compression=None, max_size=134217728):
+        """
+        :param SerializerRegistry serializers: Serializers by content type
+        :param EncoderRegistry encoders: Encoders by content encoding
+        :param Compression compression: Compression of the published bodies.
+        If its encoder is missing from encoders, the codec uses a copy of
+        them with it added, so it can decode what it encodes
+        :param int max_size: Largest decoded body, in bytes. None for no
+        limit
+        """
+        self.serializers = serializers
+        self.compression = compression
+        self.max_size = max_size
+        if compression is not None and \
+                compression.encoder.content_encoding not in encoders:
+            encoders = encoders.copy()
+            encoders.register(compression.encoder)
+        self.encoders = encoders
+        self._content_type = self._content_encoding = None
+        self._resolved = None
+
+    def resolve(self, content_type, content_encoding):
+        """
+        :return: The serializer and encoder of a content type and encoding.
+        The encoder is None when there is no encoding
+        """
+        if self._resolved is not None and \
+                content_type == self._content_type and \
+                content_encoding == self._content_encoding:
+            return self._resolved
+        encoder = self.encoders.get(content_encoding)
+        if isinstance(encoder, IdentityEncoder):
+            encoder = None
+        resolved = self.serializers.get(content_type), encoder
+        self._content_type = content_type
+        self._content_encoding = content_encoding
+        self._resolved = resolved
+        return resolved
+
+    def _serialize(self, obj, properties, buffer):
+        """
+        :return: The buffer holding the body, the serialized data still to
+        be encoded and its encoder, the latter two being None when done
+        """
+        serializer, encoder = self.resolve(
+            getattr(properties, 'content_type', None),
+            getattr(properties, 'content_encoding', None)
+        )
+        if buffer is None:
+            buffer = bytearray()
+        compression = self.compression
+        if encoder is None and (compression is None or properties is None):
+            serializer.encode(obj, buffer)
+            return buffer, None, None
+        serialized = bytearray()
+        serializer.encode(obj, serialized)
+        if encoder is None:
+            if len(serialized) < compression.threshold:
+                buffer += serialized
+                return buffer, None, None
+            encoder = compression.encoder
+        return buffer, serialized, encoder
+
+    def _finish(self, buffer, serialized, encoded, encoder, properties):
+        if properties.content_encoding is None:
+            if len(encoded) >= len(serialized):
+                # Not worth it
+                buffer += serialized
+                return buffer, properties
+            properties = properties.copy(
+                content_encoding=encoder.content_encoding
+            )
+        buffer += encoded
+        return buffer, properties
+
+    @staticmethod
+    def _encode(encoder, serialized):
+        encoded = bytearray()
+        encoder.encode(serialized, encoded)
+        return encoded
+
+    def encode(self, obj, properties=None, buffer=None):
+        """
+        Appends the body of obj to buffer
+        :param BasicProperties properties: Properties giving the content
+        type and encoding. Left unchanged
+        :param bytearray buffer: Buffer to append to. A new one by default
+        :return: The buffer, and the properties to publish it with: a copy
+        with content_encoding set when the codec compressed the body,
+        properties otherwise
+        """
+        buffer, serialized, encoder = self._serialize(obj, properties, buffer)
+        if encoder is None:
+            return buffer, properties
+        return self._finish(
+            buffer, serialized, self._encode(encoder, serialized), encoder,
+            properties
+        )
+
+    async def encode_async(self, obj, properties=None, buffer=None):
+        """
+        encode, large bodies being compressed out of the event loop
+        """
+        buffer, serialized, encoder = self._serialize(obj, properties, buffer)
+        if encoder is None:
+            return buffer, properties
+        if self.compression is not None and \
+                self.compression.offloaded(len(serialized)):
+            encoded = await self.compression.run(
+                self._encode, encoder, serialized
+            )
+        else:
+            encoded = self._encode(encoder, serialized)
+        return self._finish(buffer, serialized, encoded, encoder, properties)
+
+    def _resolve_body(self, body, properties):
+        serializer, encoder = self.resolve(
+            getattr(properties, 'content_type', None),
+            getattr(properties, 'content_encoding', None)
+        )
+        data = body if isinstance(body, memoryview) else memoryview(body)
+        return serializer, encoder, data
+
+    def decode(self, body, properties=None):
+        """
+        :param body: Bytes-like message body
+        :param BasicProperties properties: Properties of the message
+        :return: The decoded object
+        :raise DecodedBodyTooLarge: If the body decodes to more than
+        max_size bytes
+        """
+        serializer, encoder, data = self._resolve_body(body, properties)
+        if encoder is not None:
+            data = memoryview(encoder.decode(data, self.max_size))
+        return serializer.decode(data)
+
+    async def decode_async(self, body, properties=None):
+        """
+        decode, large bodies being decompressed out of the event loop
+        """
+        serializer, encoder, data = self._resolve_body(body, properties)
+        if encoder is not None:
+            if self.compression is not None and \
+                    self.compression.offloaded(len(data)):
+                data = await self.compression.run(
+                    encoder.decode, data, self.max_size
+                )
+            else:
+                data = encoder.decode(data, self.max_size)
+            data = memoryview(data)
+        return serializer.decode(data)
+
+
+default_codec = ContentCodec()
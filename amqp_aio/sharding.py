@@ -0,0 +1,391 @@
+import asyncio
+import collections
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+
+from amqp_aio.amqp.exceptions import AMQPException, MessageNacked
+from amqp_aio.connection import AMQPConnection, TCPConnection
+from amqp_aio.pool import shard_for_key
+
+logger = logging.getLogger(__name__)
+
+_READY = 'ready'
+_CONFIRM = 'confirm'
+_FAILED = 'failed'
+# Longest error description reported by a shard
+_MAX_ERROR = 1024
+
+
+def _describe(exc):
+    return repr(exc)[:_MAX_ERROR]
+
+
+class _PipeWriter:
+    """
+    Sends messages over a multiprocessing connection from a thread of the
+    default executor, in order, so the event loop never blocks on a full
+    pipe while the process at the other end waits on it too
+    """
+
+    def __init__(self, pipe, on_error=None):
+        """
+        :param on_error: Called with the OSError failing a send, the
+        messages not sent yet being dropped
+        """
+        self.pipe = pipe
+        self.on_error = on_error
+        self._queue = collections.deque()
+        self._task = None
+
+    def send(self, data):
+        self._queue.append(data)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        loop = asyncio.get_event_loop()
+        try:
+            while self._queue:
+                await loop.run_in_executor(
+                    None, self.pipe.send_bytes, self._queue.popleft()
+                )
+        except OSError as exc:
+            logger.debug("Pipe closed: %s", exc)
+            self._queue.clear()
+            if self.on_error is not None:
+                self.on_error(exc)
+        finally:
+            self._task = None
+
+    async def flush(self):
+        """
+        Waits until every message was sent
+        """
+        while self._task is not None:
+            await asyncio.shield(self._task)
+
+
+async def open_connection(host, port=None, vhost='/', heartbeat=None):
+    """
+    Default connection factory of the shards
+    """
+    connection = AMQPConnection(
+        TCPConnection(host, port), heartbeat=heartbeat, vhost=vhost
+    )
+    await connection.connect()
+    await connection.wait_opened()
+    return connection
+
+
+class _Shard:
+    """
+    Publishing side of a shard process: reads batches from the parent pipe
+    and publishes them in order, reporting each batch confirm.
+    """
+
+    def __init__(self, connect, pipe):
+        self.connect = connect
+        self.pipe = pipe
+        self.writer = _PipeWriter(pipe)
+        self.batches = asyncio.Queue()
+        self.confirms = set()
+
+    def _on_readable(self):
+        try:
+            while self.pipe.poll():
+                data = self.pipe.recv_bytes()
+                self.batches.put_nowait(pickle.loads(data) if data else None)
+        except EOFError:
+            # Parent gone
+            self.batches.put_nowait(None)
+
+    def _report(self, batch_id, future):
+        error = None
+        if future.cancelled():
+            error = 'cancelled'
+        elif future.exception() is not None:
+            error = _describe(future.exception())
+        self.writer.send(pickle.dumps((_CONFIRM, batch_id, error)))
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        try:
+            connection = await self.connect()
+            channel = await connection.channel()
+            await channel.confirm_select()
+        except Exception as exc:
+            self.writer.send(pickle.dumps((_FAILED, None, _describe(exc))))
+            await self.writer.flush()
+            return
+        self.writer.send(pickle.dumps((_READY, None, None)))
+        loop.add_reader(self.pipe.fileno(), self._on_readable)
+        try:
+            while True:
+                batch = await self.batches.get()
+                if batch is None:
+                    break
+                batch_id, messages = batch
+                try:
+                    confirmed = await channel.publish_many(
+                        messages, confirm=True
+                    )
+                except Exception as exc:
+                    confirmed = loop.create_future()
+                    confirmed.set_exception(exc)
+                confirmed.add_done_callback(
+                    functools.partial(self._report, batch_id)
+                )
+                self.confirms.add(confirmed)
+                confirmed.add_done_callback(self.confirms.discard)
+            if self.confirms:
+                await asyncio.wait(list(self.confirms))
+            await self.writer.flush()
+        finally:
+            loop.remove_reader(self.pipe.fileno())
+            await connection.close()
+
+
+def _run_shard(connect, pipe):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(_Shard(connect, pipe).run())
+    finally:
+        pipe.close()
+        loop.close()
+
+
+class ShardedPublisher:
+    """
+    Publishes from N worker processes, each with its own AMQPConnection, so
+    encoding is spread over as many cores.
+
+    Messages are partitioned by key (the routing key by default), so every
+    message with the same key goes through the same process and connection,
+    in order. The messages published within a loop iteration are sent to
+    their shard in pickled batches of up to max_batch messages over a pipe,
+    which the shard publishes with Channel.publish_many on a channel in
+    confirm mode. Pipes are written from executor threads on both sides, so
+    neither event loop blocks on a full pipe.
+
+    publish() returns a future per message, resolved once the broker
+    confirmed it. Confirms are reported per batch, so a nack fails every
+    future of the batch the message was sent with. In flight messages are
+    bounded by max_in_flight per shard, publish() waiting for confirms
+    beyond it, which also keeps the confirm reports from ever filling the
+    pipe back to the parent.
+
+    Usage:
+        publisher = ShardedPublisher('localhost', shards=4)
+        await publisher.start()
+        confirmed = await publisher.publish(b'body', routing_key='orders')
+        await confirmed
+        await publisher.close()
+    """
+
+    def __init__(self, host=None, port=None, shards=None, vhost='/',
+                 heartbeat=None, max_in_flight=1000, connect=None,
+                 mp_context=None, max_batch=500):
+        """
+        :param str host: Server host
+        :param int port: Server port
+        :param int shards: Worker processes. Defaults to the CPU count
+        :param str vhost: Virtual Host the shards connect to
+        :param int heartbeat: Desired delay between Heartbeats
+        :param int max_in_flight: Messages not confirmed yet per shard
+        :param connect: Picklable coroutine function returning an open
+        AMQPConnection, called in each shard instead of connecting to host
+        :param mp_context: multiprocessing context the shards are started
+        with
+        :param int max_batch: Messages sent to a shard at once
+        """
+        if connect is None:
+            if host is None:
+                raise ValueError("Either host or connect is required")
+            connect = functools.partial(
+                open_connection, host, port, vhost, heartbeat
+            )
+        self.connect = connect
+        self.shards = shards or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight
+        self.max_batch = max_batch
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self.processes = []
+        self._pipes = []
+        self._writers = []
+        self._ready = []
+        self._slots = []
+        # Messages waiting for the next flush, per shard
+        self._pending = []
+        self._flush_handle = None
+        self._batch_ids = itertools.count(1)
+        # batch id -> (shard, futures)
+        self._batches = {}
+        # Shards whose process exited
+        self._dead = set()
+        self._closed = False
+
+    async def start(self):
+        """
+        Starts the shard processes and waits for their connections
+        """
+        loop = asyncio.get_event_loop()
+        for index in range(self.shards):
+            parent_pipe, child_pipe = self.mp_context.Pipe()
+            process = self.mp_context.Process(
+                target=_run_shard, args=(self.connect, child_pipe),
+                name='amqp-shard-{}'.format(index), daemon=True
+            )
+            process.start()
+            child_pipe.close()
+            self.processes.append(process)
+            self._pipes.append(parent_pipe)
+            self._writers.append(_PipeWriter(
+                parent_pipe, functools.partial(self._fail_shard, index)
+            ))
+            self._ready.append(loop.create_future())
+            self._slots.append(asyncio.Semaphore(self.max_in_flight))
+            self._pending.append([])
+            loop.add_reader(
+                parent_pipe.fileno(), self._on_readable, index
+            )
+        try:
+            await asyncio.gather(*self._ready)
+        except BaseException:
+            await self._stop_processes()
+            raise
+
+    def _on_readable(self, index):
+        pipe = self._pipes[index]
+        try:
+            while pipe.poll():
+                kind, batch_id, error = pickle.loads(pipe.recv_bytes())
+                if kind == _CONFIRM:
+                    self._settle(batch_id, error)
+                elif kind == _READY:
+                    self._ready[index].set_result(None)
+                else:
+                    self._ready[index].set_exception(AMQPException(
+                        "Shard {} failed to connect: {}".format(index, error)
+                    ))
+        except EOFError:
+            asyncio.get_event_loop().remove_reader(pipe.fileno())
+            self._fail_shard(index)
+
+    def _settle(self, batch_id, error):
+        index, futures = self._batches.pop(batch_id)
+        for future in futures:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(MessageNacked(error))
+        for _ in futures:
+            self._slots[index].release()
+
+    def _fail_shard(self, index, cause=None):
+        """
+        Fails the messages of a shard whose process exited, or whose pipe
+        can't be written to
+        """
+        if index in self._dead:
+            return
+        self._dead.add(index)
+        exc = AMQPException("Shard {} exited".format(index))
+        if not self._ready[index].done():
+            self._ready[index].set_exception(exc)
+        for batch_id, (shard, _) in list(self._batches.items()):
+            if shard == index:
+                self._settle(batch_id, str(exc))
+        for _, future in self._pending[index]:
+            if not future.done():
+                future.set_exception(exc)
+        self._pending[index] = []
+        if not self._closed:
+            logger.error("Shard %s exited: %s", index, cause or "EOF")
+
+    async def publish(self, body, exchange='', routing_key='',
+                      properties=None, mandatory=False,
+                      key=None) -> asyncio.Future:
+        """
+        Hands a message over to its shard
+        :param key: Partitioning key. Defaults to the routing key
+        :return: A future resolved once the message is confirmed, or failed
+        with MessageNacked
+        :raise AMQPException: If the process of the shard exited
+        """
+        if self._closed:
+            raise RuntimeError("ShardedPublisher is closed")
+        index = shard_for_key(routing_key if key is None else key,
+                              self.shards)
+        self._check_alive(index)
+        await self._slots[index].acquire()
+        if index in self._dead:
+            self._slots[index].release()
+            self._check_alive(index)
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending[index].append(({
+            'body': body, 'exchange': exchange, 'routing_key': routing_key,
+            'properties': properties, 'mandatory': mandatory,
+        }, future))
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_soon(self._flush)
+        return future
+
+    def _check_alive(self, index):
+        if index in self._dead:
+            raise AMQPException("Shard {} exited".format(index))
+
+    def _flush(self):
+        self._flush_handle = None
+        for index, pending in enumerate(self._pending):
+            if not pending:
+                continue
+            self._pending[index] = []
+            for start in range(0, len(pending), self.max_batch):
+                batch = pending[start:start + self.max_batch]
+                batch_id = next(self._batch_ids)
+                self._batches[batch_id] = (
+                    index, [future for _, future in batch]
+                )
+                self._writers[index].send(pickle.dumps(
+                    (batch_id, [message for message, _ in batch]),
+                    pickle.HIGHEST_PROTOCOL
+                ))
+
+    async def close(self):
+        """
+        Waits for the messages in flight to be confirmed, then stops the
+        shards
+        """
+        self._closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+        futures = [
+            future for _, batch in self._batches.values() for future in batch
+        ]
+        if futures:
+            await asyncio.wait(futures)
+        await self._stop_processes()
+
+    async def _stop_processes(self):
+        loop = asyncio.get_event_loop()
+        for pipe, writer in zip(self._pipes, self._writers):
+            loop.remove_reader(pipe.fileno())
+            writer.send(b'')
+        for writer in self._writers:
+            await writer.flush()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join)
+        for pipe in self._pipes:
+            pipe.close()
+        self.processes = []
+        self._pipes = []
+        self._writers = []
@@ -0,0 +1,216 @@
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+# Slot segments attached by a worker process, by name, least recently used
+# first
+_attached = OrderedDict()
+# Attached segments kept per worker process
+MAX_ATTACHED = 64
+_tracker_lock = threading.Lock()
+
+
+class Slab:
+    """
+    Region of a shared memory segment holding a single message body
+    """
+    __slots__ = ('segment', 'offset', 'length', 'size', 'view')
+
+    def __init__(self, segment, offset, length, size):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        # Capacity of the region, length being the bytes in use
+        self.size = size
+        self.view = segment.buf[offset:offset + length]
+
+    @property
+    def name(self):
+        return self.segment.name
+
+    def __repr__(self):
+        return 'Slab<{} {}+{}>'.format(self.name, self.offset, self.length)
+
+
+class SlabPool:
+    """
+    Recycled shared memory regions message bodies are written into, so
+    worker processes can read them without the bodies being pickled.
+
+    Bodies up to slot_size bytes get a slot of a segment shared by
+    slots_per_segment of them. Larger bodies get a segment of their own,
+    rounded up to a multiple of slot_size, kept for reuse once freed as long
+    as max_free_bytes allows.
+
+    Slabs are only handed to processes as (name, offset, length), which
+    workers turn back into a buffer with attach_body(). Workers keep the
+    slot segments attached, those living as long as the pool, but detach
+    the large ones after each call, so the memory of the large segments the
+    pool destroys is returned.
+    """
+
+    def __init__(self, slot_size=1048576, slots_per_segment=16,
+                 max_free_bytes=268435456):
+        """
+        :param int slot_size: Bytes of the shared slots
+        :param int slots_per_segment: Slots allocated at once
+        :param int max_free_bytes: Bytes of the freed large segments kept
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory requires Python 3.8 or newer")
+        self.slot_size = slot_size
+        self.slots_per_segment = slots_per_segment
+        self.max_free_bytes = max_free_bytes
+        self._segments = []
+        # (segment, offset) of the free slots
+        self._free_slots = []
+        # size -> free large segments
+        self._free_large = {}
+        self._free_large_bytes = 0
+        # Slabs allocated and not freed yet
+        self._in_use = set()
+        # Destroyed segments whose memory was still exported
+        self._unclosed = []
+
+    def allocate(self, length) -> Slab:
+        if length <= self.slot_size:
+            if not self._free_slots:
+                self._grow()
+            segment, offset = self._free_slots.pop()
+            slab = Slab(segment, offset, length, self.slot_size)
+        else:
+            size = -(-length // self.slot_size) * self.slot_size
+            free = self._free_large.get(size)
+            if free:
+                segment = free.pop()
+                self._free_large_bytes -= size
+            else:
+                segment = self._create(size)
+            slab = Slab(segment, 0, length, size)
+        self._in_use.add(slab)
+        return slab
+
+    def is_shared(self, slab: Slab) -> bool:
+        """
+        Whether the slab is a slot of a segment shared by several bodies
+        """
+        return slab.size == self.slot_size
+
+    def _create(self, size):
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        self._segments.append(segment)
+        return segment
+
+    def _grow(self):
+        segment = self._create(self.slot_size * self.slots_per_segment)
+        self._free_slots.extend(
+            (segment, index * self.slot_size)
+            for index in reversed(range(self.slots_per_segment))
+        )
+
+    def free(self, slab: Slab):
+        """
+        Returns a slab to the pool. Its view must not be used anymore
+        """
+        self._in_use.discard(slab)
+        slab.view.release()
+        if self.is_shared(slab):
+            self._free_slots.append((slab.segment, slab.offset))
+        elif self._free_large_bytes + slab.size <= self.max_free_bytes:
+            self._free_large.setdefault(slab.size, []).append(slab.segment)
+            self._free_large_bytes += slab.size
+        else:
+            self._segments.remove(slab.segment)
+            self._destroy(slab.segment)
+
+    def _destroy(self, segment):
+        try:
+            segment.close()
+        except BufferError:
+            # A view of a body is still around: the memory is returned once
+            # it is released, the segment being closed along with the pool
+            logger.warning("Destroying segment %s while in use", segment.name)
+            self._unclosed.append(segment)
+        segment.unlink()
+
+    def close(self):
+        """
+        Destroys every segment. Slabs still in use become invalid
+        """
+        for slab in self._in_use:
+            try:
+                slab.view.release()
+            except BufferError:
+                pass
+        self._in_use = set()
+        for segment in self._segments:
+            self._destroy(segment)
+        self._segments = []
+        self._free_slots = []
+        self._free_large = {}
+        self._free_large_bytes = 0
+
+
+def _untracked(name, rtype):
+    pass
+
+
+def _attach(name):
+    """
+    Attaches a segment of the pool process without tracking it: the
+    resource tracker would otherwise unlink it, or warn about a leak, when
+    this process exits
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _tracker_lock:
+        register = resource_tracker.register
+        resource_tracker.register = _untracked
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def attach_body(name, offset, length, keep=True):
+    """
+    Returns a slab body from a worker process
+    :param bool keep: Whether the segment stays attached for the next
+    bodies, the most recently used segments being kept. Otherwise the
+    caller must close the segment once the body is released
+    :return: The body, and the segment when not kept
+    """
+    if not keep:
+        segment = _attach(name)
+        return segment.buf[offset:offset + length], segment
+    segment = _attached.get(name)
+    if segment is None:
+        if len(_attached) >= MAX_ATTACHED:
+            _attached.popitem(last=False)[1].close()
+        segment = _attached[name] = _attach(name)
+    else:
+        _attached.move_to_end(name)
+    return segment.buf[offset:offset + length], None
+
+
+def call_with_slab(function, name, offset, length, routing_key, keep=True):
+    """
+    Runs function with a slab body, in a worker process
+    :param bool keep: Whether the segment stays attached afterwards
+    """
+    body, segment = attach_body(name, offset, length, keep)
+    try:
+        return function(body, routing_key)
+    finally:
+        body.release()
+        if segment is not None:
+            segment.close()
@@ -0,0 +1,124 @@
+import mmap
+import struct
+import tempfile
+
+from amqp_aio.amqp.consts import BODY_TYPE, FRAME_END
+
+_FRAME_HEADER = struct.Struct('>BHI')
+
+
+class BodySpooler:
+    """
+    Body allocator spooling large message bodies to temporary files.
+
+    Bodies of at least threshold bytes are written, frame by frame, into a
+    memory mapped temporary file, and the consumer receives a memoryview of
+    the mapping instead of bytes. The pages are backed by the file, so the
+    kernel may write them out instead of holding the whole body in memory.
+    The file is deleted as soon as it is created, its space being reclaimed
+    once the memoryview (and any view derived from it) is released or
+    garbage collected.
+
+    Usage:
+        channel.body_allocator = BodySpooler(threshold=64 * 2 ** 20)
+    """
+
+    def __init__(self, threshold=16777216, directory=None):
+        """
+        :param int threshold: Smallest body spooled to disk, in bytes
+        :param str directory: Directory of the temporary files. Defaults to
+        the tempfile module default
+        """
+        self.threshold = threshold
+        self.directory = directory
+
+    def __call__(self, method, size):
+        if size < self.threshold:
+            return None
+        with tempfile.TemporaryFile(dir=self.directory) as file:
+            file.truncate(size)
+            # The mapping keeps its own reference to the file
+            mapping = mmap.mmap(file.fileno(), size)
+        return memoryview(mapping)
+
+
+def map_body(body):
+    """
+    Returns a read-only mapping of a file object, or body itself if it
+    already supports the buffer protocol
+    """
+    if not hasattr(body, 'fileno'):
+        return body
+    body.seek(0, 2)
+    if not body.tell():
+        return b''
+    return mmap.mmap(body.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class FramedBody:
+    """
+    Content frames of a single message, sliced from its body on demand.
+
+    Behaves like the bytes of the method, header and body frames for the
+    outbound scheduler (len() and slicing), but a slice only copies the body
+    frames it covers, so publishing a mapped file never copies it whole.
+    """
+
+    def __init__(self, prefix, body, channel_id, frame_size):
+        """
+        :param bytes prefix: Encoded method and content header frames
+        :param body: Buffer of the body, typically an mmap
+        :param int channel_id: Channel the frames are sent on
+        :param int frame_size: Maximum body bytes per frame
+        """
+        self.prefix = bytes(prefix)
+        self.body = memoryview(body)
+        self.channel_id = channel_id
+        self.frame_size = frame_size
+        self.frames = -(-len(self.body) // frame_size)
+        self.size = len(self.prefix) + len(self.body) + self.frames * 8
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def frame_cuts(self):
+        """
+        Offsets where each body frame starts
+        """
+        stride = self.frame_size + 8
+        return [
+            len(self.prefix) + index * stride for index in range(self.frames)
+        ]
+
+    def _frame(self, index):
+        chunk = self.body[
+            index * self.frame_size:(index + 1) * self.frame_size
+        ]
+        return (
+            _FRAME_HEADER.pack(BODY_TYPE, self.channel_id, len(chunk)),
+            chunk, FRAME_END
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("FramedBody only supports slicing")
+        start, stop, _ = index.indices(self.size)
+        parts = []
+        prefix_size = len(self.prefix)
+        if start < prefix_size:
+            parts.append(self.prefix[start:stop])
+        stride = self.frame_size + 8
+        first = max(0, start - prefix_size) // stride
+        offset = prefix_size + first * stride
+        for frame in range(first, self.frames):
+            if offset >= stop:
+                break
+            for part in self._frame(frame):
+                end = offset + len(part)
+                if end > start and offset < stop:
+                    parts.append(
+                        part[max(0, start - offset):stop - offset]
+                    )
+                offset = end
+        return b''.join(parts)
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+from amqp_aio.amqp.amqp_types import LongLongUint, LongString, Timestamp
+
+logger = logging.getLogger(__name__)
+
+OFFSET_HEADER = 'x-stream-offset'
+
+
+def stream_offset(message):
+    """
+    :return: The offset of a message delivered from a stream, None for
+    messages from other queues
+    """
+    return message.headers.get(OFFSET_HEADER)
+
+
+def offset_argument(offset):
+    """
+    Encodes where a stream consumer starts, for the x-stream-offset
+    consume argument
+    :param offset: 'first', 'last', 'next', an interval such as '1h' or
+    '7D', an offset (int) or a datetime
+    """
+    if isinstance(offset, datetime):
+        return Timestamp(offset)
+    if isinstance(offset, bool) or not isinstance(offset, (int, str)):
+        raise TypeError("Invalid stream offset {!r}".format(offset))
+    if isinstance(offset, str):
+        return LongString(offset)
+    if offset < 0:
+        raise ValueError("Stream offsets can't be negative")
+    return LongLongUint(offset)
+
+
+async def declare_stream(channel, queue, max_age=None, max_length_bytes=None,
+                         max_segment_size_bytes=None):
+    """
+    Declares a durable stream queue
+    :param str max_age: Age of the retained messages, e.g. '7D'
+    :param int max_length_bytes: Size of the retained messages
+    :param int max_segment_size_bytes: Size of the stream segment files
+    :return: queue.DeclareOK
+    """
+    arguments = {'x-queue-type': LongString('stream')}
+    if max_age is not None:
+        arguments['x-max-age'] = LongString(max_age)
+    if max_length_bytes is not None:
+        arguments['x-max-length-bytes'] = LongLongUint(max_length_bytes)
+    if max_segment_size_bytes is not None:
+        arguments['x-stream-max-segment-size-bytes'] = LongLongUint(
+            max_segment_size_bytes
+        )
+    return await channel.queue_declare(
+        queue, durable=True, arguments=arguments
+    )
+
+
+class FileOffsetStore:
+    """
+    Offsets of the stream consumers, one file per consumer name in
+    directory. Saving writes a temporary file and renames it over the
+    previous one, so a crash leaves either offset, never a torn file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, '{}.offset'.format(name))
+
+    def load(self, name):
+        """
+        :return: The offset saved for name, None if there is none
+        """
+        try:
+            with open(self._path(name)) as file:
+                return int(file.read())
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, offset):
+        descriptor, path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                file.write(str(offset))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path, self._path(name))
+        except BaseException:
+            os.unlink(path)
+            raise
+
+
+class StreamConsumer:
+    """
+    Consumer of a RabbitMQ stream queue, resuming where it left off.
+
+    The handler is awaited with each Message, whose offset in the stream is
+    given by stream_offset(). Once it returns, the offset is recorded as
+    processed, and saved to the store (a checkpoint) every checkpoint_every
+    messages or checkpoint_interval seconds, whichever comes first, as well
+    as when the consumer stops. On start, a consumer whose name has a saved
+    offset resumes right after it, the offset argument only applying to
+    its first run: messages processed after the last checkpoint are
+    delivered again after a crash.
+
+    Streams require a prefetch, which bounds the messages in flight.
+    Deliveries are acknowledged by the consumer, with a multiple ack every
+    half prefetch, so handlers must not settle them.
+
+    Usage:
+        consumer = StreamConsumer(
+            channel, 'events', handle, name='projector',
+            store=FileOffsetStore('/var/lib/projector'), offset='first'
+        )
+        await consumer.start()
+        ...
+        await consumer.stop()
+    """
+
+    def __init__(self, channel, queue, handler, name=None, store=None,
+                 offset='next', prefetch=1000, checkpoint_every=10000,
+                 checkpoint_interval=5.0):
+        """
+        :param Channel channel: Channel dedicated to this consumer
+        :param str queue: Stream queue to consume
+        :param handler: Coroutine function awaited with each Message
+        :param str name: Name the offsets are saved under. Defaults to the
+        queue name
+        :param store: FileOffsetStore or any object with load(name) and
+        save(name, offset). None to never checkpoint
+        :param offset: Where to start without a saved offset, see
+        offset_argument
+        :param int prefetch: Messages in flight
+        :param int checkpoint_every: Messages processed between checkpoints
+        :param float checkpoint_interval: Longest delay between
+        checkpoints, in seconds
+        """
+        self.channel = channel
+        self.queue = queue
+        self.handler = handler
+        self.name = name or queue
+        self.store = store
+        self.initial_offset = offset
+        self.prefetch = prefetch
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.consumer_tag = None
+        # Last processed offset, and the last one saved
+        self.offset = None
+        self.checkpointed = None
+        self._ack_every = max(1, prefetch // 2)
+        self._unacked = 0
+        self._last_tag = None
+        self._since_checkpoint = 0
+        self._checkpointed_at = 0.0
+
+    def start_offset(self):
+        """
+        :return: Where the consumer starts: after the saved offset if any,
+        otherwise the offset given at creation
+        """
+        if self.store is not None:
+            saved = self.store.load(self.name)
+            if saved is not None:
+                self.offset = self.checkpointed = saved
+                return saved + 1
+        return self.initial_offset
+
+    async def start(self, consumer_tag=None):
+        """
+        Sets the channel prefetch and starts consuming the stream
+        :return: The consumer tag
+        """
+        start = self.start_offset()
+        logger.info("Consuming stream %s from %r", self.queue, start)
+        self._checkpointed_at = asyncio.get_event_loop().time()
+        await self.channel.qos(prefetch_count=self.prefetch)
+        self.consumer_tag = await self.channel.consume(
+            self.queue, self._on_message, consumer_tag=consumer_tag,
+            arguments={OFFSET_HEADER: offset_argument(start)}
+        )
+        return self.consumer_tag
+
+    async def _on_message(self, message):
+        await self.handler(message)
+        offset = stream_offset(message)
+        if offset is not None:
+            self.offset = offset
+        self._last_tag = message.delivery_tag
+        self._unacked += 1
+        if self._unacked >= self._ack_every:
+            await self._ack()
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every or \
+                asyncio.get_event_loop().time() - self._checkpointed_at >= \
+                self.checkpoint_interval:
+            self.checkpoint()
+
+    async def _ack(self):
+        if not self._unacked or self.channel.is_closed:
+            return
+        self._unacked = 0
+        await self.channel.ack(self._last_tag, multiple=True)
+
+    def checkpoint(self):
+        """
+        Saves the last processed offset
+        """
+        self._since_checkpoint = 0
+        self._checkpointed_at = asyncio.get_event_loop().time()
+        if self.store is None or self.offset is None or \
+                self.offset == self.checkpointed:
+            return
+        self.store.save(self.name, self.offset)
+        self.checkpointed = self.offset
+
+    async def stop(self):
+        """
+        Cancels the consumer, acknowledges the processed messages and saves
+        their offset
+        """
+        if self.consumer_tag is not None and not self.channel.is_closed:
+            await self.channel.cancel(self.consumer_tag)
+        self.consumer_tag = None
+        await self._ack()
+        self.checkpoint()
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from amqp_aio.amqp import channel, exchange, queue, basic, confirm
+from amqp_aio.amqp.frames import Frame, FrameHeader, ContentBodyFrame
+from amqp_aio.connection import AMQPConnection
+
+
+class FakeTransport:
+    """
+    Stands in for TCPConnection, answering the client frames the way a broker
+    would.
+    """
+
+    def __init__(self):
+        self.is_connected = True
+        self.sent = []
+        self.writes = 0
+        # Bytes the transport pretends not to have flushed yet
+        self.outstanding_bytes = 0
+        self.auto_reply = True
+        self.published = []
+        self.on_publish = None
+        # channel -> message being reassembled
+        self._publishing = {}
+        self.amqp_connection = None
+
+    async def send(self, data):
+        self.writes += 1
+        for frame in self.split_frames(bytes(data)):
+            self.sent.append(frame)
+            self.collect_published(frame)
+            reply = self.reply_to(frame) if self.auto_reply else None
+            if reply is not None:
+                asyncio.ensure_future(self.deliver(reply))
+
+    @staticmethod
+    def split_frames(data):
+        frames = []
+        while data:
+            header, _ = FrameHeader.from_bytes(data[:7])
+            frame, _ = Frame.from_bytes(data[:7 + header.size])
+            frames.append(frame)
+            data = data[7 + header.size + 1:]
+        return frames
+
+    def collect_published(self, frame):
+        payload = frame.payload
+        if isinstance(getattr(payload, 'arguments', None), basic.Publish):
+            self._publishing[frame.channel] = [payload.arguments, None, b'']
+        elif frame.frame_type == 2:
+            self._publishing[frame.channel][1] = payload
+        elif frame.frame_type == 3:
+            self._publishing[frame.channel][2] += payload.body
+        else:
+            return
+        method, header, body = self._publishing[frame.channel]
+        if header is not None and len(body) == header.body_size:
+            del self._publishing[frame.channel]
+            properties, _ = basic.BasicProperties.from_bytes(
+                header.properties
+            )
+            self.published.append((method, properties, body))
+            if self.on_publish is not None:
+                asyncio.ensure_future(
+                    self.on_publish(frame.channel, method, properties, body)
+                )
+
+    async def deliver_content(self, channel_id, method, properties, body):
+        frames = [
+            method.to_frame(channel_id),
+            Frame.from_frame(
+                basic.content_header(len(body), properties),
+                channel=channel_id
+            ),
+        ]
+        if body:
+            frames.append(
+                Frame.from_frame(ContentBodyFrame(body=body), channel_id)
+            )
+        for frame in frames:
+            await self.deliver(frame)
+
+    def reply_to(self, frame):
+        method = getattr(frame.payload, 'arguments', None)
+        if getattr(method, 'no_wait', False):
+            return None
+        replies = {
+            channel.Open: channel.OpenOk,
+            channel.Close: channel.CloseOK,
+            exchange.Declare: exchange.DeclareOK,
+            exchange.Delete: exchange.DeleteOK,
+            queue.Bind: queue.BindOK,
+            queue.Unbind: queue.UnbindOK,
+            confirm.Select: confirm.SelectOK,
+        }
+        if type(method) in replies:
+            return replies[type(method)].declare(channel=frame.channel)
+        if isinstance(method, queue.Declare):
+            return queue.DeclareOK.declare(
+                channel=frame.channel, queue=method.queue, message_count=0,
+                consumer_count=0
+            )
+        if isinstance(method, (basic.Consume, basic.Cancel)):
+            reply = basic.ConsumeOK if isinstance(method, basic.Consume) \
+                else basic.CancelOK
+            return reply.declare(
+                channel=frame.channel, consumer_tag=method.consumer_tag
+            )
+        if isinstance(method, basic.Qos):
+            return basic.QosOK.declare(channel=frame.channel)
+        if isinstance(method, queue.Delete):
+            return queue.DeleteOK.declare(
+                channel=frame.channel, message_count=0
+            )
+        return None
+
+    async def close(self):
+        self.is_connected = False
+
+    async def deliver(self, frame):
+        frame, _ = Frame.from_bytes(frame.to_bytes())
+        await self.amqp_connection._on_frame_received(frame)
+
+    def sent_methods(self, method_class):
+        return [
+            frame for frame in self.sent
+            if isinstance(getattr(frame.payload, 'arguments', None),
+                          method_class)
+        ]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def transport():
+    return FakeTransport()
+
+
+@pytest.fixture
+def amqp_connection(loop, transport):
+    conn = AMQPConnection(transport, heartbeat=60)
+    transport.amqp_connection = conn
+    conn.max_channels = 2047
+    conn._opened_event.set()
+    return conn
@@ -0,0 +1,358 @@
+import asyncio
+
+import pytest
+
+from amqp_aio.amqp import queue, channel, basic, connection
+from amqp_aio.amqp.exceptions import NotFound, UnexpectedFrame, \
+    MessageNacked, ChannelClosed
+from amqp_aio.amqp.frames import Frame, ContentBodyFrame
+
+
+def test_rpc_many_single_write_fifo_replies(loop, amqp_connection,
+                                            transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        writes = transport.writes
+        futures = await ch.rpc_many([
+            queue.Declare(queue='queue-{}'.format(i), arguments={})
+            for i in range(100)
+        ])
+        assert transport.writes == writes + 1
+        return await asyncio.gather(*futures)
+
+    replies = loop.run_until_complete(run())
+    assert [r.queue for r in replies] == [
+        'queue-{}'.format(i) for i in range(100)
+    ]
+
+
+def test_concurrent_declarations_are_pipelined(loop, amqp_connection,
+                                               transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        transport.auto_reply = False
+        declarations = asyncio.gather(*[
+            ch.queue_declare('queue-{}'.format(i)) for i in range(10)
+        ])
+        await asyncio.sleep(0)
+        # Every declaration was sent before any reply arrived
+        sent = len(transport.sent_methods(queue.Declare))
+        for i in range(10):
+            await transport.deliver(queue.DeclareOK.declare(
+                channel=ch.channel_id, queue='queue-{}'.format(i),
+                message_count=0, consumer_count=0
+            ))
+        return sent, await declarations
+
+    sent, replies = loop.run_until_complete(run())
+    assert sent == 10
+    assert [r.queue for r in replies] == [
+        'queue-{}'.format(i) for i in range(10)
+    ]
+
+
+def test_unexpected_reply_fails_oldest_call(loop, amqp_connection,
+                                            transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        transport.auto_reply = False
+        declare, bind = await ch.rpc_many([
+            queue.Declare(queue='q', arguments={}),
+            queue.Bind(queue='q', exchange='x', arguments={})
+        ])
+        await transport.deliver(queue.BindOK.declare(channel=ch.channel_id))
+        return await declare
+
+    with pytest.raises(UnexpectedFrame):
+        loop.run_until_complete(run())
+
+
+def test_channel_close_fails_pending_calls(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        transport.auto_reply = False
+        futures = await ch.rpc_many([
+            queue.Declare(queue='a', passive=True, arguments={}),
+            queue.Declare(queue='b', passive=True, arguments={}),
+        ])
+        await transport.deliver(channel.Close.declare(
+            channel=ch.channel_id, reply_code=404, reply_text='NOT_FOUND'
+        ))
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    results = loop.run_until_complete(run())
+    assert all(isinstance(result, NotFound) for result in results)
+
+
+def test_publish_many_single_write(loop, amqp_connection, transport):
+    amqp_connection.max_frame_length = 4096
+    properties = basic.BasicProperties(content_type='text/plain')
+    bodies = [b'small', b'ends with frame end \xce', b'x' * 10000, b'']
+
+    async def run():
+        ch = await amqp_connection.channel()
+        writes = transport.writes
+        await ch.publish_many(
+            bodies + [{'body': 'routed', 'routing_key': 'other'}],
+            routing_key='batch', properties=properties
+        )
+        return transport.writes - writes
+
+    assert loop.run_until_complete(run()) == 1
+    assert [body for _, _, body in transport.published] == bodies + [
+        b'routed'
+    ]
+    assert [m.routing_key for m, _, _ in transport.published] == [
+        'batch'
+    ] * 4 + ['other']
+    assert all(p == properties for _, p, _ in transport.published)
+    # The 10000 bytes body is split over 3 frames of at most 4088 bytes
+    assert len([f for f in transport.sent if f.frame_type == 3]) == 6
+
+
+def test_publish_many_confirms(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        first = await ch.publish_many([b'a', b'b', b'c'], confirm=True)
+        second = await ch.publish_many([b'd', b'e'], confirm=True)
+        await transport.deliver(basic.Ack.declare(
+            channel=ch.channel_id, delivery_tag=2, multiple=True
+        ))
+        assert not first.done()
+        await transport.deliver(basic.Ack.declare(
+            channel=ch.channel_id, delivery_tag=3
+        ))
+        await first
+        await transport.deliver(basic.Nack.declare(
+            channel=ch.channel_id, delivery_tag=5, multiple=True
+        ))
+        with pytest.raises(MessageNacked):
+            await second
+        return ch
+
+    ch = loop.run_until_complete(run())
+    assert not ch._unconfirmed
+
+
+def test_publish_parked_while_connection_blocked(loop, amqp_connection,
+                                                 transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        await transport.deliver(connection.Blocked.declare(
+            channel=0, reason='low on memory'
+        ))
+        publishing = asyncio.ensure_future(ch.publish(b'body'))
+        await asyncio.sleep(0.01)
+        assert not publishing.done()
+        assert amqp_connection.blocked_reason == 'low on memory'
+        await transport.deliver(connection.Unblocked.declare(channel=0))
+        await publishing
+        return ch
+
+    ch = loop.run_until_complete(run())
+    assert len(transport.published) == 1
+    assert not amqp_connection.is_blocked
+    assert amqp_connection.blocked_time >= 0.01
+    assert ch.publish_wait_time >= 0.01
+
+
+def test_channel_flow_parks_publishers(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        await transport.deliver(channel.Flow.declare(
+            channel=ch.channel_id, active=False
+        ))
+        publishing = asyncio.ensure_future(ch.publish(b'body'))
+        await asyncio.sleep(0)
+        assert not publishing.done() and not ch.is_flowing
+        await transport.deliver(channel.Flow.declare(
+            channel=ch.channel_id, active=True
+        ))
+        await publishing
+
+    loop.run_until_complete(run())
+    assert [f.payload.arguments.active for f in transport.sent_methods(
+        channel.FlowOK
+    )] == [False, True]
+    assert len(transport.published) == 1
+
+
+def test_close_wakes_parked_publishers(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        await transport.deliver(connection.Blocked.declare(channel=0))
+        publishing = asyncio.ensure_future(ch.publish(b'body'))
+        await asyncio.sleep(0)
+        await amqp_connection.close()
+        await publishing
+
+    with pytest.raises(ChannelClosed):
+        loop.run_until_complete(run())
+
+
+def test_streaming_consumer_reads_frames_as_received(loop, amqp_connection,
+                                                      transport):
+    chunks = []
+
+    async def on_message(message):
+        assert message.body is None
+        async for chunk in message.iter_body():
+            chunks.append(bytes(chunk))
+
+    async def run():
+        channel = await amqp_connection.channel()
+        tag = await channel.consume('logs', on_message, stream=True)
+        channel_id = channel.channel_id
+        await transport.deliver(basic.Deliver.declare(
+            channel=channel_id, consumer_tag=tag, delivery_tag=1,
+            exchange='', routing_key='logs'
+        ))
+        await transport.deliver(Frame.from_frame(
+            basic.content_header(6, basic.BasicProperties()), channel_id
+        ))
+        for body in (b'abc', b'def'):
+            await transport.deliver(Frame.from_frame(
+                ContentBodyFrame(body=body), channel_id
+            ))
+            await asyncio.sleep(0)
+            # Handed over before the whole body is received
+            assert chunks[-1] == body
+
+    loop.run_until_complete(run())
+    assert chunks == [b'abc', b'def']
+
+
+def test_publish_stream_keeps_frames_contiguous(loop, amqp_connection,
+                                                transport):
+    produced = asyncio.Event()
+
+    async def chunks():
+        yield b'a' * 5000
+        await produced.wait()
+        yield b'b' * 3000
+
+    async def run():
+        channel = await amqp_connection.channel()
+        stream = asyncio.ensure_future(channel.publish_stream(
+            chunks(), size=8000, routing_key='logs'
+        ))
+        await asyncio.sleep(0.01)
+        other = asyncio.ensure_future(
+            channel.publish(b'other', routing_key='logs')
+        )
+        await asyncio.sleep(0.01)
+        # Waits for the streamed message to complete
+        assert not other.done()
+        produced.set()
+        await asyncio.gather(stream, other)
+
+    amqp_connection.max_frame_length = 4096
+    loop.run_until_complete(run())
+    streamed, other = transport.published
+    assert streamed[2] == b'a' * 5000 + b'b' * 3000
+    assert other[2] == b'other'
+    body_sizes = [
+        frame.size for frame in transport.sent if frame.frame_type == 3
+    ]
+    assert body_sizes == [4088, 3912, 5]
+
+
+def never_ending(first):
+    async def chunks():
+        yield first
+        await asyncio.Event().wait()
+    return chunks()
+
+
+def test_publish_stream_failed_send_releases_gate(loop, amqp_connection):
+    async def run():
+        channel = await amqp_connection.channel()
+
+        async def failing(*args):
+            raise ConnectionResetError()
+        channel._send_content = failing
+        with pytest.raises(ConnectionResetError):
+            await channel.publish_stream(never_ending(b'a' * 10), size=20)
+        assert channel._streaming_out is None
+
+    loop.run_until_complete(run())
+
+
+def test_channel_close_wakes_stream_waiters(loop, amqp_connection):
+    async def run():
+        channel = await amqp_connection.channel()
+        stream = asyncio.ensure_future(
+            channel.publish_stream(never_ending(b'a' * 10), size=20)
+        )
+        await asyncio.sleep(0.01)
+        other = asyncio.ensure_future(channel.publish(b'other'))
+        await asyncio.sleep(0.01)
+        assert not other.done()
+        channel._set_closed()
+        with pytest.raises(ChannelClosed):
+            await other
+        stream.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await stream
+
+    loop.run_until_complete(run())
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_failing_callbacks_keep_reading(loop, amqp_connection, transport,
+                                        stream):
+    received = []
+
+    async def on_message(message):
+        received.append(message.delivery_tag)
+        raise ValueError("bug in the consumer")
+
+    async def run():
+        channel = await amqp_connection.channel()
+        channel.add_return_callback(on_message)
+        tag = await channel.consume('tasks', on_message, stream=stream)
+        for delivery_tag in (1, 2):
+            await transport.deliver_content(
+                channel.channel_id, basic.Deliver(
+                    consumer_tag=tag, delivery_tag=delivery_tag,
+                    exchange='', routing_key='tasks'
+                ), basic.BasicProperties(), b'body'
+            )
+        await transport.deliver_content(channel.channel_id, basic.Return(
+            reply_code=312, reply_text='NO_ROUTE', exchange='',
+            routing_key='nowhere'
+        ), basic.BasicProperties(), b'body')
+        # The connection still answers
+        await channel.queue_declare('tasks')
+        return channel
+
+    channel = loop.run_until_complete(run())
+    assert received == [1, 2, None]
+    assert not channel.is_closed
+    assert not transport.sent_methods(basic.Ack)
+
+
+def test_tags_counted_from_confirm_select_frame(loop, amqp_connection,
+                                                transport):
+    async def run():
+        channel = await amqp_connection.channel()
+        confirming = asyncio.ensure_future(
+            channel.publish_many([b'confirmed'], confirm=True)
+        )
+        await asyncio.sleep(0)
+        # Published between the Select frame and SelectOK: the server
+        # gives it delivery tag 1
+        await channel.publish(b'early')
+        confirmed = await confirming
+        await transport.deliver(basic.Nack.declare(
+            channel=channel.channel_id, delivery_tag=1, multiple=False
+        ))
+        await transport.deliver(basic.Ack.declare(
+            channel=channel.channel_id, delivery_tag=2, multiple=False
+        ))
+        await confirmed
+
+    loop.run_until_complete(run())
+    assert [body for _, _, body in transport.published] == [
+        b'early', b'confirmed'
+    ]
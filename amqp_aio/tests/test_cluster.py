@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from amqp_aio.cluster import ClusterConnector, Endpoint
+
+
+class FakeConnection:
+    def __init__(self, endpoint, delays):
+        self.endpoint = endpoint
+        self.delay = delays[endpoint.host]
+        self.connect_latency = 0.001
+        self.handshake_latency = self.delay
+        self.closed = False
+
+    async def connect(self):
+        if self.delay is None:
+            raise ConnectionRefusedError(self.endpoint.host)
+        await asyncio.sleep(self.delay)
+
+    async def wait_opened(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+def connector(delays, **kwargs):
+    cluster = ClusterConnector(
+        list(delays), reconnect=False, stagger_delay=0.05, **kwargs
+    )
+    cluster.created = []
+
+    def create_connection(endpoint):
+        connection = FakeConnection(endpoint, delays)
+        cluster.created.append(connection)
+        return connection
+    cluster._create_connection = create_connection
+    return cluster
+
+
+def test_endpoint_parse():
+    assert (Endpoint.parse('node-1:5673').host,
+            Endpoint.parse('node-1:5673').port) == ('node-1', 5673)
+    assert Endpoint.parse('node-1').port == 5672
+    assert Endpoint.parse(('node-2', 5674)).port == 5674
+
+
+def test_dead_node_does_not_delay_connection(loop):
+    cluster = connector({'dead': None, 'slow': 0.2, 'fast': 0.01})
+    started = loop.time()
+    connection = loop.run_until_complete(cluster.connect())
+    assert connection.endpoint.host == 'fast'
+    assert loop.time() - started < 0.2
+    slow = [c for c in cluster.created if c.endpoint.host == 'slow'][0]
+    assert slow.closed
+
+
+def test_candidates_prefer_fastest_healthy_node(loop):
+    cluster = connector({'a': 0.03, 'b': 0.01, 'c': None})
+    cluster.endpoints[0].latency = 0.03
+    cluster.endpoints[1].latency = 0.01
+    cluster.endpoints[2].record_failure(loop.time(), 10, 10)
+    hosts = [endpoint.host for endpoint in cluster.candidates()]
+    assert hosts == ['b', 'a', 'c']
+
+
+def test_all_nodes_down(loop):
+    cluster = connector({'a': None, 'b': None})
+    with pytest.raises(ConnectionError):
+        loop.run_until_complete(cluster.connect())
+    assert all(endpoint.failures == 1 for endpoint in cluster.endpoints)
+
+
+def test_reconnect_callbacks_run_when_replay_fails(loop):
+    cluster = connector({'a': 0.01})
+    reconnected = loop.create_future()
+
+    async def replay(connection):
+        raise ConnectionResetError()
+    cluster.topology.replay = replay
+
+    @cluster.on_reconnect
+    async def on_reconnect(connection):
+        reconnected.set_result(connection)
+
+    async def run():
+        first = await cluster.connect()
+        first._run_task = loop.create_future()
+        first._run_task.set_result(None)
+        await cluster._watch(first)
+        return first
+
+    first = loop.run_until_complete(run())
+    assert reconnected.result() is cluster.connection
+    assert first.closed
+
+
+def test_reconnect_backs_off_while_cluster_down(loop):
+    delays = {'a': None, 'b': None}
+    cluster = connector(
+        delays, failure_backoff=0.1, max_failure_backoff=0.4
+    )
+    called = []
+
+    @cluster.on_reconnect
+    async def failing(connection):
+        called.append('failing')
+        raise ValueError("bug in the callback")
+
+    @cluster.on_reconnect
+    async def restore(connection):
+        called.append('restore')
+
+    async def run():
+        delays['a'] = 0.01
+        first = await cluster.connect()
+        delays['a'] = None
+        first._run_task = loop.create_future()
+        first._run_task.set_result(None)
+        watch = asyncio.ensure_future(cluster._watch(first))
+        await asyncio.sleep(0.5)
+        attempts = len(cluster.created) - 1
+        delays['b'] = 0.01
+        await asyncio.wait_for(watch, 2)
+        return attempts
+
+    attempts = loop.run_until_complete(run())
+    # Rounds 0.1, 0.2 then 0.4s apart, instead of every stagger_delay
+    assert attempts <= 8
+    assert cluster.connection.endpoint.host == 'b'
+    assert called == ['failing', 'restore']
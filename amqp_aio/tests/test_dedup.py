@@ -0,0 +1,78 @@
+from amqp_aio.amqp import basic
+from amqp_aio.dedup import Deduplicator, MemoryIndex, SQLiteIndex
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_index_bounds():
+    clock = Clock()
+    index = MemoryIndex(maxsize=2, ttl=10, clock=clock)
+    index.add('a')
+    index.add('b')
+    assert 'a' in index
+    # 'b' is now the least recently seen
+    index.add('c')
+    assert 'b' not in index
+    assert len(index) == 2
+    clock.now = 5
+    assert 'c' in index
+    clock.now = 12
+    assert 'a' not in index
+    assert 'c' in index
+
+
+def test_sqlite_index_persists_and_trims(tmp_path):
+    path = str(tmp_path / 'handled.db')
+    clock = Clock()
+    index = SQLiteIndex(path, maxsize=10, ttl=100, clock=clock)
+    for number in range(12):
+        clock.now = number
+        index.add(str(number))
+    assert len(index) == 10
+    index.close()
+    clock.now = 50
+    index = SQLiteIndex(path, maxsize=10, ttl=100, clock=clock)
+    assert len(index) == 10
+    assert '0' not in index
+    assert '1' not in index
+    assert '5' in index
+    clock.now = 140
+    assert '6' not in index
+    # Looked up at 50
+    assert '5' in index
+    index.close()
+
+
+def test_duplicates_acked_without_handler(loop, transport, amqp_connection):
+    handled = []
+
+    async def handle(message):
+        handled.append(message.body)
+        await message.ack()
+
+    deduplicator = Deduplicator(handle)
+
+    async def run():
+        channel = await amqp_connection.channel()
+        tag = await channel.consume('tasks', deduplicator)
+        deliveries = [('1', False), ('2', False), ('1', True), (None, True)]
+        for delivery_tag, (key, redelivered) in enumerate(deliveries, 1):
+            await transport.deliver_content(1, basic.Deliver(
+                consumer_tag=tag, delivery_tag=delivery_tag, exchange='',
+                routing_key='tasks', redelivered=redelivered
+            ), basic.BasicProperties(message_id=key),
+                '{}-{}'.format(key, delivery_tag).encode())
+
+    loop.run_until_complete(run())
+    assert handled == [b'1-1', b'2-2', b'None-4']
+    assert deduplicator.duplicates == 1
+    assert [
+        frame.payload.arguments.delivery_tag
+        for frame in transport.sent_methods(basic.Ack)
+    ] == [1, 2, 3, 4]
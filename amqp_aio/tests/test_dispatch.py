@@ -0,0 +1,79 @@
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.dispatch import TopicDispatcher
+
+
+def handler(name, calls=None):
+    async def handle(message):
+        calls.append((name, message.routing_key))
+    handle.__name__ = name
+    return handle
+
+
+@pytest.mark.parametrize('pattern, key, matched', [
+    ('a.b.c', 'a.b.c', True),
+    ('a.b.c', 'a.b', False),
+    ('a.*.c', 'a.b.c', True),
+    ('a.*.c', 'a.c', False),
+    ('a.#', 'a', True),
+    ('a.#', 'a.b.c', True),
+    ('#.c', 'a.b.c', True),
+    ('a.#.c', 'a.c', True),
+    ('a.#.c', 'a.b.b.c', True),
+    ('a.#.c', 'a.b.d', False),
+    ('#.*.#', 'a', True),
+    ('#', '', True),
+    ('*', '', False),
+    ('', '', True),
+])
+def test_topic_patterns(pattern, key, matched):
+    dispatcher = TopicDispatcher()
+    handle = dispatcher.register(pattern, handler('handle'))
+    assert dispatcher.match(key) == ((handle,) if matched else ())
+
+
+def test_handlers_in_registration_order_once():
+    dispatcher = TopicDispatcher()
+    first = dispatcher.register('orders.#', handler('first'))
+    second = dispatcher.register('*.created', handler('second'))
+    dispatcher.register('orders.created', first)
+    assert dispatcher.match('orders.created') == (first, second)
+    assert dispatcher.match('orders.deleted') == (first,)
+    assert dispatcher.patterns == ['orders.#', '*.created', 'orders.created']
+
+
+def test_unregister_clears_cache_and_prunes():
+    dispatcher = TopicDispatcher(cache_size=2)
+    handle = dispatcher.register('a.*.c', handler('handle'))
+    assert dispatcher.match('a.b.c') == (handle,)
+    dispatcher.unregister('a.*.c', handle)
+    assert dispatcher.match('a.b.c') == ()
+    assert not dispatcher._root
+    assert dispatcher.patterns == []
+    with pytest.raises(KeyError):
+        dispatcher.unregister('a.*.c', handle)
+    for key in ('x', 'y', 'z'):
+        dispatcher.match(key)
+    assert list(dispatcher._cache) == ['y', 'z']
+
+
+def test_dispatch_deliveries(loop, transport, amqp_connection):
+    calls = []
+    dispatcher = TopicDispatcher(default=handler('default', calls))
+
+    @dispatcher.route('orders.*')
+    async def on_order(message):
+        calls.append(('orders', message.routing_key))
+
+    async def run():
+        channel = await amqp_connection.channel()
+        tag = await channel.consume('events', dispatcher)
+        for delivery_tag, key in enumerate(('orders.new', 'users.new'), 1):
+            await transport.deliver_content(1, basic.Deliver(
+                consumer_tag=tag, delivery_tag=delivery_tag,
+                exchange='events', routing_key=key
+            ), basic.BasicProperties(), b'body')
+
+    loop.run_until_complete(run())
+    assert calls == [('orders', 'orders.new'), ('default', 'users.new')]
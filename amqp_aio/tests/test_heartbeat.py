@@ -0,0 +1,92 @@
+import asyncio
+import socket
+import ssl
+import time
+
+from amqp_aio.connection import AMQPConnection, TCPConnection
+from amqp_aio.heartbeat import HeartbeatKeeper, HEARTBEAT
+
+
+def open_transport(loop):
+    client, server = socket.socketpair()
+    transport = TCPConnection('localhost')
+
+    async def connect():
+        transport._reader, transport._writer = await asyncio.open_connection(
+            sock=client
+        )
+        transport.is_connected = True
+    loop.run_until_complete(connect())
+    server.settimeout(1)
+    return transport, server
+
+
+def test_heartbeats_sent_while_loop_starved(loop):
+    transport, server = open_transport(loop)
+    keeper = HeartbeatKeeper(transport, heartbeat=0.2)
+
+    async def run():
+        keeper.start()
+        await transport.send(b'frame')
+        server.sendall(b'data')
+        # CPU bound handler blocking the loop for 2 heartbeats
+        time.sleep(0.4)
+
+    loop.run_until_complete(run())
+    keeper.stop()
+    keeper.join()
+    received = server.recv(1024)
+    assert received.startswith(b'frame' + HEARTBEAT)
+    assert keeper.sent >= 1
+    # The server data was seen although the loop never read it
+    assert keeper.peer_alive()
+    loop.run_until_complete(transport.close())
+    server.close()
+
+
+def test_no_thread_write_while_transport_buffers(loop):
+    transport, server = open_transport(loop)
+    transport._writer.transport.pause_reading()
+    transport._writer.transport.get_write_buffer_size = lambda: 10
+    assert not transport.write_threadsafe(HEARTBEAT)
+    loop.run_until_complete(transport.close())
+    server.close()
+
+
+def test_partial_heartbeat_completed_before_next_frame(loop):
+    transport, server = open_transport(loop)
+
+    class ShortWrites:
+        def __init__(self, sock):
+            self.sock = sock
+
+        def send(self, data):
+            return self.sock.send(data[:3])
+
+        def close(self):
+            self.sock.close()
+
+    loop.run_until_complete(transport.send(b'first'))
+    transport._thread_socket = ShortWrites(transport._thread_socket)
+    assert transport.write_threadsafe(HEARTBEAT)
+    # Nothing else goes through the thread until the loop wrote the rest
+    assert not transport.write_threadsafe(HEARTBEAT)
+    loop.run_until_complete(transport.send(b'next'))
+    received = b''
+    while len(received) < len(b'first' + HEARTBEAT + b'next'):
+        received += server.recv(1024)
+    assert received == b'first' + HEARTBEAT + b'next'
+    loop.run_until_complete(transport.close())
+    server.close()
+
+
+def test_tls_heartbeats_sent_from_loop(loop):
+    transport = TCPConnection(
+        'localhost', ssl=ssl.create_default_context()
+    )
+    conn = AMQPConnection(transport, heartbeat=60, heartbeat_thread=True)
+    loop.run_until_complete(conn._handle_open_ok(None))
+    assert conn.heartbeat_keeper is None
+    assert conn.heartbeat_task is not None
+    conn.heartbeat_task.cancel()
+    loop.run_until_complete(asyncio.sleep(0))
@@ -0,0 +1,50 @@
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.message import Message
+
+
+def test_properties_and_body_decoded_lazily():
+    properties = basic.BasicProperties(content_type='application/json')
+    message = Message(None, basic.Deliver(
+        consumer_tag='ctag', delivery_tag=7, exchange='ex', routing_key='rk'
+    ), properties.to_bytes(), b'{"id":1}')
+    assert message._properties is None
+    assert message.headers == {}
+    assert message.properties.content_type == 'application/json'
+    assert message.decode() is message.decode()
+    assert message.decode() == {'id': 1}
+    assert (message.delivery_tag, message.exchange, message.routing_key) == \
+        (7, 'ex', 'rk')
+    assert not hasattr(message, '__dict__')
+
+
+def test_ack_nack_reject_through_channel(loop, amqp_connection, transport):
+    received = []
+
+    async def on_message(message):
+        received.append(message)
+
+    async def run():
+        channel = await amqp_connection.channel()
+        tag = await channel.consume('jobs', on_message)
+        for delivery_tag in (1, 2, 3):
+            await transport.deliver_content(channel.channel_id, basic.Deliver(
+                consumer_tag=tag, delivery_tag=delivery_tag, exchange='',
+                routing_key='jobs'
+            ), basic.BasicProperties(), b'job')
+        first, second, third = received
+        await first.ack()
+        await second.nack(requeue=False)
+        await third.reject()
+        with pytest.raises(RuntimeError):
+            await first.ack()
+
+    loop.run_until_complete(run())
+    ack, = transport.sent_methods(basic.Ack)
+    nack, = transport.sent_methods(basic.Nack)
+    reject, = transport.sent_methods(basic.Reject)
+    assert ack.payload.arguments.delivery_tag == 1
+    assert nack.payload.arguments.delivery_tag == 2
+    assert not nack.payload.arguments.requeue
+    assert reject.payload.arguments.delivery_tag == 3
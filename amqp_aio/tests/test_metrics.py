@@ -0,0 +1,87 @@
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.connection import AMQPConnection
+from amqp_aio.metrics import Metrics, prometheus_text
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+@pytest.fixture
+def measured_connection(transport, metrics):
+    conn = AMQPConnection(transport, heartbeat=60, metrics=metrics)
+    transport.amqp_connection = conn
+    conn._opened_event.set()
+    return conn
+
+
+def samples(metrics, name):
+    return {
+        tuple(sorted(labels.items())): value
+        for sample_name, labels, value in metrics.collect()
+        if sample_name == name
+    }
+
+
+def test_frames_and_confirm_latency(loop, measured_connection, transport,
+                                    metrics):
+    async def run():
+        ch = await measured_connection.channel()
+        confirmed = await ch.publish_many([b'a', b'bc'], confirm=True)
+        assert samples(metrics, 'amqp_outstanding_confirms') == {(): 2}
+        await transport.deliver(basic.Ack.declare(
+            channel=ch.channel_id, delivery_tag=2, multiple=True
+        ))
+        await confirmed
+
+    loop.run_until_complete(run())
+    sent = samples(metrics, 'amqp_frames_sent_total')
+    assert sent[(('frame_type', 'method'), ('method', 'basic.Publish'))] == 2
+    assert sent[(('frame_type', 'body'), ('method', ''))] == 2
+    assert sent[(('frame_type', 'method'), ('method', 'confirm.Select'))] == 1
+    assert samples(metrics, 'amqp_bytes_sent_total')[
+        (('frame_type', 'body'),)
+    ] == 3 + 2 * 8
+    received = samples(metrics, 'amqp_frames_received_total')
+    assert received[(('frame_type', 'method'), ('method', 'basic.Ack'))] == 1
+    assert metrics.confirm_latency.count == 2
+    assert samples(metrics, 'amqp_outstanding_confirms') == {(): 0}
+
+
+def test_deliver_ack_latency(loop, measured_connection, transport, metrics):
+    async def run():
+        ch = await measured_connection.channel()
+        received = []
+
+        async def on_message(message):
+            received.append(message)
+
+        tag = await ch.consume('queue', on_message)
+        for delivery_tag in (1, 2, 3):
+            await transport.deliver_content(ch.channel_id, basic.Deliver(
+                consumer_tag=tag, delivery_tag=delivery_tag, exchange='',
+                routing_key='queue'
+            ), basic.BasicProperties(), b'body')
+        assert samples(metrics, 'amqp_unacked_deliveries') == {(): 3}
+        await ch.ack(2, multiple=True)
+
+    loop.run_until_complete(run())
+    assert metrics.ack_latency.count == 2
+    assert samples(metrics, 'amqp_unacked_deliveries') == {(): 1}
+    text = prometheus_text(metrics)
+    assert '# TYPE amqp_deliver_ack_seconds histogram' in text
+    assert 'amqp_deliver_ack_seconds_bucket{le="+Inf"} 2' in text
+
+
+def test_disabled_by_default(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        await ch.publish(b'body')
+        return ch
+
+    ch = loop.run_until_complete(run())
+    assert amqp_connection.metrics is None
+    assert not ch._delivered_at
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from amqp_aio.amqp import channel
+from amqp_aio.pool import ChannelPool, ConnectionPool
+
+
+def test_channel_pool_reuses_channels(loop, amqp_connection, transport):
+    pool = ChannelPool(amqp_connection, max_size=2)
+
+    async def run():
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+        return first, second
+
+    first, second = loop.run_until_complete(run())
+    assert first is second
+    assert len(transport.sent_methods(channel.Open)) == 1
+
+
+def test_channel_pool_opens_lazily_up_to_limit(loop, amqp_connection,
+                                               transport):
+    pool = ChannelPool(amqp_connection, max_size=2)
+    checked_out = []
+
+    async def use_channel():
+        async with pool.acquire() as ch:
+            checked_out.append(ch)
+            await asyncio.sleep(0.01)
+
+    loop.run_until_complete(asyncio.gather(*[use_channel() for _ in range(5)]))
+    assert len(set(checked_out)) == 2
+    assert pool.size == 2
+    assert pool.in_use == 0
+    assert len(transport.sent_methods(channel.Open)) == 2
+
+
+def test_channel_pool_replaces_closed_channel(loop, amqp_connection,
+                                              transport):
+    pool = ChannelPool(amqp_connection, max_size=1)
+
+    async def run():
+        async with pool.acquire() as first:
+            close = channel.Close.declare(
+                channel=first.channel_id, reply_code=404,
+                reply_text='NOT_FOUND'
+            )
+            await transport.deliver(close)
+        async with pool.acquire() as second:
+            pass
+        return first, second
+
+    first, second = loop.run_until_complete(run())
+    assert first.is_closed
+    assert second.is_open
+    assert first is not second
+    assert len(transport.sent_methods(channel.Open)) == 2
+
+
+class LoadedConnection:
+    def __init__(self, outstanding_bytes, is_open=True):
+        self.conn = self
+        self.outstanding_bytes = outstanding_bytes
+        self.is_open = is_open
+        self.max_channels = 10
+
+
+def connection_pool(*connections):
+    pool = ConnectionPool('localhost', size=len(connections))
+    pool.connections = list(connections)
+    pool.channel_pools = [ChannelPool(c) for c in connections]
+    return pool
+
+
+def test_connection_pool_selects_least_outstanding_bytes():
+    pool = connection_pool(
+        LoadedConnection(500), LoadedConnection(0, is_open=False),
+        LoadedConnection(20), LoadedConnection(100)
+    )
+    assert pool.select() is pool.channel_pools[2]
+
+
+def test_connection_pool_same_key_same_connection():
+    pool = connection_pool(*[LoadedConnection(0) for _ in range(4)])
+    selected = {pool.select(key='order-{}'.format(i)) for i in range(50)}
+    assert len(selected) > 1
+    for i in range(50):
+        key = 'order-{}'.format(i)
+        assert pool.select(key=key) is pool.select(key=key)
+
+
+def test_connection_pool_all_closed():
+    pool = connection_pool(
+        LoadedConnection(0, is_open=False), LoadedConnection(0, is_open=False)
+    )
+    with pytest.raises(ConnectionError):
+        pool.select()
+
+
+def test_connection_pool_connect_timeout(loop):
+    closed = []
+
+    class Hanging:
+        async def close(self):
+            closed.append(self)
+
+    class HangingPool(ConnectionPool):
+        def _create_connection(self):
+            return Hanging()
+
+        async def _open_connection(self, connection):
+            await asyncio.sleep(10)
+
+    pool = HangingPool('localhost', size=2, connect_timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(pool.connect())
+    assert len(closed) == 2
+    assert not pool.connections
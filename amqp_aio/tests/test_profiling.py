@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.connection import AMQPConnection
+from amqp_aio.profiling import Profiler, LoopLagMonitor
+
+
+def test_loop_lag_detects_blocking_callback(loop):
+    monitor = LoopLagMonitor(interval=0.01)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.005)
+        # CPU bound work starving the loop
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+        monitor.stop()
+
+    loop.run_until_complete(run())
+    assert monitor.timing.max >= 0.03
+
+
+def test_connection_breakdown(loop, transport):
+    profiler = Profiler(lag_interval=None)
+    conn = AMQPConnection(transport, profiler=profiler)
+    transport.amqp_connection = conn
+    conn._opened_event.set()
+
+    async def run():
+        ch = await conn.channel()
+        await ch.publish_many([b'a', b'b'])
+
+    loop.run_until_complete(run())
+    breakdown = profiler.breakdown()
+    # Channel.OpenOk routed and handled
+    assert breakdown['route']['count'] == 1
+    assert breakdown['handler']['count'] == 1
+    assert breakdown['encode']['count'] == 1
+    assert breakdown['write']['count'] == 2
+    assert abs(sum(s['share'] for s in breakdown.values()) - 1) < 1e-9
+    assert 'loop_lag' not in breakdown
+
+
+@pytest.mark.parametrize('error', [KeyError, ValueError])
+def test_handler_errors_handled_alike_with_profiler(loop, transport, error):
+    for profiler in (None, Profiler(lag_interval=None)):
+        conn = AMQPConnection(transport, profiler=profiler)
+        transport.amqp_connection = conn
+        conn._opened_event.set()
+        handled = []
+
+        async def run():
+            ch = await conn.channel()
+
+            async def failing(frame):
+                handled.append(frame)
+                raise error('missing')
+            conn.router.register_route(ch.channel_id, basic.Ack, failing)
+            await transport.deliver(basic.Ack.declare(
+                channel=ch.channel_id, delivery_tag=1, multiple=False
+            ))
+
+        loop.run_until_complete(run())
+        assert len(handled) == 1
+        # Later frames are still handled
+        channel = loop.run_until_complete(conn.channel())
+        assert channel.is_open
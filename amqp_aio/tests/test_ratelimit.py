@@ -0,0 +1,65 @@
+import asyncio
+
+from amqp_aio.ratelimit import TokenBucket, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_debt():
+    clock = Clock()
+    bucket = TokenBucket(10)
+    assert [bucket.charge(1, clock) for _ in range(10)] == [0.0] * 10
+    assert bucket.charge(5, clock) == 0.5
+    clock.now = 1.0
+    # The debt is repaid, and the refill is capped by the capacity
+    assert bucket.charge(5, clock) == 0.0
+    assert bucket.tokens == 0
+
+
+def test_bucket_counts_time_before_first_refill():
+    clock = Clock()
+    bucket = TokenBucket(1, capacity=5)
+    assert bucket.charge(5, clock) == 0.0
+    clock.now = 1000.0
+    assert bucket.charge(1, clock) == 0.0
+
+
+def test_bucket_burst_bounded_by_capacity():
+    clock = Clock()
+    bucket = TokenBucket(10)
+    clock.now = 5.0
+    assert bucket.charge(9, clock) == 0.0
+    assert bucket.charge(10, clock) == 0.9
+
+
+def test_limiter_per_exchange():
+    clock = Clock()
+    limiter = RateLimiter()
+    limiter.set(messages_per_second=100)
+    limiter.set(bytes_per_second=1000, exchange='bulk')
+    usage = {'bulk': [10, 3000], 'events': [10, 100]}
+    assert limiter.charge(usage, clock) == 2.0
+    limiter.set(exchange='bulk')
+    assert limiter.charge({'bulk': [80, 3000]}, clock) == 0.0
+
+
+def test_publish_throttled(loop, amqp_connection, transport):
+    async def run():
+        ch = await amqp_connection.channel()
+        amqp_connection.rate_limiter.set(messages_per_second=1000)
+        ch.rate_limiter.set(bytes_per_second=10000, burst=0.5)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        await ch.publish_many([b'x' * 1000] * 6)
+        return loop.time() - started
+
+    elapsed = loop.run_until_complete(run())
+    # 6000 bytes with 5000 bytes of burst at 10000 bytes/s
+    assert elapsed >= 0.09
+    assert len(transport.published) == 6
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.amqp.exceptions import RPCTimeout, Unroutable
+from amqp_aio.rpc import RPCClient, DIRECT_REPLY_TO
+
+
+@pytest.fixture
+def rpc_client(loop, amqp_connection, transport):
+    async def start():
+        client = RPCClient(await amqp_connection.channel(), timeout=1)
+        await client.start()
+        return client
+    return loop.run_until_complete(start())
+
+
+def echo_server(transport, client, delay=0.0):
+    async def on_publish(channel_id, method, properties, body):
+        await asyncio.sleep(delay)
+        if method.routing_key != 'rpc_queue':
+            await transport.deliver_content(channel_id, basic.Return(
+                reply_code=312, reply_text='NO_ROUTE',
+                exchange=method.exchange, routing_key=method.routing_key
+            ), properties, body)
+            return
+        reply = basic.BasicProperties(
+            correlation_id=properties.correlation_id
+        )
+        await transport.deliver_content(channel_id, basic.Deliver(
+            consumer_tag=client.consumer_tag, delivery_tag=1,
+            exchange='', routing_key=properties.reply_to
+        ), reply, body[::-1])
+    transport.on_publish = on_publish
+
+
+def test_consumes_direct_reply_to(transport, rpc_client):
+    consume = transport.sent_methods(basic.Consume)[0].payload.arguments
+    assert consume.queue == DIRECT_REPLY_TO
+    assert consume.no_ack
+
+
+def test_concurrent_calls_multiplexed(loop, transport, rpc_client):
+    echo_server(transport, rpc_client, delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*[
+            rpc_client.call('request-{}'.format(i).encode(), 'rpc_queue')
+            for i in range(20)
+        ])
+
+    replies = loop.run_until_complete(run())
+    assert [r.body for r in replies] == [
+        'request-{}'.format(i).encode()[::-1] for i in range(20)
+    ]
+    assert rpc_client.pending == 0
+
+
+def test_call_times_out_and_is_evicted(loop, rpc_client):
+    with pytest.raises(RPCTimeout):
+        loop.run_until_complete(
+            rpc_client.call(b'request', 'rpc_queue', timeout=0.01)
+        )
+    assert rpc_client.pending == 0
+
+
+def test_unroutable_call(loop, transport, rpc_client):
+    echo_server(transport, rpc_client)
+    with pytest.raises(Unroutable):
+        loop.run_until_complete(rpc_client.call(b'request', 'missing'))
+
+
+def test_shared_properties_not_modified(loop, transport, rpc_client):
+    echo_server(transport, rpc_client, delay=0.01)
+    properties = basic.BasicProperties(content_type='text/plain')
+
+    async def run():
+        return await asyncio.gather(*[
+            rpc_client.call(
+                'request-{}'.format(i).encode(), 'rpc_queue',
+                properties=properties
+            ) for i in range(5)
+        ])
+
+    replies = loop.run_until_complete(run())
+    assert [r.body for r in replies] == [
+        'request-{}'.format(i).encode()[::-1] for i in range(5)
+    ]
+    assert properties.correlation_id is None
+    assert properties.reply_to is None
+    assert {p.content_type for _, p, _ in transport.published} == {
+        'text/plain'
+    }
@@ -0,0 +1,122 @@
+import asyncio
+
+from amqp_aio.amqp import basic
+from amqp_aio.connection import TCPConnection
+from amqp_aio.scheduler import OutboundScheduler
+
+
+class RecordingTransport:
+    def __init__(self):
+        self.writes = []
+        self.outstanding_bytes = 0
+        self.on_write = None
+
+    async def send(self, data):
+        self.writes.append(bytes(data))
+        if self.on_write is not None:
+            self.on_write()
+
+
+def test_urgent_frames_wait_for_message_in_progress(loop):
+    transport = RecordingTransport()
+    scheduler = OutboundScheduler(transport, quantum=4, write_limit=4)
+
+    def block():
+        transport.outstanding_bytes = 100
+        transport.on_write = None
+    transport.on_write = block
+
+    async def run():
+        bulk = asyncio.ensure_future(scheduler.send_content(
+            b'AAAABBBBCCCC', 1, message_cuts=[12], frame_cuts=[4, 8]
+        ))
+        await asyncio.sleep(0)
+        sends = [
+            asyncio.ensure_future(scheduler.send(b'u', 1, urgent=True)),
+            asyncio.ensure_future(scheduler.send_content(b'zz', 2)),
+        ]
+        await asyncio.sleep(0)
+        transport.outstanding_bytes = 0
+        await asyncio.gather(bulk, *sends)
+
+    loop.run_until_complete(run())
+    # zz is interleaved with the message in progress on channel 1, and u
+    # waits for its end
+    assert transport.writes == [b'AAAA', b'BBBB', b'zzCCCCu']
+    assert scheduler.pending == 0
+
+
+def test_ack_overtakes_queued_content(loop, amqp_connection, transport):
+    amqp_connection.max_frame_length = 4096
+    amqp_connection.scheduler.quantum = 8192
+
+    async def run():
+        bulk = await amqp_connection.channel()
+        small = await amqp_connection.channel()
+        sent = len(transport.sent)
+        transport.outstanding_bytes = amqp_connection.scheduler.write_limit
+        sends = [asyncio.ensure_future(
+            bulk.publish(b'x' * 100000, routing_key='bulk')
+        )]
+        await asyncio.sleep(0)
+        sends.append(asyncio.ensure_future(small.publish(b'small')))
+        sends.append(asyncio.ensure_future(bulk.ack(7)))
+        await asyncio.sleep(0)
+        transport.outstanding_bytes = 0
+        await asyncio.gather(*sends)
+        return bulk, small, transport.sent[sent:]
+
+    bulk, small, frames = loop.run_until_complete(run())
+    assert isinstance(frames[0].payload.arguments, basic.Ack)
+    bulk_frames = [f for f in frames[1:] if f.channel == bulk.channel_id]
+    small_frames = [f for f in frames if f.channel == small.channel_id]
+    # The small message went out while the bulk one was in progress
+    assert frames.index(small_frames[-1]) < frames.index(bulk_frames[-1])
+    assert [f.frame_type for f in bulk_frames] == [1, 2] + [3] * 25
+    assert sorted(m.routing_key for m, _, _ in transport.published) == [
+        '', 'bulk'
+    ]
+
+
+def test_small_write_limit_waits_without_spinning(loop):
+    # A peer that never reads, so the transport buffer fills up
+    peers = []
+
+    async def on_client(reader, writer):
+        peers.append(writer)
+
+    async def run():
+        server = await asyncio.start_server(on_client, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        transport = TCPConnection('127.0.0.1', port)
+        transport._reader, transport._writer = \
+            await asyncio.open_connection('127.0.0.1', port)
+        scheduler = OutboundScheduler(
+            transport, quantum=4096, write_limit=16384
+        )
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        ticker = asyncio.ensure_future(tick())
+        size = 64 * 1024 * 1024
+        bulk = asyncio.ensure_future(scheduler.send_content(
+            bytes(size), 1, message_cuts=list(range(4096, size + 1, 4096))
+        ))
+        await asyncio.sleep(0.3)
+        assert not bulk.done()
+        assert transport.outstanding_bytes >= 16384
+        assert ticks >= 10
+        for task in (ticker, bulk, scheduler._task):
+            task.cancel()
+        await asyncio.wait([ticker, bulk, scheduler._task])
+        await transport.close()
+        for writer in peers:
+            writer.close()
+        server.close()
+        await server.wait_closed()
+
+    loop.run_until_complete(run())
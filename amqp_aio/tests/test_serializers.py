@@ -0,0 +1,135 @@
+import lzma
+import zlib
+
+import pytest
+
+from amqp_aio.amqp.basic import BasicProperties
+from amqp_aio.amqp.exceptions import DecodedBodyTooLarge, \
+    UnknownContentType, UnknownContentEncoding
+from amqp_aio.encoders import Compression, ZlibEncoder, GzipEncoder, \
+    LZMAEncoder, BZ2Encoder, encoders
+from amqp_aio.serializers import ContentCodec, FunctionSerializer, \
+    MarshalSerializer, PickleSerializer, SerializerRegistry, serializers
+
+
+@pytest.mark.parametrize('content_type, obj', [
+    (None, b'raw'),
+    ('text/plain', 'texte'),
+    ('application/json; charset=utf-8', {'id': 1, 'tags': ['a']}),
+])
+def test_round_trip(content_type, obj):
+    codec = ContentCodec()
+    properties = BasicProperties(content_type=content_type)
+    buffer = bytearray(b'prefix')
+    assert codec.encode(obj, properties, buffer) == (buffer, properties)
+    assert buffer.startswith(b'prefix')
+    decoded = codec.decode(memoryview(buffer)[6:], properties)
+    assert (bytes(decoded) if content_type is None else decoded) == obj
+
+
+@pytest.mark.parametrize('serializer, obj', [
+    (PickleSerializer(), {'set': {1, 2}}),
+    (MarshalSerializer(), (1, 2.5, 'x')),
+])
+def test_unsafe_serializers_opt_in(serializer, obj):
+    properties = BasicProperties(content_type=serializer.content_type)
+    with pytest.raises(UnknownContentType):
+        ContentCodec().decode(b'', properties)
+    registry = SerializerRegistry()
+    registry.register(serializer)
+    codec = ContentCodec(serializers=registry)
+    body, properties = codec.encode(obj, properties)
+    assert codec.decode(body, properties) == obj
+
+
+def test_content_encoding_and_third_party_codec():
+    registry = SerializerRegistry()
+    registry.register(FunctionSerializer(
+        'application/x-csv', lambda row: ','.join(row).encode(),
+        lambda data: str(data, 'ascii').split(',')
+    ))
+    codec = ContentCodec(serializers=registry)
+    properties = BasicProperties(
+        content_type='application/x-csv', content_encoding='base64'
+    )
+    body, encoded = codec.encode(['a', 'b'], properties)
+    assert (body, encoded) == (b'YSxi', properties)
+    assert codec.decode(bytes(body), properties) == ['a', 'b']
+    # Resolved once for consecutive messages of the same kind
+    assert codec.resolve('application/x-csv', 'base64') is \
+        codec.resolve('application/x-csv', 'base64')
+
+
+def test_unknown_content():
+    codec = ContentCodec()
+    with pytest.raises(UnknownContentType):
+        codec.decode(b'', BasicProperties(content_type='x/unknown'))
+    with pytest.raises(UnknownContentEncoding):
+        codec.decode(b'', BasicProperties(content_encoding='rot13'))
+    assert 'JSON' in serializers
+
+
+def test_compression_above_thresholds(loop):
+    orders = b'{"order_id":,"status":"shipped","customer":'
+    compression = Compression(
+        ZlibEncoder(zdict=orders), threshold=40, offload_threshold=2000
+    )
+    codec = ContentCodec(encoders=encoders, compression=compression)
+    # The encoder is registered in a registry of the codec only
+    assert compression.encoder.content_encoding in codec.encoders
+    assert compression.encoder.content_encoding not in encoders
+    row = {'order_id': 1, 'status': 'shipped', 'customer': 'c'}
+
+    properties = BasicProperties(content_type='application/json')
+    assert codec.encode({'id': 1}, properties) == (b'{"id":1}', properties)
+
+    body, compressed = codec.encode(row, properties)
+    assert compressed.content_encoding.startswith('x-deflate-')
+    assert len(body) < len(b'{"order_id":1,"status":"shipped","customer":"c"}')
+    assert codec.decode(body, compressed) == row
+    # The properties can be reused, small bodies are still sent as they are
+    assert properties.content_encoding is None
+    assert codec.encode({'id': 2}, properties) == (b'{"id":2}', properties)
+
+    async def offloaded():
+        rows = [row] * 200
+        properties = BasicProperties(content_type='application/json')
+        body, properties = await codec.encode_async(rows, properties)
+        return properties, body, await codec.decode_async(body, properties)
+
+    properties, body, decoded = loop.run_until_complete(offloaded())
+    assert decoded == [row] * 200
+    assert len(body) < 2000
+
+
+@pytest.mark.parametrize('encoder', [GzipEncoder(), LZMAEncoder(),
+                                     BZ2Encoder()])
+def test_compression_encoders(encoder):
+    codec = ContentCodec()
+    properties = BasicProperties(content_encoding=encoder.content_encoding)
+    body, _ = codec.encode(b'abc' * 1000, properties)
+    assert len(body) < 3000
+    assert bytes(codec.decode(body, properties)) == b'abc' * 1000
+    with pytest.raises(DecodedBodyTooLarge):
+        ContentCodec(max_size=2999).decode(body, properties)
+    assert bytes(
+        ContentCodec(max_size=3000).decode(body, properties)
+    ) == b'abc' * 1000
+    # Truncated
+    with pytest.raises((zlib.error, lzma.LZMAError, ValueError)):
+        codec.decode(body[:-4], properties)
+
+
+def test_decompression_bomb(loop):
+    encoder = ZlibEncoder()
+    bomb = bytearray()
+    encoder.encode(bytes(1 << 24), bomb)
+    codec = ContentCodec(
+        compression=Compression(encoder, offload_threshold=1024),
+        max_size=1 << 20
+    )
+    properties = BasicProperties(content_encoding='deflate')
+    with pytest.raises(DecodedBodyTooLarge):
+        codec.decode(bomb, properties)
+    with pytest.raises(DecodedBodyTooLarge):
+        loop.run_until_complete(codec.decode_async(bomb, properties))
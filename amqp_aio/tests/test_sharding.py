@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import itertools
+import multiprocessing
+
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.amqp.exceptions import AMQPException, MessageNacked
+from amqp_aio.connection import AMQPConnection
+from amqp_aio.sharding import ShardedPublisher, _PipeWriter
+from amqp_aio.tests.conftest import FakeTransport
+
+
+async def fake_connection(confirm=True):
+    transport = FakeTransport()
+    connection = AMQPConnection(transport)
+    transport.amqp_connection = connection
+    connection.max_channels = 2047
+    connection._opened_event.set()
+    tags = itertools.count(1)
+
+    async def on_publish(channel_id, method, properties, body):
+        reply = basic.Nack if body == b'bad' else basic.Ack
+        await transport.deliver(reply.declare(
+            channel=channel_id, delivery_tag=next(tags), multiple=False
+        ))
+    if confirm:
+        transport.on_publish = on_publish
+    return connection
+
+
+def test_confirms_collected_from_shards(loop):
+    async def run():
+        publisher = ShardedPublisher(shards=2, connect=fake_connection)
+        await publisher.start()
+        confirmed = [
+            await publisher.publish(b'body', routing_key='key-{}'.format(i))
+            for i in range(50)
+        ]
+        await asyncio.gather(*confirmed)
+        await asyncio.sleep(0)
+        nacked = await publisher.publish(b'bad', routing_key='key-1')
+        with pytest.raises(MessageNacked):
+            await nacked
+        await publisher.close()
+        return publisher
+
+    publisher = loop.run_until_complete(run())
+    assert not publisher.processes
+    assert not publisher._batches
+
+
+def test_batches_bounded(loop):
+    async def run():
+        publisher = ShardedPublisher(
+            shards=1, connect=fake_connection, max_batch=2
+        )
+        await publisher.start()
+        confirmed = [
+            await publisher.publish(b'body', routing_key='key')
+            for _ in range(5)
+        ]
+        await asyncio.gather(*confirmed)
+        await publisher.close()
+        return publisher
+
+    publisher = loop.run_until_complete(run())
+    # 3 batches of up to 2 messages
+    assert next(publisher._batch_ids) == 4
+
+
+def test_exited_shard_fails_its_messages(loop):
+    async def run():
+        publisher = ShardedPublisher(
+            shards=1, connect=functools.partial(fake_connection, False)
+        )
+        await publisher.start()
+        in_flight = await publisher.publish(b'body', routing_key='key')
+        await asyncio.sleep(0.05)
+        publisher.processes[0].terminate()
+        with pytest.raises(AMQPException):
+            await asyncio.wait_for(in_flight, 5)
+        with pytest.raises(AMQPException):
+            await publisher.publish(b'body', routing_key='key')
+        await asyncio.wait_for(publisher.close(), 5)
+        return publisher
+
+    publisher = loop.run_until_complete(run())
+    assert not publisher._batches
+
+
+def test_pipe_writer_reports_errors(loop):
+    pipe, other_end = multiprocessing.Pipe()
+    other_end.close()
+    errors = []
+    writer = _PipeWriter(pipe, errors.append)
+    writer.send(b'first')
+    writer.send(b'second')
+    loop.run_until_complete(writer.flush())
+    pipe.close()
+    assert len(errors) == 1
+    assert isinstance(errors[0], OSError)
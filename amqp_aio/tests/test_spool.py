@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from amqp_aio.amqp import basic
+from amqp_aio.spool import BodySpooler, FramedBody
+
+
+def test_large_bodies_spooled_to_mapped_file(loop, transport,
+                                             amqp_connection):
+    received = []
+
+    async def on_message(message):
+        received.append(message.body)
+
+    async def run():
+        channel = await amqp_connection.channel()
+        channel.body_allocator = BodySpooler(threshold=1000)
+        consumer_tag = await channel.consume('archive', on_message)
+        for tag, body in enumerate((os.urandom(300000), b'small'), 1):
+            await transport.deliver_content(channel.channel_id, basic.Deliver(
+                consumer_tag=consumer_tag, delivery_tag=tag, exchange='',
+                routing_key='archive'
+            ), basic.BasicProperties(), body)
+            assert bytes(received[-1]) == body
+
+    amqp_connection.max_frame_length = 4096
+    loop.run_until_complete(run())
+    assert isinstance(received[0], memoryview)
+    assert isinstance(received[1], bytes)
+
+
+def test_framed_body_slices_match_encoded_frames():
+    body = bytes(range(256)) * 40
+    framed = FramedBody(b'prefix', body, 3, 1000)
+    encoded = framed[:]
+    assert len(encoded) == len(framed) == 6 + len(body) + 11 * 8
+    for start, stop in ((0, 3), (4, 1500), (1014, 1015), (5000, 20000)):
+        assert framed[start:stop] == encoded[start:stop]
+
+
+def test_publish_file_sliced_from_mapping(loop, transport, amqp_connection):
+    content = os.urandom(600000)
+
+    async def run():
+        channel = await amqp_connection.channel()
+        with tempfile.TemporaryFile() as file:
+            file.write(content)
+            await channel.publish_file(
+                file, routing_key='archive',
+                properties=basic.BasicProperties(content_type='x/raw')
+            )
+        await channel.publish('after', routing_key='archive')
+
+    loop.run_until_complete(run())
+    (method, properties, body), after = transport.published
+    assert method.routing_key == 'archive'
+    assert properties.content_type == 'x/raw'
+    assert body == content
+    assert after[2] == b'after'
+    # Written in slices bounded by the scheduler write limit
+    assert transport.writes > 3
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from amqp_aio.amqp import basic
+from amqp_aio.amqp.amqp_types import LongLongUint, LongString, Timestamp
+from amqp_aio.streams import FileOffsetStore, StreamConsumer, \
+    offset_argument
+
+
+def test_offset_argument():
+    assert isinstance(offset_argument('first'), LongString)
+    assert isinstance(offset_argument(42), LongLongUint)
+    assert isinstance(offset_argument(datetime(2021, 1, 1)), Timestamp)
+    with pytest.raises(ValueError):
+        offset_argument(-1)
+    with pytest.raises(TypeError):
+        offset_argument(1.5)
+
+
+def test_offset_store(tmp_path):
+    store = FileOffsetStore(str(tmp_path))
+    assert store.load('projector') is None
+    store.save('projector', 10)
+    store.save('projector', 12)
+    assert FileOffsetStore(str(tmp_path)).load('projector') == 12
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['projector.offset']
+
+
+def consume_offset(transport):
+    method = transport.sent_methods(basic.Consume)[-1].payload.arguments
+    return method.arguments['x-stream-offset']
+
+
+def test_checkpoints_and_resumes(loop, tmp_path, transport, amqp_connection):
+    store = FileOffsetStore(str(tmp_path))
+    handled = []
+
+    async def handle(message):
+        handled.append(message.body)
+
+    async def run(offsets):
+        channel = await amqp_connection.channel()
+        consumer = StreamConsumer(
+            channel, 'events', handle, store=store, offset='first',
+            prefetch=4, checkpoint_every=3
+        )
+        tag = await consumer.start()
+        for delivery_tag, offset in enumerate(offsets, 1):
+            properties = basic.BasicProperties(
+                headers={'x-stream-offset': LongLongUint(offset)}
+            )
+            await transport.deliver_content(channel.channel_id, basic.Deliver(
+                consumer_tag=tag, delivery_tag=delivery_tag,
+                exchange='', routing_key='events'
+            ), properties, str(offset).encode())
+        return consumer
+
+    consumer = loop.run_until_complete(run([0, 1, 2, 3]))
+    assert consume_offset(transport) == 'first'
+    assert handled == [b'0', b'1', b'2', b'3']
+    assert (consumer.offset, consumer.checkpointed) == (3, 2)
+    assert store.load('events') == 2
+    acks = transport.sent_methods(basic.Ack)
+    assert [
+        (frame.payload.arguments.delivery_tag,
+         frame.payload.arguments.multiple) for frame in acks
+    ] == [(2, True), (4, True)]
+    loop.run_until_complete(consumer.stop())
+    assert store.load('events') == 3
+
+    # A restart resumes after the checkpoint
+    loop.run_until_complete(run([4]))
+    assert consume_offset(transport) == 4
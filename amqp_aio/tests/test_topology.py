@@ -0,0 +1,101 @@
+from amqp_aio.amqp import exchange, queue
+from amqp_aio.connection import AMQPConnection
+from amqp_aio.tests.conftest import FakeTransport
+
+
+def declare_topology(loop, amqp_connection):
+    async def run():
+        channel = await amqp_connection.channel()
+        await channel.exchange_declare('events', type='topic', durable=True)
+        await channel.queue_declare('audit', durable=True)
+        await channel.queue_bind('audit', 'events', routing_key='#')
+        return channel
+    return loop.run_until_complete(run())
+
+
+def test_identical_declarations_are_not_resent(loop, amqp_connection,
+                                               transport):
+    channel = declare_topology(loop, amqp_connection)
+
+    async def redeclare():
+        await channel.exchange_declare('events', type='topic', durable=True)
+        reply = await channel.queue_declare('audit', durable=True)
+        await channel.queue_bind('audit', 'events', routing_key='#')
+        return reply
+
+    reply = loop.run_until_complete(redeclare())
+    assert reply.queue == 'audit'
+    assert len(transport.sent_methods(exchange.Declare)) == 1
+    assert len(transport.sent_methods(queue.Declare)) == 1
+    assert len(transport.sent_methods(queue.Bind)) == 1
+
+
+def test_changed_declaration_is_sent(loop, amqp_connection, transport):
+    channel = declare_topology(loop, amqp_connection)
+    loop.run_until_complete(channel.queue_declare('audit', durable=False))
+    assert len(transport.sent_methods(queue.Declare)) == 2
+    assert len(amqp_connection.topology) == 3
+
+
+def test_delete_forgets_declarations(loop, amqp_connection):
+    channel = declare_topology(loop, amqp_connection)
+    loop.run_until_complete(channel.queue_delete('audit'))
+    assert [type(m) for m in amqp_connection.topology.declarations] == [
+        exchange.Declare
+    ]
+
+
+def test_replay_pipelines_declarations(loop, amqp_connection):
+    declare_topology(loop, amqp_connection)
+
+    new_transport = FakeTransport()
+    new_connection = AMQPConnection(
+        new_transport, topology=amqp_connection.topology
+    )
+    new_transport.amqp_connection = new_connection
+    new_connection._opened_event.set()
+    loop.run_until_complete(new_connection.topology.replay(new_connection))
+
+    sent = [
+        frame.payload.arguments for frame in new_transport.sent
+        if isinstance(frame.payload.arguments,
+                      (exchange.Declare, queue.Declare, queue.Bind))
+    ]
+    assert [type(m) for m in sent] == [
+        exchange.Declare, queue.Declare, queue.Bind
+    ]
+    # Channel.Open, the declarations burst and Channel.Close
+    assert new_transport.writes == 3
+
+
+def test_exclusive_queues_not_recorded(loop, amqp_connection, transport):
+    async def run():
+        channel = await amqp_connection.channel()
+        for _ in range(2):
+            await channel.queue_declare('replies', exclusive=True)
+            await channel.queue_bind('replies', 'events', routing_key='#')
+
+    loop.run_until_complete(run())
+    assert len(transport.sent_methods(queue.Declare)) == 2
+    assert len(transport.sent_methods(queue.Bind)) == 2
+    assert len(amqp_connection.topology) == 0
+
+
+def test_auto_delete_declarations_always_sent(loop, amqp_connection,
+                                              transport):
+    async def run():
+        channel = await amqp_connection.channel()
+        await channel.exchange_declare('events', type='topic')
+        # The server deleting the queue in between, once its last consumer
+        # is cancelled
+        for _ in range(2):
+            await channel.exchange_declare('events', type='topic')
+            await channel.queue_declare('live', auto_delete=True)
+            await channel.queue_bind('live', 'events', routing_key='#')
+
+    loop.run_until_complete(run())
+    assert len(transport.sent_methods(queue.Declare)) == 2
+    assert len(transport.sent_methods(queue.Bind)) == 2
+    assert len(transport.sent_methods(exchange.Declare)) == 1
+    # Still replayed
+    assert len(amqp_connection.topology) == 3
@@ -0,0 +1,162 @@
+import asyncio
+import collections
+import itertools
+import os
+import threading
+
+from amqp_aio.amqp import basic
+from amqp_aio import wal
+from amqp_aio.wal import PublishBuffer, _read_records
+
+
+def auto_confirm(transport, rejected=(), channels=None):
+    tags = collections.defaultdict(lambda: itertools.count(1))
+
+    async def on_publish(channel_id, method, properties, body):
+        delivery_tag = next(tags[channel_id])
+        if channels is not None and channel_id not in channels:
+            return
+        reply = basic.Nack if body in rejected else basic.Ack
+        await transport.deliver(reply.declare(
+            channel=channel_id, delivery_tag=delivery_tag, multiple=False
+        ))
+    transport.on_publish = on_publish
+
+
+def buffered(directory, *bodies):
+    async def write():
+        buffer = PublishBuffer(directory)
+        for body in bodies:
+            await buffer.publish(body, routing_key='orders')
+        await buffer.close()
+    return write()
+
+
+def test_buffered_while_detached_then_drained(loop, tmp_path, transport,
+                                              amqp_connection):
+    directory = str(tmp_path / 'buffer')
+    auto_confirm(transport)
+
+    async def run():
+        buffer = PublishBuffer(directory, segment_size=100, sync_batch=2)
+        synced = [
+            await buffer.publish(
+                str(number).encode() * 20, routing_key='orders',
+                properties=basic.BasicProperties(message_id=str(number))
+            )
+            for number in range(5)
+        ]
+        await asyncio.gather(*synced)
+        await buffer.close()
+        assert len(os.listdir(directory)) == 2
+        # Recovered by a new process
+        buffer = PublishBuffer(directory)
+        await buffer.attach(amqp_connection)
+        await buffer.wait_drained()
+        assert not buffer.buffering
+        confirmed = await buffer.publish(b'direct', routing_key='orders')
+        await confirmed
+        await buffer.close()
+
+    loop.run_until_complete(run())
+    assert os.listdir(directory) == []
+    assert [
+        (method.routing_key, properties.message_id, body)
+        for method, properties, body in transport.published
+    ] == [
+        ('orders', str(number), str(number).encode() * 20)
+        for number in range(5)
+    ] + [('orders', None, b'direct')]
+
+
+def test_lost_confirms_buffered(loop, tmp_path, transport, amqp_connection):
+    directory = str(tmp_path / 'buffer')
+
+    async def run():
+        buffer = PublishBuffer(directory)
+        await buffer.attach(amqp_connection)
+        await buffer.wait_drained()
+        confirmed = await buffer.publish(b'lost')
+        buffer.channel._set_closed()
+        await confirmed
+        assert buffer.channel is None
+        assert buffer.buffering
+        await buffer.close()
+
+    loop.run_until_complete(run())
+    segments = os.listdir(directory)
+    assert len(segments) == 1
+    with open(os.path.join(directory, segments[0]), 'rb') as file:
+        data = file.read()
+    messages = list(_read_records(data + b'torn'))
+    assert [message['body'] for message in messages] == [b'lost']
+
+
+def test_synced_out_of_the_loop(loop, tmp_path, monkeypatch):
+    threads = []
+
+    def fsync(fileno):
+        threads.append(threading.current_thread())
+    monkeypatch.setattr(wal.os, 'fsync', fsync)
+
+    async def run():
+        buffer = PublishBuffer(str(tmp_path), sync_batch=2)
+        first = await buffer.publish(b'1')
+        second = await buffer.publish(b'2')
+        assert not first.done()
+        await asyncio.gather(first, second)
+        await buffer.close()
+
+    loop.run_until_complete(run())
+    # The directory of the new segment, the records, then the rolled over
+    # segment
+    assert len(threads) == 3
+    assert threading.current_thread() not in threads
+
+
+def test_rejected_messages_dropped(loop, tmp_path, transport,
+                                   amqp_connection):
+    directory = str(tmp_path)
+    auto_confirm(transport, rejected={b'bad'})
+
+    async def run():
+        await buffered(directory, b'a', b'bad', b'c')
+        buffer = PublishBuffer(directory)
+        await buffer.attach(amqp_connection)
+        await buffer.wait_drained()
+        assert buffer.channel is not None
+        assert not buffer.buffering
+        return buffer
+
+    buffer = loop.run_until_complete(run())
+    assert buffer.dropped == 1
+    assert os.listdir(directory) == []
+    # The rejected batch is published again one message at a time
+    assert [body for _, _, body in transport.published] == [
+        b'a', b'bad', b'c', b'a', b'bad', b'c'
+    ]
+
+
+def test_attach_replaces_draining_channel(loop, tmp_path, transport,
+                                          amqp_connection):
+    directory = str(tmp_path)
+
+    async def run():
+        await buffered(directory, b'a', b'b')
+        buffer = PublishBuffer(directory)
+        # The first channel never gets its confirms
+        auto_confirm(transport, channels={2})
+        await buffer.attach(amqp_connection)
+        first = buffer.channel
+        await asyncio.sleep(0)
+        await buffer.attach(amqp_connection)
+        assert first.is_closed
+        assert buffer.channel.channel_id == 2
+        await buffer.wait_drained()
+        await buffer.close()
+
+    loop.run_until_complete(run())
+    assert os.listdir(directory) == []
+    assert [
+        frame.channel for frame in transport.sent_methods(basic.Publish)
+    ] == [1, 1, 2, 2]
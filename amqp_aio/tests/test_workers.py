@@ -0,0 +1,214 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from multiprocessing import resource_tracker
+
+from amqp_aio.amqp import basic
+from amqp_aio.shm import SlabPool, call_with_slab
+from amqp_aio.spool import BodySpooler
+from amqp_aio.workers import ProcessPoolConsumer
+
+
+def reverse(body, routing_key):
+    return body[::-1]
+
+
+async def deliver(transport, consumer, tag, body):
+    await transport.deliver_content(1, basic.Deliver(
+        consumer_tag=consumer.consumer_tag, delivery_tag=tag,
+        exchange='', routing_key='tasks'
+    ), basic.BasicProperties(), body)
+
+
+def settled(transport):
+    return [
+        (type(frame.payload.arguments).__name__,
+         frame.payload.arguments.delivery_tag,
+         frame.payload.arguments.multiple)
+        for frame in transport.sent_methods((basic.Ack, basic.Nack))
+    ]
+
+
+def test_results_acked_in_delivery_order(loop, transport, amqp_connection):
+    gates = {tag: threading.Event() for tag in (1, 2, 3, 4)}
+
+    def handle(body, routing_key):
+        gates[int(body)].wait(5)
+        if body == b'3':
+            raise ValueError(body)
+        return body
+
+    results = []
+
+    async def on_result(message, result):
+        results.append(result)
+
+    async def run():
+        executor = ThreadPoolExecutor(4)
+        consumer = ProcessPoolConsumer(
+            await amqp_connection.channel(), handle, prefetch=4,
+            executor=executor, on_result=on_result
+        )
+        await consumer.start('tasks')
+        for tag in (1, 2, 3, 4):
+            await deliver(transport, consumer, tag, str(tag).encode())
+        # Later deliveries completing first wait for the older ones
+        gates[2].set()
+        await asyncio.sleep(0.05)
+        assert settled(transport) == []
+        gates[1].set()
+        await asyncio.sleep(0.05)
+        assert settled(transport) == [('Ack', 2, True)]
+        gates[4].set()
+        gates[3].set()
+        await consumer.stop()
+        executor.shutdown()
+
+    loop.run_until_complete(run())
+    assert transport.sent_methods(basic.Qos)[0].payload.arguments \
+        .prefetch_count == 4
+    assert settled(transport) == [
+        ('Ack', 2, True), ('Nack', 3, False), ('Ack', 4, True)
+    ]
+    assert results == [b'1', b'2', b'4']
+
+
+def test_bodies_processed_by_worker_processes(loop, transport,
+                                              amqp_connection):
+    results = []
+
+    async def on_result(message, result):
+        results.append(result)
+
+    async def run():
+        consumer = ProcessPoolConsumer(
+            await amqp_connection.channel(), reverse,
+            executor=ProcessPoolExecutor(2), on_result=on_result
+        )
+        await consumer.start('tasks')
+        for tag in range(1, 6):
+            await deliver(transport, consumer, tag, b'body-%d' % tag)
+        await consumer.stop()
+        consumer.executor.shutdown()
+
+    loop.run_until_complete(run())
+    assert results == [(b'body-%d' % tag)[::-1] for tag in range(1, 6)]
+    assert settled(transport)[-1] == ('Ack', 5, True)
+
+
+def checksum(body, routing_key):
+    return type(body).__name__, sum(body[::4096])
+
+
+def test_large_bodies_handed_over_in_shared_memory(loop, transport,
+                                                   amqp_connection):
+    pool = SlabPool(slot_size=65536, slots_per_segment=2)
+    bodies = [bytes([tag]) * 100000 for tag in range(1, 4)]
+    results = []
+
+    async def on_result(message, result):
+        results.append(result)
+
+    async def run():
+        consumer = ProcessPoolConsumer(
+            await amqp_connection.channel(), checksum,
+            executor=ProcessPoolExecutor(2), on_result=on_result,
+            slab_pool=pool, slab_threshold=1000
+        )
+        await consumer.start('tasks')
+        for tag, body in enumerate(bodies, 1):
+            await deliver(transport, consumer, tag, body)
+        await deliver(transport, consumer, 4, b'small')
+        await consumer.stop()
+        consumer.executor.shutdown()
+
+    loop.run_until_complete(run())
+    assert results == [
+        ('memoryview', sum(body[::4096])) for body in bodies
+    ] + [('bytes', sum(b'small'[::4096]))]
+    # Settled slabs are recycled
+    slab = pool.allocate(100000)
+    assert pool.allocate(100000).name != slab.name
+    assert len(pool._segments) == 3
+    pool.free(slab)
+    pool.close()
+
+
+def test_slabs_only_for_own_deliveries(loop, amqp_connection):
+    pool = SlabPool(slot_size=65536, slots_per_segment=2)
+
+    async def run():
+        consumer = ProcessPoolConsumer(
+            await amqp_connection.channel(), checksum,
+            executor=ThreadPoolExecutor(1), slab_pool=pool, slab_threshold=10
+        )
+        await consumer.start('tasks')
+        other = basic.Deliver(
+            consumer_tag='other', delivery_tag=1, exchange='',
+            routing_key='tasks'
+        )
+        own = other.copy(consumer_tag=consumer.consumer_tag)
+        return consumer._allocate_body(other, 100), \
+            consumer._allocate_body(own, 100)
+
+    other, own = loop.run_until_complete(run())
+    assert other is None
+    assert own is not None
+    pool.close()
+
+
+def test_spooled_bodies_handed_over_as_bytes(loop, transport,
+                                             amqp_connection):
+    pool = SlabPool(slot_size=65536, slots_per_segment=2)
+    spooler = BodySpooler(threshold=1000)
+    results = []
+
+    async def on_result(message, result):
+        results.append(result)
+
+    async def run():
+        channel = await amqp_connection.channel()
+        channel.body_allocator = spooler
+        consumer = ProcessPoolConsumer(
+            channel, checksum, executor=ProcessPoolExecutor(1),
+            on_result=on_result, slab_pool=pool, slab_threshold=100000
+        )
+        await consumer.start('tasks')
+        other = basic.Deliver(
+            consumer_tag='other', delivery_tag=1, exchange='',
+            routing_key='tasks'
+        )
+        # Bodies the consumer doesn't take are still spooled
+        assert isinstance(consumer._allocate_body(other, 5000), memoryview)
+        await deliver(transport, consumer, 1, b'x' * 5000)
+        await consumer.stop()
+        consumer.executor.shutdown()
+        assert channel.body_allocator is spooler
+
+    loop.run_until_complete(run())
+    assert results == [('bytes', sum((b'x' * 5000)[::4096]))]
+    assert settled(transport) == [('Ack', 1, True)]
+    pool.close()
+
+
+def test_worker_attach_untracked_and_close_in_use(monkeypatch):
+    pool = SlabPool(slot_size=4096, slots_per_segment=2)
+    small, large = pool.allocate(10), pool.allocate(10000)
+    registered = []
+    monkeypatch.setattr(
+        resource_tracker, 'register',
+        lambda name, rtype: registered.append(name)
+    )
+    large.view[:3] = b'abc'
+    assert call_with_slab(
+        checksum, large.name, large.offset, 3, 'tasks', False
+    ) == ('memoryview', ord('a'))
+    assert call_with_slab(
+        checksum, small.name, small.offset, 3, 'tasks', True
+    ) == ('memoryview', 0)
+    assert registered == []
+    # A body view still referenced doesn't prevent closing the pool
+    body = small.view[:5]
+    pool.close()
+    body.release()
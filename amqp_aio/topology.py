@@ -0,0 +1,145 @@
+import asyncio
+from collections import OrderedDict
+
+from amqp_aio.amqp import exchange, queue
+from amqp_aio.amqp.amqp_types import FieldTable
+
+
+class Topology:
+    """
+    Records the exchanges, queues and bindings acknowledged by the server.
+
+    The recorded declarations serve two purposes:
+     - Re-declaring something identical to what was already acknowledged is
+       answered from the cache, without a round trip.
+     - After a reconnection every declaration is replayed, in the order they
+       were first made, as a single pipelined burst.
+
+    Passive declarations, server named queues and exclusive queues (along
+    with their bindings) are never recorded: the latter belong to the
+    connection that declared them, while a Topology may be shared by
+    several connections. auto_delete queues and exchanges, along with their
+    bindings, are recorded for replay but always sent: the server may have
+    deleted them since.
+    """
+
+    def __init__(self):
+        self._declarations = OrderedDict()
+        # Names of the exclusive queues declared so far
+        self._exclusive = set()
+
+    @staticmethod
+    def _identity(method):
+        if isinstance(method, exchange.Declare):
+            return 'exchange', method.exchange
+        if isinstance(method, queue.Declare):
+            return 'queue', method.queue
+        if isinstance(method, (queue.Bind, queue.Unbind)):
+            return (
+                'binding', method.queue, method.exchange, method.routing_key,
+                FieldTable(method.arguments).to_bytes()
+            )
+        raise TypeError("{} is not a declaration".format(type(method)))
+
+    @staticmethod
+    def _encode(method) -> bytes:
+        # no_wait changes how a declaration is sent, not what it declares
+        return method.copy(no_wait=False).to_bytes()
+
+    def lookup(self, method):
+        """
+        Returns the reply of an identical acknowledged declaration, or None
+        if the declaration must be sent to the server.
+        """
+        if self._may_be_gone(method):
+            return None
+        entry = self._declarations.get(self._identity(method))
+        if entry is None or entry[0] != self._encode(method):
+            return None
+        return entry[2]
+
+    def _may_be_gone(self, method) -> bool:
+        """
+        Whether the server may have deleted what the declaration declares
+        or binds, once its last consumer or binding went away
+        """
+        if isinstance(method, (exchange.Declare, queue.Declare)):
+            return method.auto_delete
+        for identity in (('queue', method.queue),
+                         ('exchange', method.exchange)):
+            entry = self._declarations.get(identity)
+            if entry is not None and entry[1].auto_delete:
+                return True
+        return False
+
+    def record(self, method, reply):
+        """
+        Records a declaration acknowledged by the server
+        :param method: exchange.Declare, queue.Declare or queue.Bind
+        :param reply: The server reply to the declaration
+        """
+        if getattr(method, 'passive', False):
+            return
+        if isinstance(method, queue.Declare) and not method.queue:
+            return
+        if isinstance(method, queue.Declare) and method.exclusive:
+            self._exclusive.add(method.queue)
+            return
+        if isinstance(method, queue.Bind) and \
+                method.queue in self._exclusive:
+            return
+        # Updating an existing entry keeps its position, so anything bound to
+        # it is still replayed after it
+        self._declarations[self._identity(method)] = (
+            self._encode(method), method, reply
+        )
+
+    def forget(self, method):
+        """
+        Removes what the given deletion method undoes from the records
+        :param method: exchange.Delete, queue.Delete or queue.Unbind
+        """
+        if isinstance(method, queue.Unbind):
+            self._declarations.pop(self._identity(method), None)
+            return
+        if isinstance(method, exchange.Delete):
+            kind, name, position = 'exchange', method.exchange, 2
+        elif isinstance(method, queue.Delete):
+            kind, name, position = 'queue', method.queue, 1
+            self._exclusive.discard(name)
+        else:
+            raise TypeError("{} is not a deletion".format(type(method)))
+        for identity in list(self._declarations):
+            if identity == (kind, name) or (
+                    identity[0] == 'binding' and identity[position] == name
+            ):
+                del self._declarations[identity]
+
+    @property
+    def declarations(self):
+        """
+        Recorded declarations, in replay order
+        """
+        return [method for _, method, _ in self._declarations.values()]
+
+    def __len__(self):
+        return len(self._declarations)
+
+    async def replay(self, connection):
+        """
+        Re-declares everything recorded on a new connection.
+
+        The declarations are pipelined, written at once and answered in
+        order, so the whole topology costs a single round trip.
+        :param AMQPConnection connection: Connection to declare on
+        """
+        methods = self.declarations
+        if not methods:
+            return
+        channel = await connection.channel()
+        try:
+            await asyncio.gather(*await channel.rpc_many(methods))
+        finally:
+            if channel.is_open:
+                await channel.close()
+
@@ -0,0 +1,436 @@
+import asyncio
+import functools
+import logging
+import os
+import struct
+import zlib
+
+from amqp_aio.amqp import basic
+from amqp_aio.amqp.exceptions import AMQPException, MessageNacked, \
+    PublishBufferFull
+
+logger = logging.getLogger(__name__)
+
+# crc32, mandatory, exchange, routing key, properties and body sizes
+_RECORD = struct.Struct('>IBBBHI')
+_SEGMENT_SUFFIX = '.seg'
+
+
+def _encode_record(body, exchange, routing_key, properties, mandatory):
+    exchange = exchange.encode()
+    routing_key = routing_key.encode()
+    properties = properties.to_bytes() if properties is not None else b''
+    header = _RECORD.pack(
+        0, mandatory, len(exchange), len(routing_key), len(properties),
+        len(body)
+    )
+    record = bytearray(header)
+    record += exchange
+    record += routing_key
+    record += properties
+    record += body
+    _RECORD.pack_into(
+        record, 0, zlib.crc32(memoryview(record)[4:]), mandatory,
+        len(exchange), len(routing_key), len(properties), len(body)
+    )
+    return record
+
+
+def _fsync(fileno, directory=None):
+    """
+    fsyncs a file, and first the directory it was created in if given, so
+    the new file itself is durable
+    """
+    if directory is not None:
+        descriptor = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    if fileno is not None:
+        os.fsync(fileno)
+
+
+def _read_records(data):
+    """
+    Yields the messages of a segment, as publish_many dicts, up to the
+    first torn or corrupted record
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset + _RECORD.size <= len(view):
+        crc, mandatory, exchange_size, routing_key_size, properties_size, \
+            body_size = _RECORD.unpack_from(view, offset)
+        end = offset + _RECORD.size + exchange_size + routing_key_size + \
+            properties_size + body_size
+        if end > len(view) or zlib.crc32(view[offset + 4:end]) != crc:
+            logger.warning(
+                "Ignoring the corrupted tail of a publish buffer segment"
+            )
+            return
+        position = offset + _RECORD.size
+        fields = []
+        for size in (exchange_size, routing_key_size, properties_size,
+                     body_size):
+            fields.append(view[position:position + size])
+            position += size
+        exchange, routing_key, properties, body = fields
+        yield {
+            'body': bytes(body),
+            'exchange': str(exchange, 'utf-8'),
+            'routing_key': str(routing_key, 'utf-8'),
+            'properties': basic.BasicProperties.from_bytes(
+                bytes(properties)
+            )[0] if properties_size else None,
+            'mandatory': bool(mandatory),
+        }
+        offset = end
+
+
+class PublishBuffer:
+    """
+    Publisher writing messages ahead to disk while the broker is out of
+    reach.
+
+    While a channel is attached, messages are published straight away, in
+    confirm mode. Without one (the broker being unreachable or the
+    connection lost), they are appended to segment files in directory, so
+    publishing neither fails nor grows the memory. The files are fsynced
+    once sync_batch records are waiting, or sync_delay seconds after the
+    first of them, so a burst of messages costs a single fsync. fsyncs run
+    in the loop default executor, one at a time. Segments are rolled over
+    once they reach segment_size bytes.
+
+    Attaching a channel (typically from ClusterConnector.on_reconnect)
+    drains the segments, oldest first, as pipelined publish_many batches:
+    a segment is deleted once all its messages are confirmed. The messages
+    of a batch rejected by the broker (basic.Nack) are published again one
+    by one, those rejected again being logged and dropped. Messages keep
+    going to the buffer until it is drained, so their order is kept. The
+    messages of a segment being drained when the connection drops again,
+    or when another connection is attached, are published again, the
+    delivery guarantee being at least once. Segments left over by a
+    previous process are drained too.
+
+    publish() returns a future resolved once the message is safe: either
+    confirmed by the broker, or synced to disk. Messages published directly
+    whose confirm is lost with the connection are written to the buffer.
+
+    Usage:
+        buffer = PublishBuffer('/var/spool/orders')
+        connector.on_reconnect(buffer.attach)
+        await buffer.attach(await connector.connect())
+        ...
+        await buffer.publish(b'body', routing_key='orders')
+    """
+
+    def __init__(self, directory, segment_size=16777216, sync_batch=256,
+                 sync_delay=0.01, max_bytes=None, drain_batch=256):
+        """
+        :param str directory: Directory of the segment files, created if
+        missing
+        :param int segment_size: Size a segment is rolled over at, in bytes
+        :param int sync_batch: Records written before an fsync
+        :param float sync_delay: Longest delay before written records are
+        fsynced, in seconds
+        :param int max_bytes: Largest size of the buffer on disk, publish()
+        raising PublishBufferFull beyond it. None for no limit
+        :param int drain_batch: Messages per publish_many when draining
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_batch = sync_batch
+        self.sync_delay = sync_delay
+        self.max_bytes = max_bytes
+        self.drain_batch = drain_batch
+        os.makedirs(directory, exist_ok=True)
+        # Completed segments waiting to be drained, oldest first
+        self._segments = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        self._sequence = 0
+        if self._segments:
+            self._sequence = int(
+                os.path.basename(self._segments[-1])[:-len(_SEGMENT_SUFFIX)]
+            ) + 1
+        self.size = sum(os.path.getsize(path) for path in self._segments)
+        # Segment being appended to
+        self._writer = None
+        self._writer_path = None
+        self._writer_size = 0
+        # Futures of the records waiting for an fsync, and the last fsync
+        self._unsynced = []
+        self._sync_handle = None
+        self._syncing = None
+        self._directory_unsynced = False
+        # Messages rejected by the broker while draining
+        self.dropped = 0
+        self.channel = None
+        self._drain_task = None
+        self._drained = asyncio.Event()
+        self._update_drained()
+        self._closed = False
+
+    @property
+    def buffering(self) -> bool:
+        """
+        Whether messages are written to the buffer rather than published
+        """
+        return self.channel is None or self._drain_task is not None or \
+            bool(self._segments) or self._writer is not None
+
+    def _update_drained(self):
+        if self._segments or self._writer is not None:
+            self._drained.clear()
+        else:
+            self._drained.set()
+
+    async def wait_drained(self):
+        """
+        Waits until every buffered message was confirmed
+        """
+        await self._drained.wait()
+
+    async def attach(self, connection):
+        """
+        Opens a channel in confirm mode on connection, publishing through
+        it from now on once the buffer is drained. A drain in progress on
+        the previously attached channel is stopped, and the channel closed
+        """
+        channel = await connection.channel()
+        await channel.confirm_select()
+        await self._stop_drain()
+        previous, self.channel = self.channel, channel
+        if previous is not None and not previous.is_closed:
+            try:
+                await previous.close()
+            except (AMQPException, ConnectionError) as exc:
+                logger.warning("Failed to close the previous channel: %s",
+                               exc)
+        self._drain_task = asyncio.ensure_future(self._drain())
+
+    async def _stop_drain(self):
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+            try:
+                await self._drain_task
+            except asyncio.CancelledError:
+                pass
+
+    def _detach(self, exc):
+        if self.channel is not None:
+            logger.warning("Buffering the published messages: %s", exc)
+        self.channel = None
+
+    async def publish(self, body, exchange='', routing_key='',
+                      properties=None, mandatory=False) -> asyncio.Future:
+        """
+        Publishes a message, or writes it to the buffer
+        :return: A future resolved once the message is confirmed or synced
+        to disk, or failed with MessageNacked
+        :raise PublishBufferFull: If the buffer reached max_bytes
+        """
+        if self._closed:
+            raise RuntimeError("PublishBuffer is closed")
+        message = (body, exchange, routing_key, properties, mandatory)
+        if self.channel is not None and self.channel.is_closed:
+            self._detach(self.channel.close_exception or "channel closed")
+        if not self.buffering:
+            try:
+                confirmed = await self.channel.publish(
+                    body, exchange=exchange, routing_key=routing_key,
+                    properties=properties, mandatory=mandatory, confirm=True
+                )
+            except (AMQPException, ConnectionError) as exc:
+                self._detach(exc)
+            else:
+                future = asyncio.get_event_loop().create_future()
+                confirmed.add_done_callback(
+                    functools.partial(self._on_confirmed, message, future)
+                )
+                return future
+        return self._append(message)
+
+    def _on_confirmed(self, message, future, confirmed):
+        if future.done():
+            return
+        if confirmed.cancelled() or confirmed.exception() is None:
+            future.set_result(None)
+            return
+        exc = confirmed.exception()
+        if isinstance(exc, MessageNacked):
+            future.set_exception(exc)
+            return
+        # Lost with the connection
+        self._detach(exc)
+        try:
+            self._append(message, future)
+        except Exception as exc:
+            future.set_exception(exc)
+
+    def _append(self, message, future=None) -> asyncio.Future:
+        record = _encode_record(*message)
+        if self.max_bytes is not None and \
+                self.size + len(record) > self.max_bytes:
+            raise PublishBufferFull(
+                "Publish buffer {} is full".format(self.directory)
+            )
+        if self._writer is None:
+            self._open_segment()
+        self._writer.write(record)
+        self._writer_size += len(record)
+        self.size += len(record)
+        loop = asyncio.get_event_loop()
+        if future is None:
+            future = loop.create_future()
+        self._unsynced.append(future)
+        if len(self._unsynced) >= self.sync_batch:
+            self.sync()
+        elif self._sync_handle is None:
+            self._sync_handle = loop.call_later(self.sync_delay, self.sync)
+        if self._writer_size >= self.segment_size:
+            self._roll()
+        return future
+
+    def _open_segment(self):
+        self._writer_path = os.path.join(
+            self.directory,
+            '{:020d}{}'.format(self._sequence, _SEGMENT_SUFFIX)
+        )
+        self._sequence += 1
+        self._writer = open(self._writer_path, 'ab')
+        self._writer_size = 0
+        self._drained.clear()
+        # Synced along with the first records of the file
+        self._directory_unsynced = True
+
+    def sync(self) -> asyncio.Future:
+        """
+        fsyncs the records written so far out of the event loop, resolving
+        their futures once done
+        :return: A future resolved once the fsync is done
+        """
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        fileno = directory = None
+        if self._writer is not None:
+            self._writer.flush()
+            fileno = self._writer.fileno()
+        if self._directory_unsynced:
+            directory = self.directory
+            self._directory_unsynced = False
+        unsynced, self._unsynced = self._unsynced, []
+        self._syncing = asyncio.ensure_future(self._sync(
+            self._syncing, fileno, directory, unsynced
+        ))
+        return self._syncing
+
+    async def _sync(self, previous, fileno, directory, unsynced):
+        # After the previous fsync, so the futures resolve in order
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, _fsync, fileno, directory
+            )
+        except OSError as exc:
+            logger.error("Failed to sync the publish buffer: %s", exc)
+            for future in unsynced:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for future in unsynced:
+                if not future.done():
+                    future.set_result(None)
+
+    def _roll(self):
+        writer = self._writer
+        # Closed once synced, the fsync using its descriptor
+        self.sync().add_done_callback(lambda synced: writer.close())
+        self._segments.append(self._writer_path)
+        self._writer = None
+        self._writer_path = None
+
+    async def _drain(self):
+        channel = self.channel
+        try:
+            while self.channel is channel:
+                if not self._segments:
+                    if self._writer is None:
+                        break
+                    self._roll()
+                path = self._segments[0]
+                await self._drain_segment(channel, path)
+                self._segments.pop(0)
+                self.size -= os.path.getsize(path)
+                os.remove(path)
+        except (AMQPException, ConnectionError) as exc:
+            self._detach(exc)
+        finally:
+            self._drain_task = None
+            self._update_drained()
+
+    async def _drain_segment(self, channel, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        batches = []
+        confirms = []
+        batch = []
+        for message in _read_records(data):
+            batch.append(message)
+            if len(batch) >= self.drain_batch:
+                batches.append(batch)
+                confirms.append(
+                    await channel.publish_many(batch, confirm=True)
+                )
+                batch = []
+        if batch:
+            batches.append(batch)
+            confirms.append(await channel.publish_many(batch, confirm=True))
+        results = await asyncio.gather(*confirms, return_exceptions=True)
+        nacked = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, MessageNacked):
+                nacked.extend(batch)
+            elif isinstance(result, BaseException):
+                raise result
+        if nacked:
+            await self._republish(channel, nacked)
+
+    async def _republish(self, channel, messages):
+        """
+        Publishes the messages of rejected batches one by one, dropping
+        those rejected again
+        """
+        confirms = [
+            await channel.publish(confirm=True, **message)
+            for message in messages
+        ]
+        results = await asyncio.gather(*confirms, return_exceptions=True)
+        for message, result in zip(messages, results):
+            if isinstance(result, MessageNacked):
+                self.dropped += 1
+                logger.error(
+                    "Dropping a buffered message rejected by the broker: "
+                    "exchange %r, routing key %r",
+                    message['exchange'], message['routing_key']
+                )
+            elif isinstance(result, BaseException):
+                raise result
+
+    async def close(self):
+        """
+        Syncs the buffer and closes the channel. Buffered messages are
+        drained by the next PublishBuffer of the directory
+        """
+        self._closed = True
+        await self._stop_drain()
+        if self._writer is not None:
+            self._roll()
+        if self._syncing is not None:
+            await asyncio.wait([self._syncing])
+        channel, self.channel = self.channel, None
+        if channel is not None and not channel.is_closed:
+            await channel.close()
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from amqp_aio.amqp import basic
+from amqp_aio.shm import call_with_slab
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ('message', 'future')
+
+    def __init__(self, message, future):
+        self.message = message
+        self.future = future
+
+
+class ProcessPoolConsumer:
+    """
+    Consumer running a CPU bound handler on every core.
+
+    The connection and channel stay in the event loop process, while the
+    delivered bodies are handed to an executor, a ProcessPoolExecutor by
+    default. Workers receive the raw body bytes (plus the routing key), never
+    the Message or frame objects, so the only pickling involved is copying
+    the bytes over.
+
+    Deliveries in flight are bounded by prefetch, which is also requested
+    from the server with basic.Qos: the read loop is only held up when the
+    server doesn't honour it. Results are settled in delivery order: once
+    the oldest deliveries are done, on_result is awaited for each of them and
+    the successful ones are acknowledged with a single multiple ack. Failed
+    ones are nacked individually.
+
+    With a SlabPool, bodies of at least slab_threshold bytes are reassembled
+    straight into shared memory, and workers only receive the segment name,
+    offset and length: function then gets a memoryview instead of bytes,
+    only valid during the call. The slab is recycled once the message is
+    settled. The bodies the consumer doesn't take go to the body_allocator
+    the channel had before, such as a BodySpooler. Bodies it allocated are
+    copied to bytes before being handed to the workers, as memoryviews
+    can't be pickled.
+
+    Usage:
+        def handle(body, routing_key):  # module level, to be picklable
+            return expensive(body)
+
+        consumer = ProcessPoolConsumer(channel, handle, prefetch=64)
+        await consumer.start('tasks')
+        ...
+        await consumer.stop()
+    """
+
+    def __init__(self, channel, function, prefetch=None, executor=None,
+                 on_result=None, requeue=True, slab_pool=None,
+                 slab_threshold=65536):
+        """
+        :param Channel channel: Channel dedicated to this consumer
+        :param function: Picklable callable receiving the body bytes and the
+        routing key, run by the workers
+        :param int prefetch: Deliveries in flight. Defaults to twice the
+        executor workers
+        :param executor: concurrent.futures executor running function. A
+        ProcessPoolExecutor with a worker per core is created (and shut down
+        by stop) when not given
+        :param on_result: Coroutine function awaited with each Message and
+        its result, in delivery order, before the message is acknowledged
+        :param bool requeue: Whether failed messages are requeued
+        :param SlabPool slab_pool: Pool of the shared memory bodies are
+        handed over through
+        :param int slab_threshold: Smallest body handed over through shared
+        memory, smaller ones being cheaper to pickle
+        """
+        self.channel = channel
+        self.function = function
+        self._own_executor = executor is None
+        self.executor = executor or ProcessPoolExecutor()
+        if prefetch is None:
+            prefetch = 2 * getattr(self.executor, '_max_workers', 1)
+        self.prefetch = prefetch
+        self.on_result = on_result
+        self.requeue = requeue
+        self.slab_pool = slab_pool
+        self.slab_threshold = slab_threshold
+        # delivery tag -> Slab of the body
+        self._slabs = {}
+        # Allocator of the channel before start, given the other bodies
+        self._previous_allocator = None
+        self.consumer_tag = None
+        # delivery tag -> _Job, in delivery order
+        self._jobs = OrderedDict()
+        self._slots = asyncio.Semaphore(prefetch)
+        self._settling = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._jobs)
+
+    async def start(self, queue, consumer_tag=None, exclusive=False,
+                    arguments=None):
+        """
+        Sets the channel prefetch and starts consuming queue
+        :return: The consumer tag
+        """
+        await self.channel.qos(prefetch_count=self.prefetch)
+        if self.slab_pool is not None and \
+                self.channel.body_allocator != self._allocate_body:
+            self._previous_allocator = self.channel.body_allocator
+            self.channel.body_allocator = self._allocate_body
+        self.consumer_tag = await self.channel.consume(
+            queue, self._on_message, consumer_tag=consumer_tag,
+            exclusive=exclusive, arguments=arguments
+        )
+        return self.consumer_tag
+
+    def _allocate_body(self, method, size):
+        if size < self.slab_threshold or \
+                not isinstance(method, basic.Deliver) or \
+                self.channel._consumers.get(method.consumer_tag) != \
+                self._on_message:
+            # Not ours, no one would ever free the slab
+            if self._previous_allocator is None:
+                return None
+            return self._previous_allocator(method, size)
+        slab = self.slab_pool.allocate(size)
+        self._slabs[method.delivery_tag] = slab
+        return slab.view
+
+    async def _on_message(self, message):
+        await self._slots.acquire()
+        loop = asyncio.get_event_loop()
+        slab = self._slabs.get(message.delivery_tag)
+        if slab is not None:
+            future = loop.run_in_executor(
+                self.executor, call_with_slab, self.function, slab.name,
+                slab.offset, slab.length, message.routing_key,
+                self.slab_pool.is_shared(slab)
+            )
+        else:
+            body = message.body
+            if not isinstance(body, bytes):
+                # Allocated by a body_allocator, e.g. a spooled memoryview
+                body = bytes(body)
+            future = loop.run_in_executor(
+                self.executor, self.function, body, message.routing_key
+            )
+        self._jobs[message.delivery_tag] = _Job(message, future)
+        self._idle.clear()
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if not self._settling:
+            self._settling = True
+            asyncio.ensure_future(self._settle())
+
+    async def _settle(self):
+        """
+        Settles the completed jobs at the head of the pipeline
+        """
+        try:
+            while self._jobs:
+                tag, job = next(iter(self._jobs.items()))
+                if not job.future.done():
+                    break
+                acked = None
+                while self._jobs:
+                    tag, job = next(iter(self._jobs.items()))
+                    if not job.future.done():
+                        break
+                    if not await self._handle_result(job):
+                        break
+                    acked = tag
+                    self._release(tag)
+                if acked is not None and self.channel.is_open:
+                    await self.channel.ack(acked, multiple=True)
+                if self._jobs:
+                    tag, job = next(iter(self._jobs.items()))
+                    if job.future.done():
+                        # Failed job, the successful ones before it are acked
+                        self._release(tag)
+                        if self.channel.is_open:
+                            await self.channel.nack(
+                                tag, requeue=self.requeue
+                            )
+        finally:
+            self._settling = False
+        if not self._jobs:
+            self._idle.set()
+
+    async def _handle_result(self, job) -> bool:
+        """
+        :return: Whether the message should be acknowledged
+        """
+        if job.future.cancelled():
+            return False
+        exc = job.future.exception()
+        if exc is None and self.on_result is not None:
+            try:
+                await self.on_result(job.message, job.future.result())
+            except Exception as callback_exc:
+                exc = callback_exc
+        if exc is not None:
+            logger.error(
+                "Failed to process delivery %s", job.message.delivery_tag,
+                exc_info=exc
+            )
+            return False
+        return True
+
+    def _release(self, tag):
+        job = self._jobs.pop(tag)
+        slab = self._slabs.pop(tag, None)
+        if slab is not None:
+            job.message.body = None
+            self.slab_pool.free(slab)
+        self._slots.release()
+
+    async def stop(self):
+        """
+        Stops consuming and waits for the deliveries in flight to be settled
+        """
+        if self.consumer_tag is not None and self.channel.is_open:
+            await self.channel.cancel(self.consumer_tag)
+        self.consumer_tag = None
+        await self._idle.wait()
+        if self.channel.body_allocator == self._allocate_body:
+            self.channel.body_allocator = self._previous_allocator
+            self._previous_allocator = None
+        for slab in self._slabs.values():
+            # Delivered after the cancel, or lost with the channel
+            self.slab_pool.free(slab)
+        self._slabs = {}
+        if self._own_executor:
+            self.executor.shutdown()